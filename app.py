@@ -3,16 +3,22 @@ from flask import Flask, render_template, redirect, url_for
 from flask_login import LoginManager, current_user
 from flask_migrate import Migrate
 from config import config
-from models import db, Usuario
+from models import db
+from services.perfil import iniciar_perfil
+from services.timeouts import iniciar_timeouts
+from services.leitura import iniciar_leitura
+from services.usuarios import carregar_usuario
 
 # Inicializar extensões
 login_manager = LoginManager()
 migrate = Migrate()
 
-def create_app(config_name='default'):
-    """Factory para criar a aplicação Flask"""
+def create_app(config_name='default', configuracoes=None):
+    """Factory para criar a aplicação Flask (configuracoes sobrepõe a classe de configuração, ex.: nos testes)"""
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    if configuracoes:
+        app.config.update(configuracoes)
     
     # Inicializar extensões
     db.init_app(app)
@@ -26,7 +32,16 @@ def create_app(config_name='default'):
     
     @login_manager.user_loader
     def load_user(user_id):
-        return Usuario.query.get(int(user_id))
+        return carregar_usuario(int(user_id))
+    
+    # Perfil de SQL por requisição (opcional)
+    iniciar_perfil(app)
+    
+    # Limite de tempo dos comandos SQL por classe de requisição
+    iniciar_timeouts(app)
+    
+    # Sessão de leitura dos relatórios (réplica opcional)
+    iniciar_leitura(app)
     
     # Criar diretórios necessários
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -44,6 +59,8 @@ def create_app(config_name='default'):
     from routes.caixa import caixa_bp
     from routes.relatorios import relatorios_bp
     from routes.estoque import estoque_bp
+    from routes.debug import debug_bp
+    from routes.tarefas import tarefas_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
@@ -54,6 +71,8 @@ def create_app(config_name='default'):
     app.register_blueprint(caixa_bp)
     app.register_blueprint(relatorios_bp)
     app.register_blueprint(estoque_bp)
+    app.register_blueprint(debug_bp)
+    app.register_blueprint(tarefas_bp)
     
     # Rota principal
     @app.route('/')
@@ -0,0 +1,46 @@
+"""
+Configuração do gunicorn para produção (gunicorn -c gunicorn.conf.py wsgi:app).
+
+Os valores padrão derivam do número de CPUs e podem ser ajustados por
+variáveis de ambiente. Cada worker tem o seu próprio pool de conexões
+(DB_POOL_SIZE + DB_MAX_OVERFLOW) e os seus próprios caches em memória; o
+servidor não sobe se os pools de todos os workers passarem de
+DB_MAX_CONEXOES - DB_CONEXOES_RESERVADAS.
+"""
+import os
+import sys
+
+# O gunicorn lê este arquivo antes de pôr o diretório do projeto no sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import ProductionConfig, verificar_limite_conexoes, workers_gunicorn
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5000')
+
+# Processos: 2 por CPU + 1 (boa parte do tempo é espera pelo banco)
+workers = workers_gunicorn()
+
+# Threads por worker para sobrepor a espera de I/O; não deve passar de DB_POOL_SIZE
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Relatórios em PDF podem levar mais tempo que o padrão de 30 segundos
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Reinicia os workers periodicamente para conter crescimento de memória
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def on_starting(server):
+    """Confere o total de conexões com o número real de workers (inclusive -w na linha de comando)"""
+    verificar_limite_conexoes(
+        server.cfg.workers,
+        ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS,
+        ProductionConfig.DB_MAX_CONEXOES - ProductionConfig.DB_CONEXOES_RESERVADAS
+    )
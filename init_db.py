@@ -2,17 +2,32 @@
 Script para inicializar o banco de dados e criar usuário admin padrão
 """
 from app import create_app
-from models import db, Usuario, Categoria
+from flask_migrate import stamp, upgrade
+from models import (db, Usuario, Categoria, Venda, Caixa, EntradaMercadoria,
+                    venda_numero_seq, caixa_numero_seq, entrada_numero_seq)
+from services.numeracao import sincronizar_sequencia
 from config import config
 import sys
 
-def init_db():
-    """Inicializa o banco de dados"""
-    app = create_app('development')
+def init_db(app=None):
+    """Inicializa o banco de dados (da aplicação informada ou da de desenvolvimento)"""
+    app = app or create_app('development')
     
     with app.app_context():
-        print("Criando tabelas do banco de dados...")
-        db.create_all()
+        if not db.inspect(db.engine).has_table('usuarios'):
+            print("Criando tabelas do banco de dados...")
+            db.create_all()
+            # Banco novo já nasce com o esquema atual: marcar as migrações como aplicadas
+            stamp()
+        else:
+            print("Aplicando migrações pendentes...")
+            upgrade()
+            db.create_all()
+        
+        # Alinhar as sequências de numeração com os registros existentes
+        sincronizar_sequencia(venda_numero_seq, Venda.numero_venda)
+        sincronizar_sequencia(caixa_numero_seq, Caixa.numero_caixa)
+        sincronizar_sequencia(entrada_numero_seq, EntradaMercadoria.numero)
         
         # Verificar se já existe usuário admin
         admin = Usuario.query.filter_by(email='admin@loja.co.mz').first()
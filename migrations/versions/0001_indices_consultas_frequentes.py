@@ -0,0 +1,75 @@
+"""Índices para os filtros e ordenações mais frequentes
+
+Revision ID: 0001_indices
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_indices'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (nome, tabela, colunas, opções)
+INDICES = [
+    ('ix_vendas_data_venda', 'vendas', ['data_venda'], {}),
+    ('ix_vendas_status_data_venda', 'vendas', ['status', 'data_venda'], {}),
+    ('ix_vendas_cliente_id', 'vendas', ['cliente_id'], {}),
+    ('ix_itens_venda_venda_id', 'itens_venda', ['venda_id'], {}),
+    ('ix_itens_venda_produto_id', 'itens_venda', ['produto_id'], {}),
+    ('ix_movimentos_estoque_data_movimento', 'movimentos_estoque', ['data_movimento'], {}),
+    ('ix_movimentos_estoque_produto_data', 'movimentos_estoque', ['produto_id', 'data_movimento'], {}),
+    ('ix_movimentos_caixa_caixa_data', 'movimentos_caixa', ['caixa_id', 'data_movimento'], {}),
+    ('ix_caixas_data_abertura', 'caixas', ['data_abertura'], {}),
+    ('ix_caixas_aberto', 'caixas', ['status'], {
+        'postgresql_where': sa.text("status = 'aberto'"),
+        'sqlite_where': sa.text("status = 'aberto'"),
+    }),
+    ('ix_produtos_ativo_nome', 'produtos', ['ativo', 'nome'], {}),
+    ('ix_produtos_categoria_id', 'produtos', ['categoria_id'], {}),
+]
+
+# Índices GIN de trigramas para as buscas ILIKE '%termo%' (apenas PostgreSQL)
+INDICES_TRIGRAMA = [
+    ('produtos', 'nome'),
+    ('produtos', 'codigo'),
+    ('clientes', 'nome'),
+    ('clientes', 'cpf_nuit'),
+    ('clientes', 'telefone'),
+    ('fornecedores', 'nome'),
+    ('fornecedores', 'nuit'),
+]
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+
+    if postgresql:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        # CONCURRENTLY não bloqueia as vendas durante a criação, mas não pode
+        # rodar dentro de uma transação
+        with op.get_context().autocommit_block():
+            for nome, tabela, colunas, opcoes in INDICES:
+                op.create_index(nome, tabela, colunas, if_not_exists=True,
+                                postgresql_concurrently=True, **opcoes)
+            for tabela, coluna in INDICES_TRIGRAMA:
+                op.create_index(f'ix_{tabela}_{coluna}_trgm', tabela, [coluna], if_not_exists=True,
+                                postgresql_concurrently=True, postgresql_using='gin',
+                                postgresql_ops={coluna: 'gin_trgm_ops'})
+    else:
+        for nome, tabela, colunas, opcoes in INDICES:
+            op.create_index(nome, tabela, colunas, if_not_exists=True, **opcoes)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for tabela, coluna in INDICES_TRIGRAMA:
+            op.drop_index(f'ix_{tabela}_{coluna}_trgm', table_name=tabela, if_exists=True)
+    for nome, tabela, _, _ in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela, if_exists=True)
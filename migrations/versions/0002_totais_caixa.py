@@ -0,0 +1,57 @@
+"""Totais acumulados do caixa (geral e por forma de pagamento)
+
+Revision ID: 0002_totais_caixa
+Revises: 0001_indices
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_totais_caixa'
+down_revision = '0001_indices'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('caixas') as batch_op:
+        batch_op.add_column(sa.Column('total_entradas', sa.Numeric(12, 2), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('total_saidas', sa.Numeric(12, 2), nullable=False, server_default='0'))
+
+    if not sa.inspect(op.get_bind()).has_table('totais_caixa_pagamento'):
+        op.create_table(
+            'totais_caixa_pagamento',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('caixa_id', sa.Integer(), sa.ForeignKey('caixas.id'), nullable=False),
+            sa.Column('forma_pagamento', sa.String(50), nullable=False),
+            sa.Column('entradas', sa.Numeric(12, 2), nullable=False),
+            sa.Column('saidas', sa.Numeric(12, 2), nullable=False),
+            sa.UniqueConstraint('caixa_id', 'forma_pagamento', name='uq_totais_caixa_pagamento')
+        )
+
+    # Preencher os totais a partir dos movimentos já gravados
+    op.execute("""
+        UPDATE caixas SET
+            total_entradas = COALESCE((SELECT SUM(m.valor) FROM movimentos_caixa m
+                                       WHERE m.caixa_id = caixas.id AND m.tipo = 'entrada'), 0),
+            total_saidas = COALESCE((SELECT SUM(m.valor) FROM movimentos_caixa m
+                                     WHERE m.caixa_id = caixas.id AND m.tipo = 'saida'), 0)
+    """)
+    op.execute("""
+        INSERT INTO totais_caixa_pagamento (caixa_id, forma_pagamento, entradas, saidas)
+        SELECT caixa_id, COALESCE(forma_pagamento, ''),
+               SUM(CASE WHEN tipo = 'entrada' THEN valor ELSE 0 END),
+               SUM(CASE WHEN tipo = 'saida' THEN valor ELSE 0 END)
+        FROM movimentos_caixa
+        GROUP BY caixa_id, COALESCE(forma_pagamento, '')
+    """)
+
+
+def downgrade():
+    op.drop_table('totais_caixa_pagamento')
+    with op.batch_alter_table('caixas') as batch_op:
+        batch_op.drop_column('total_saidas')
+        batch_op.drop_column('total_entradas')
@@ -0,0 +1,34 @@
+"""Um caixa aberto por terminal
+
+Revision ID: 0003_caixa_terminal
+Revises: 0002_totais_caixa
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_caixa_terminal'
+down_revision = '0002_totais_caixa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('caixas') as batch_op:
+        batch_op.add_column(sa.Column('terminal', sa.String(60)))
+
+    # Caixas existentes ficam associados ao operador que os abriu
+    op.execute("UPDATE caixas SET terminal = COALESCE('usuario-' || usuario_abertura_id, 'caixa-' || id)")
+
+    op.create_index('ux_caixas_terminal_aberto', 'caixas', ['terminal'], unique=True,
+                    postgresql_where=sa.text("status = 'aberto'"),
+                    sqlite_where=sa.text("status = 'aberto'"))
+
+
+def downgrade():
+    op.drop_index('ux_caixas_terminal_aberto', table_name='caixas')
+    with op.batch_alter_table('caixas') as batch_op:
+        batch_op.drop_column('terminal')
@@ -0,0 +1,28 @@
+"""Identificador gerado pelo PDV nas vendas (sincronização offline)
+
+Revision ID: 0004_uuid_cliente
+Revises: 0003_caixa_terminal
+Create Date: 2026-10-18 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_uuid_cliente'
+down_revision = '0003_caixa_terminal'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('vendas') as batch_op:
+        batch_op.add_column(sa.Column('uuid_cliente', sa.String(36)))
+        batch_op.create_unique_constraint('vendas_uuid_cliente_key', ['uuid_cliente'])
+
+
+def downgrade():
+    with op.batch_alter_table('vendas') as batch_op:
+        batch_op.drop_constraint('vendas_uuid_cliente_key', type_='unique')
+        batch_op.drop_column('uuid_cliente')
@@ -0,0 +1,46 @@
+"""Fila de tarefas em segundo plano (relatórios pesados)
+
+Revision ID: 0005_tarefas
+Revises: 0004_uuid_cliente
+Create Date: 2026-10-18 17:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_tarefas'
+down_revision = '0004_uuid_cliente'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('tarefas'):
+        return
+
+    op.create_table(
+        'tarefas',
+        sa.Column('id', sa.String(36), primary_key=True),
+        sa.Column('tipo', sa.String(50), nullable=False),
+        sa.Column('parametros', sa.Text(), nullable=False),
+        sa.Column('chave_cache', sa.String(64), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('arquivo', sa.String(255)),
+        sa.Column('nome_arquivo', sa.String(200)),
+        sa.Column('mimetype', sa.String(100)),
+        sa.Column('erro', sa.Text()),
+        sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id')),
+        sa.Column('criada_em', sa.DateTime()),
+        sa.Column('iniciada_em', sa.DateTime()),
+        sa.Column('concluida_em', sa.DateTime())
+    )
+    op.create_index('ix_tarefas_chave_cache', 'tarefas', ['chave_cache'])
+    op.create_index('ix_tarefas_status_criada_em', 'tarefas', ['status', 'criada_em'])
+
+
+def downgrade():
+    op.drop_index('ix_tarefas_status_criada_em', table_name='tarefas')
+    op.drop_index('ix_tarefas_chave_cache', table_name='tarefas')
+    op.drop_table('tarefas')
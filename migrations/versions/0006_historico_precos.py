@@ -0,0 +1,40 @@
+"""Histórico de preços dos produtos
+
+Revision ID: 0006_historico_precos
+Revises: 0005_tarefas
+Create Date: 2026-10-18 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_historico_precos'
+down_revision = '0005_tarefas'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('historico_precos'):
+        return
+
+    op.create_table(
+        'historico_precos',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('produto_id', sa.Integer(), sa.ForeignKey('produtos.id'), nullable=False),
+        sa.Column('preco_custo_anterior', sa.Numeric(10, 2), nullable=False),
+        sa.Column('preco_custo', sa.Numeric(10, 2), nullable=False),
+        sa.Column('preco_venda_anterior', sa.Numeric(10, 2), nullable=False),
+        sa.Column('preco_venda', sa.Numeric(10, 2), nullable=False),
+        sa.Column('motivo', sa.String(200)),
+        sa.Column('data_alteracao', sa.DateTime()),
+        sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id'))
+    )
+    op.create_index('ix_historico_precos_produto_data', 'historico_precos', ['produto_id', 'data_alteracao'])
+
+
+def downgrade():
+    op.drop_index('ix_historico_precos_produto_data', table_name='historico_precos')
+    op.drop_table('historico_precos')
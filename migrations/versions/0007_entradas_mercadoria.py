@@ -0,0 +1,59 @@
+"""Entradas de mercadoria (recebimento de compras de fornecedores)
+
+Revision ID: 0007_entradas_mercadoria
+Revises: 0006_historico_precos
+Create Date: 2026-10-18 19:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_entradas_mercadoria'
+down_revision = '0006_historico_precos'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.supports_sequences:
+        op.execute(sa.schema.CreateSequence(sa.Sequence('entradas_mercadoria_numero_seq'), if_not_exists=True))
+
+    if sa.inspect(bind).has_table('entradas_mercadoria'):
+        return
+
+    op.create_table(
+        'entradas_mercadoria',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('numero', sa.String(20), nullable=False, unique=True),
+        sa.Column('fornecedor_id', sa.Integer(), sa.ForeignKey('fornecedores.id'), nullable=False),
+        sa.Column('numero_documento', sa.String(50)),
+        sa.Column('data_entrada', sa.DateTime()),
+        sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id')),
+        sa.Column('total', sa.Numeric(12, 2), nullable=False),
+        sa.Column('custo_medio', sa.Boolean()),
+        sa.Column('observacoes', sa.Text())
+    )
+    op.create_index('ix_entradas_mercadoria_fornecedor_data', 'entradas_mercadoria', ['fornecedor_id', 'data_entrada'])
+
+    op.create_table(
+        'itens_entrada_mercadoria',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('entrada_id', sa.Integer(), sa.ForeignKey('entradas_mercadoria.id'), nullable=False),
+        sa.Column('produto_id', sa.Integer(), sa.ForeignKey('produtos.id'), nullable=False),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.Column('custo_unitario', sa.Numeric(10, 2), nullable=False),
+        sa.Column('total', sa.Numeric(12, 2), nullable=False)
+    )
+    op.create_index('ix_itens_entrada_mercadoria_entrada_id', 'itens_entrada_mercadoria', ['entrada_id'])
+
+
+def downgrade():
+    op.drop_index('ix_itens_entrada_mercadoria_entrada_id', table_name='itens_entrada_mercadoria')
+    op.drop_table('itens_entrada_mercadoria')
+    op.drop_index('ix_entradas_mercadoria_fornecedor_data', table_name='entradas_mercadoria')
+    op.drop_table('entradas_mercadoria')
+    if op.get_bind().dialect.supports_sequences:
+        op.execute(sa.schema.DropSequence(sa.Sequence('entradas_mercadoria_numero_seq'), if_exists=True))
@@ -0,0 +1,36 @@
+"""Saldos de estoque no fechamento do dia (fotografias do razão de movimentos)
+
+Revision ID: 0008_saldos_estoque
+Revises: 0007_entradas_mercadoria
+Create Date: 2026-10-18 20:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_saldos_estoque'
+down_revision = '0007_entradas_mercadoria'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('saldos_estoque'):
+        return
+
+    op.create_table(
+        'saldos_estoque',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('data', sa.Date(), nullable=False),
+        sa.Column('produto_id', sa.Integer(), sa.ForeignKey('produtos.id'), nullable=False),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.Column('custo_unitario', sa.Numeric(10, 2), nullable=False),
+        sa.Column('valor', sa.Numeric(14, 2), nullable=False),
+        sa.UniqueConstraint('data', 'produto_id', name='uq_saldos_estoque_data_produto')
+    )
+
+
+def downgrade():
+    op.drop_table('saldos_estoque')
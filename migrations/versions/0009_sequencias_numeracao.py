@@ -0,0 +1,49 @@
+"""Sequências de numeração de vendas e caixas
+
+Revision ID: 0009_sequencias_numeracao
+Revises: 0008_saldos_estoque
+Create Date: 2026-10-18 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_sequencias_numeracao'
+down_revision = '0008_saldos_estoque'
+branch_labels = None
+depends_on = None
+
+
+# (sequência, tabela, coluna do número formatado, ex.: VND000123)
+SEQUENCIAS = [
+    ('vendas_numero_seq', 'vendas', 'numero_venda'),
+    ('caixas_numero_seq', 'caixas', 'numero_caixa'),
+]
+
+
+def upgrade():
+    if not op.get_bind().dialect.supports_sequences:
+        return
+
+    for sequencia, tabela, coluna in SEQUENCIAS:
+        op.execute(sa.schema.CreateSequence(sa.Sequence(sequencia), if_not_exists=True))
+        # Continuar depois do maior número já emitido (ou do maior id, na
+        # numeração antiga), para que nextval() não repita números existentes;
+        # uma sequência que já existia nunca volta
+        op.execute(sa.text(
+            f"SELECT setval('{sequencia}', GREATEST("
+            f"(SELECT COALESCE(MAX(CAST(SUBSTRING({coluna} FROM '[0-9]+$') AS BIGINT)), 0) + 1 FROM {tabela}), "
+            f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {tabela}), "
+            f"(SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM {sequencia})"
+            f"), false)"
+        ))
+
+
+def downgrade():
+    if not op.get_bind().dialect.supports_sequences:
+        return
+
+    for sequencia, _, _ in reversed(SEQUENCIAS):
+        op.execute(sa.schema.DropSequence(sa.Sequence(sequencia), if_exists=True))
@@ -0,0 +1,78 @@
+"""Resumos diários de vendas, com carga inicial a partir das vendas existentes
+
+Revision ID: 0010_resumos_vendas
+Revises: 0009_sequencias_numeracao
+Create Date: 2026-10-18 22:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_resumos_vendas'
+down_revision = '0009_sequencias_numeracao'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspetor = sa.inspect(op.get_bind())
+
+    if not inspetor.has_table('resumo_vendas_diario'):
+        op.create_table(
+            'resumo_vendas_diario',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('dia', sa.Date(), nullable=False),
+            sa.Column('forma_pagamento', sa.String(50), nullable=False),
+            sa.Column('vendedor_id', sa.Integer(), sa.ForeignKey('usuarios.id'), nullable=False),
+            sa.Column('quantidade_vendas', sa.Integer(), nullable=False),
+            sa.Column('subtotal', sa.Numeric(12, 2), nullable=False),
+            sa.Column('desconto', sa.Numeric(12, 2), nullable=False),
+            sa.Column('total', sa.Numeric(12, 2), nullable=False),
+            sa.UniqueConstraint('dia', 'forma_pagamento', 'vendedor_id', name='uq_resumo_vendas_diario')
+        )
+
+    if not inspetor.has_table('resumo_produtos_diario'):
+        op.create_table(
+            'resumo_produtos_diario',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('dia', sa.Date(), nullable=False),
+            sa.Column('produto_id', sa.Integer(), sa.ForeignKey('produtos.id'), nullable=False),
+            sa.Column('forma_pagamento', sa.String(50), nullable=False),
+            sa.Column('vendedor_id', sa.Integer(), sa.ForeignKey('usuarios.id'), nullable=False),
+            sa.Column('quantidade', sa.Integer(), nullable=False),
+            sa.Column('total', sa.Numeric(12, 2), nullable=False),
+            sa.UniqueConstraint('dia', 'produto_id', 'forma_pagamento', 'vendedor_id',
+                                name='uq_resumo_produtos_diario')
+        )
+
+    # Carga inicial (a mesma agregação de `flask relatorios reconstruir-resumos`):
+    # as tabelas podem já existir, criadas por create_all() e só parcialmente
+    # preenchidas, então são recalculadas por inteiro
+    op.execute('DELETE FROM resumo_produtos_diario')
+    op.execute('DELETE FROM resumo_vendas_diario')
+    op.execute("""
+        INSERT INTO resumo_vendas_diario
+            (dia, forma_pagamento, vendedor_id, quantidade_vendas, subtotal, desconto, total)
+        SELECT date(data_venda), forma_pagamento, vendedor_id, COUNT(id),
+               SUM(subtotal), COALESCE(SUM(desconto), 0), SUM(total)
+        FROM vendas
+        WHERE status = 'concluida'
+        GROUP BY date(data_venda), forma_pagamento, vendedor_id
+    """)
+    op.execute("""
+        INSERT INTO resumo_produtos_diario
+            (dia, produto_id, forma_pagamento, vendedor_id, quantidade, total)
+        SELECT date(v.data_venda), i.produto_id, v.forma_pagamento, v.vendedor_id,
+               SUM(i.quantidade), SUM(i.total)
+        FROM itens_venda i
+        JOIN vendas v ON v.id = i.venda_id
+        WHERE v.status = 'concluida'
+        GROUP BY date(v.data_venda), i.produto_id, v.forma_pagamento, v.vendedor_id
+    """)
+
+
+def downgrade():
+    op.drop_table('resumo_produtos_diario')
+    op.drop_table('resumo_vendas_diario')
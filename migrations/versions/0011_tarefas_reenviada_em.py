@@ -0,0 +1,26 @@
+"""Momento do último reenvio das tarefas pendentes ao pool de threads
+
+Revision ID: 0011_tarefas_reenviada_em
+Revises: 0010_resumos_vendas
+Create Date: 2026-10-18 23:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_tarefas_reenviada_em'
+down_revision = '0010_resumos_vendas'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tarefas') as batch_op:
+        batch_op.add_column(sa.Column('reenviada_em', sa.DateTime()))
+
+
+def downgrade():
+    with op.batch_alter_table('tarefas') as batch_op:
+        batch_op.drop_column('reenviada_em')
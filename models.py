@@ -1,10 +1,32 @@
+import uuid
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+# Extensão de trigramas do PostgreSQL, usada pelos índices das buscas com ILIKE
+event.listen(
+    db.metadata, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+def indice_trigrama(tabela, coluna):
+    """Índice GIN de trigramas (apenas PostgreSQL) para buscas ILIKE '%termo%'"""
+    return db.Index(
+        f'ix_{tabela}_{coluna}_trgm', coluna,
+        postgresql_using='gin', postgresql_ops={coluna: 'gin_trgm_ops'}
+    ).ddl_if(dialect='postgresql')
+
+# Sequências usadas na numeração de vendas, caixas e entradas de mercadoria
+# (apenas em bancos que suportam sequências, como o PostgreSQL; nos demais
+# usa-se o maior id)
+venda_numero_seq = db.Sequence('vendas_numero_seq', metadata=db.metadata)
+caixa_numero_seq = db.Sequence('caixas_numero_seq', metadata=db.metadata)
+entrada_numero_seq = db.Sequence('entradas_mercadoria_numero_seq', metadata=db.metadata)
+
 class Usuario(UserMixin, db.Model):
     """Modelo de usuário do sistema"""
     __tablename__ = 'usuarios'
@@ -29,6 +51,11 @@ class Usuario(UserMixin, db.Model):
         """Verifica a senha do usuário"""
         return check_password_hash(self.senha_hash, senha)
     
+    @property
+    def is_active(self):
+        """Usuários desativados não podem manter sessão (Flask-Login)"""
+        return self.ativo is not False
+    
     def __repr__(self):
         return f'<Usuario {self.email}>'
 
@@ -65,6 +92,11 @@ class Fornecedor(db.Model):
     # Relacionamentos
     produtos = db.relationship('Produto', backref='fornecedor', lazy=True)
     
+    __table_args__ = (
+        indice_trigrama('fornecedores', 'nome'),
+        indice_trigrama('fornecedores', 'nuit'),
+    )
+    
     def __repr__(self):
         return f'<Fornecedor {self.nome}>'
 
@@ -91,6 +123,13 @@ class Produto(db.Model):
     itens_venda = db.relationship('ItemVenda', backref='produto', lazy=True)
     movimentos_estoque = db.relationship('MovimentoEstoque', backref='produto', lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_produtos_ativo_nome', 'ativo', 'nome'),
+        db.Index('ix_produtos_categoria_id', 'categoria_id'),
+        indice_trigrama('produtos', 'nome'),
+        indice_trigrama('produtos', 'codigo'),
+    )
+    
     @property
     def margem_lucro(self):
         """Calcula a margem de lucro"""
@@ -120,6 +159,12 @@ class Cliente(db.Model):
     # Relacionamentos
     vendas = db.relationship('Venda', backref='cliente', lazy=True)
     
+    __table_args__ = (
+        indice_trigrama('clientes', 'nome'),
+        indice_trigrama('clientes', 'cpf_nuit'),
+        indice_trigrama('clientes', 'telefone'),
+    )
+    
     def __repr__(self):
         return f'<Cliente {self.nome}>'
 
@@ -138,10 +183,17 @@ class Venda(db.Model):
     forma_pagamento = db.Column(db.String(50), nullable=False)  # dinheiro, cartao, mpesa, emola
     status = db.Column(db.String(20), default='concluida')  # concluida, cancelada
     observacoes = db.Column(db.Text)
+    uuid_cliente = db.Column(db.String(36), unique=True)  # gerado pelo PDV (sincronização offline)
     
     # Relacionamentos
     itens = db.relationship('ItemVenda', backref='venda', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_vendas_data_venda', 'data_venda'),
+        db.Index('ix_vendas_status_data_venda', 'status', 'data_venda'),
+        db.Index('ix_vendas_cliente_id', 'cliente_id'),
+    )
+    
     def __repr__(self):
         return f'<Venda {self.numero_venda}>'
 
@@ -158,6 +210,11 @@ class ItemVenda(db.Model):
     desconto = db.Column(db.Numeric(10, 2), default=0)
     total = db.Column(db.Numeric(10, 2), nullable=False)
     
+    __table_args__ = (
+        db.Index('ix_itens_venda_venda_id', 'venda_id'),
+        db.Index('ix_itens_venda_produto_id', 'produto_id'),
+    )
+    
     def __repr__(self):
         return f'<ItemVenda {self.id}>'
 
@@ -175,15 +232,106 @@ class MovimentoEstoque(db.Model):
     data_movimento = db.Column(db.DateTime, default=datetime.utcnow)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
     
+    __table_args__ = (
+        db.Index('ix_movimentos_estoque_data_movimento', 'data_movimento'),
+        db.Index('ix_movimentos_estoque_produto_data', 'produto_id', 'data_movimento'),
+    )
+    
     def __repr__(self):
         return f'<MovimentoEstoque {self.id}>'
 
+class EntradaMercadoria(db.Model):
+    """Entrada de mercadoria (recebimento de compra de um fornecedor)"""
+    __tablename__ = 'entradas_mercadoria'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    numero = db.Column(db.String(20), unique=True, nullable=False)
+    fornecedor_id = db.Column(db.Integer, db.ForeignKey('fornecedores.id'), nullable=False)
+    numero_documento = db.Column(db.String(50))  # fatura/guia do fornecedor
+    data_entrada = db.Column(db.DateTime, default=datetime.utcnow)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    custo_medio = db.Column(db.Boolean, default=False)  # atualizou o preço de custo pela média ponderada
+    observacoes = db.Column(db.Text)
+    
+    # Relacionamentos
+    fornecedor = db.relationship('Fornecedor', backref=db.backref('entradas', lazy='dynamic'))
+    usuario = db.relationship('Usuario')
+    itens = db.relationship('ItemEntradaMercadoria', backref='entrada', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_entradas_mercadoria_fornecedor_data', 'fornecedor_id', 'data_entrada'),
+    )
+    
+    def __repr__(self):
+        return f'<EntradaMercadoria {self.numero}>'
+
+class ItemEntradaMercadoria(db.Model):
+    """Linha de uma entrada de mercadoria"""
+    __tablename__ = 'itens_entrada_mercadoria'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entrada_id = db.Column(db.Integer, db.ForeignKey('entradas_mercadoria.id'), nullable=False)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id'), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False)
+    custo_unitario = db.Column(db.Numeric(10, 2), nullable=False)
+    total = db.Column(db.Numeric(12, 2), nullable=False)
+    
+    produto = db.relationship('Produto')
+    
+    __table_args__ = (
+        db.Index('ix_itens_entrada_mercadoria_entrada_id', 'entrada_id'),
+    )
+    
+    def __repr__(self):
+        return f'<ItemEntradaMercadoria {self.id}>'
+
+class SaldoEstoque(db.Model):
+    """Saldo de estoque de um produto no fechamento de um dia (fotografia do razão de movimentos)"""
+    __tablename__ = 'saldos_estoque'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Date, nullable=False)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id'), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False)
+    custo_unitario = db.Column(db.Numeric(10, 2), nullable=False)
+    valor = db.Column(db.Numeric(14, 2), nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('data', 'produto_id', name='uq_saldos_estoque_data_produto'),
+    )
+    
+    def __repr__(self):
+        return f'<SaldoEstoque {self.data} {self.produto_id}>'
+
+class HistoricoPreco(db.Model):
+    """Alteração de preço de um produto (edição ou reajuste em massa)"""
+    __tablename__ = 'historico_precos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id'), nullable=False)
+    preco_custo_anterior = db.Column(db.Numeric(10, 2), nullable=False)
+    preco_custo = db.Column(db.Numeric(10, 2), nullable=False)
+    preco_venda_anterior = db.Column(db.Numeric(10, 2), nullable=False)
+    preco_venda = db.Column(db.Numeric(10, 2), nullable=False)
+    motivo = db.Column(db.String(200))
+    data_alteracao = db.Column(db.DateTime, default=datetime.utcnow)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    
+    __table_args__ = (
+        db.Index('ix_historico_precos_produto_data', 'produto_id', 'data_alteracao'),
+    )
+    
+    def __repr__(self):
+        return f'<HistoricoPreco {self.produto_id} {self.data_alteracao}>'
+
 class Caixa(db.Model):
     """Modelo de caixa"""
     __tablename__ = 'caixas'
     
     id = db.Column(db.Integer, primary_key=True)
     numero_caixa = db.Column(db.String(20), unique=True, nullable=False)
+    terminal = db.Column(db.String(60))  # terminal (cookie) ou 'usuario-<id>' do operador
     data_abertura = db.Column(db.DateTime, default=datetime.utcnow)
     data_fechamento = db.Column(db.DateTime)
     usuario_abertura_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
@@ -193,12 +341,51 @@ class Caixa(db.Model):
     status = db.Column(db.String(20), default='aberto')  # aberto, fechado
     observacoes = db.Column(db.Text)
     
+    # Totais acumulados dos movimentos (atualizados a cada movimento, ver services/caixa.py)
+    total_entradas = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0')
+    total_saidas = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0')
+    
     # Relacionamentos
     movimentos = db.relationship('MovimentoCaixa', backref='caixa', lazy=True)
+    totais_pagamento = db.relationship('TotalCaixaPagamento', backref='caixa', lazy=True,
+                                       order_by='TotalCaixaPagamento.forma_pagamento')
+    
+    __table_args__ = (
+        db.Index('ix_caixas_aberto', 'status',
+                 postgresql_where=db.text("status = 'aberto'"),
+                 sqlite_where=db.text("status = 'aberto'")),
+        db.Index('ix_caixas_data_abertura', 'data_abertura'),
+        # No máximo um caixa aberto por terminal
+        db.Index('ux_caixas_terminal_aberto', 'terminal', unique=True,
+                 postgresql_where=db.text("status = 'aberto'"),
+                 sqlite_where=db.text("status = 'aberto'")),
+    )
+    
+    @property
+    def saldo_atual(self):
+        """Saldo inicial mais entradas menos saídas"""
+        return (self.saldo_inicial or 0) + (self.total_entradas or 0) - (self.total_saidas or 0)
     
     def __repr__(self):
         return f'<Caixa {self.numero_caixa}>'
 
+class TotalCaixaPagamento(db.Model):
+    """Entradas e saídas acumuladas de um caixa por forma de pagamento"""
+    __tablename__ = 'totais_caixa_pagamento'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    caixa_id = db.Column(db.Integer, db.ForeignKey('caixas.id'), nullable=False)
+    forma_pagamento = db.Column(db.String(50), nullable=False, default='')  # '' = não informada
+    entradas = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    saidas = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('caixa_id', 'forma_pagamento', name='uq_totais_caixa_pagamento'),
+    )
+    
+    def __repr__(self):
+        return f'<TotalCaixaPagamento {self.caixa_id} {self.forma_pagamento}>'
+
 class MovimentoCaixa(db.Model):
     """Modelo de movimento de caixa"""
     __tablename__ = 'movimentos_caixa'
@@ -213,5 +400,77 @@ class MovimentoCaixa(db.Model):
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
     data_movimento = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_movimentos_caixa_caixa_data', 'caixa_id', 'data_movimento'),
+    )
+    
     def __repr__(self):
         return f'<MovimentoCaixa {self.id}>'
+
+class ResumoVendaDiario(db.Model):
+    """Totais diários das vendas concluídas, por forma de pagamento e vendedor"""
+    __tablename__ = 'resumo_vendas_diario'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.Date, nullable=False)
+    forma_pagamento = db.Column(db.String(50), nullable=False)
+    vendedor_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    quantidade_vendas = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    desconto = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('dia', 'forma_pagamento', 'vendedor_id', name='uq_resumo_vendas_diario'),
+    )
+    
+    def __repr__(self):
+        return f'<ResumoVendaDiario {self.dia} {self.forma_pagamento}>'
+
+class ResumoProdutoDiario(db.Model):
+    """Totais diários vendidos por produto, forma de pagamento e vendedor"""
+    __tablename__ = 'resumo_produtos_diario'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.Date, nullable=False)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id'), nullable=False)
+    forma_pagamento = db.Column(db.String(50), nullable=False)
+    vendedor_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    produto = db.relationship('Produto')
+    
+    __table_args__ = (
+        db.UniqueConstraint('dia', 'produto_id', 'forma_pagamento', 'vendedor_id', name='uq_resumo_produtos_diario'),
+    )
+    
+    def __repr__(self):
+        return f'<ResumoProdutoDiario {self.dia} {self.produto_id}>'
+
+class Tarefa(db.Model):
+    """Tarefa em segundo plano (relatórios pesados); a própria tabela serve de fila"""
+    __tablename__ = 'tarefas'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    tipo = db.Column(db.String(50), nullable=False)
+    parametros = db.Column(db.Text, nullable=False)  # JSON
+    chave_cache = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, executando, concluida, erro
+    arquivo = db.Column(db.String(255))
+    nome_arquivo = db.Column(db.String(200))
+    mimetype = db.Column(db.String(100))
+    erro = db.Column(db.Text)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    criada_em = db.Column(db.DateTime, default=datetime.utcnow)
+    reenviada_em = db.Column(db.DateTime)  # último reenvio ao pool de threads (tarefa pendente perdida)
+    iniciada_em = db.Column(db.DateTime)
+    concluida_em = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_tarefas_chave_cache', 'chave_cache'),
+        db.Index('ix_tarefas_status_criada_em', 'status', 'criada_em'),
+    )
+    
+    def __repr__(self):
+        return f'<Tarefa {self.tipo} {self.status}>'
@@ -1,65 +1,70 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session
 from flask_login import login_required, current_user
-from models import db, Caixa, MovimentoCaixa
+from models import db, Caixa, MovimentoCaixa, caixa_numero_seq
+from services.caixa import registrar_movimento, caixa_aberto_atual, terminal_atual, COOKIE_TERMINAL
+from services.numeracao import proximo_numero
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 caixa_bp = Blueprint('caixa', __name__, url_prefix='/caixa')
 
+def movimentos_recentes(caixa, page):
+    """Página dos movimentos do caixa, do mais recente para o mais antigo"""
+    return MovimentoCaixa.query.options(
+        joinedload(MovimentoCaixa.usuario)
+    ).filter_by(caixa_id=caixa.id).order_by(
+        MovimentoCaixa.data_movimento.desc(), MovimentoCaixa.id.desc()
+    ).paginate(page=page, per_page=20, error_out=False)
+
 @caixa_bp.route('/')
 @login_required
 def index():
     """Página principal do caixa"""
-    caixa_aberto = Caixa.query.filter_by(status='aberto').first()
+    caixa_aberto = caixa_aberto_atual()
     
     if caixa_aberto:
-        # Calcular totais
-        movimentos = MovimentoCaixa.query.filter_by(caixa_id=caixa_aberto.id).all()
-        
-        total_entradas = sum(m.valor for m in movimentos if m.tipo == 'entrada')
-        total_saidas = sum(m.valor for m in movimentos if m.tipo == 'saida')
-        saldo_atual = caixa_aberto.saldo_inicial + total_entradas - total_saidas
-        
-        # Agrupar por forma de pagamento
-        formas_pagamento = db.session.query(
-            MovimentoCaixa.forma_pagamento,
-            func.sum(MovimentoCaixa.valor).label('total')
-        ).filter(
-            MovimentoCaixa.caixa_id == caixa_aberto.id,
-            MovimentoCaixa.tipo == 'entrada'
-        ).group_by(MovimentoCaixa.forma_pagamento).all()
+        # Totais acumulados no próprio caixa; movimentos apenas da página atual
+        page = request.args.get('page', 1, type=int)
+        formas_pagamento = [
+            (t.forma_pagamento, t.entradas) for t in caixa_aberto.totais_pagamento if t.entradas
+        ]
         
         return render_template('caixa/aberto.html',
                              caixa=caixa_aberto,
-                             movimentos=movimentos,
-                             total_entradas=total_entradas,
-                             total_saidas=total_saidas,
-                             saldo_atual=saldo_atual,
+                             movimentos=movimentos_recentes(caixa_aberto, page),
+                             total_entradas=caixa_aberto.total_entradas,
+                             total_saidas=caixa_aberto.total_saidas,
+                             saldo_atual=caixa_aberto.saldo_atual,
                              formas_pagamento=formas_pagamento)
     
     # Histórico de caixas
     caixas = Caixa.query.order_by(Caixa.data_abertura.desc()).limit(10).all()
-    return render_template('caixa/index.html', caixas=caixas)
+    return render_template('caixa/index.html', caixas=caixas, terminal=terminal_atual())
 
 @caixa_bp.route('/abrir', methods=['POST'])
 @login_required
 def abrir():
-    """Abrir novo caixa"""
-    # Verificar se já existe caixa aberto
-    caixa_aberto = Caixa.query.filter_by(status='aberto').first()
-    if caixa_aberto:
-        flash('Já existe um caixa aberto.', 'warning')
-        return redirect(url_for('caixa.index'))
+    """Abrir novo caixa no terminal atual"""
+    # Um nome informado no formulário identifica este terminal (cookie)
+    terminal = (request.form.get('terminal') or '').strip()[:60] or terminal_atual()
+    resposta = redirect(url_for('caixa.index'))
+    if terminal != terminal_atual():
+        resposta.set_cookie(COOKIE_TERMINAL, terminal, max_age=10 * 365 * 24 * 3600, httponly=True, samesite='Lax')
+    
+    # Verificar se já existe caixa aberto neste terminal
+    if Caixa.query.filter_by(terminal=terminal, status='aberto').first():
+        flash(f'Já existe um caixa aberto no terminal {terminal}.', 'warning')
+        return resposta
     
     try:
         saldo_inicial = float(request.form.get('saldo_inicial', 0))
         
         # Gerar número do caixa
-        ultimo_caixa = Caixa.query.order_by(Caixa.id.desc()).first()
-        numero_caixa = f"CX{(ultimo_caixa.id + 1):06d}" if ultimo_caixa else "CX000001"
+        numero_caixa = proximo_numero(caixa_numero_seq, Caixa, 'CX')
         
         caixa = Caixa(
             numero_caixa=numero_caixa,
+            terminal=terminal,
             usuario_abertura_id=current_user.id,
             saldo_inicial=saldo_inicial,
             status='aberto'
@@ -67,38 +72,35 @@ def abrir():
         
         db.session.add(caixa)
         db.session.commit()
+        session['caixa_id'] = caixa.id
         
         flash(f'Caixa {numero_caixa} aberto com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Erro ao abrir caixa: {str(e)}', 'danger')
     
-    return redirect(url_for('caixa.index'))
+    return resposta
 
 @caixa_bp.route('/fechar', methods=['POST'])
 @login_required
 def fechar():
     """Fechar caixa aberto"""
-    caixa = Caixa.query.filter_by(status='aberto').first()
+    # Bloqueia o caixa para que nenhuma venda altere os totais durante o fechamento
+    caixa = caixa_aberto_atual(bloquear=True)
     
     if not caixa:
         flash('Nenhum caixa está aberto.', 'warning')
         return redirect(url_for('caixa.index'))
     
     try:
-        # Calcular saldo final
-        movimentos = MovimentoCaixa.query.filter_by(caixa_id=caixa.id).all()
-        total_entradas = sum(m.valor for m in movimentos if m.tipo == 'entrada')
-        total_saidas = sum(m.valor for m in movimentos if m.tipo == 'saida')
-        saldo_final = caixa.saldo_inicial + total_entradas - total_saidas
-        
-        caixa.saldo_final = saldo_final
+        caixa.saldo_final = caixa.saldo_atual
         caixa.data_fechamento = datetime.utcnow()
         caixa.usuario_fechamento_id = current_user.id
         caixa.status = 'fechado'
         caixa.observacoes = request.form.get('observacoes')
         
         db.session.commit()
+        session.pop('caixa_id', None)
         flash(f'Caixa {caixa.numero_caixa} fechado com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -110,23 +112,25 @@ def fechar():
 @login_required
 def adicionar_movimento():
     """Adicionar movimento manual ao caixa"""
-    caixa = Caixa.query.filter_by(status='aberto').first()
+    caixa = caixa_aberto_atual()
     
     if not caixa:
         flash('Nenhum caixa está aberto.', 'warning')
         return redirect(url_for('caixa.index'))
     
     try:
-        movimento = MovimentoCaixa(
-            caixa_id=caixa.id,
-            tipo=request.form.get('tipo'),
-            valor=float(request.form.get('valor')),
+        valor = float(request.form.get('valor'))
+        if not valor > 0:
+            raise ValueError('O valor do movimento deve ser maior que zero')
+        
+        registrar_movimento(
+            caixa.id,
+            request.form.get('tipo'),
+            valor,
             forma_pagamento=request.form.get('forma_pagamento'),
             descricao=request.form.get('descricao'),
             usuario_id=current_user.id
         )
-        
-        db.session.add(movimento)
         db.session.commit()
         
         flash('Movimento adicionado com sucesso!', 'success')
@@ -141,13 +145,10 @@ def adicionar_movimento():
 def detalhes(id):
     """Detalhes de um caixa fechado"""
     caixa = Caixa.query.get_or_404(id)
-    movimentos = MovimentoCaixa.query.filter_by(caixa_id=caixa.id).all()
-    
-    total_entradas = sum(m.valor for m in movimentos if m.tipo == 'entrada')
-    total_saidas = sum(m.valor for m in movimentos if m.tipo == 'saida')
+    page = request.args.get('page', 1, type=int)
     
     return render_template('caixa/detalhes.html',
                          caixa=caixa,
-                         movimentos=movimentos,
-                         total_entradas=total_entradas,
-                         total_saidas=total_saidas)
+                         movimentos=movimentos_recentes(caixa, page),
+                         total_entradas=caixa.total_entradas,
+                         total_saidas=caixa.total_saidas)
@@ -0,0 +1,17 @@
+from flask import Blueprint, render_template, abort, current_app
+from flask_login import login_required, current_user
+from services.perfil import coletor
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+@debug_bp.route('/perf')
+@login_required
+def perf():
+    """Estatísticas de tempo e SQL por endpoint (apenas administradores)"""
+    if current_user.tipo != 'admin':
+        abort(403)
+    
+    return render_template('debug/perf.html',
+                         ativo=current_app.config.get('PERFIL_SQL'),
+                         limite_lento=current_app.config.get('PERFIL_SQL_LIMITE_LENTO_MS'),
+                         endpoints=coletor.resumo())
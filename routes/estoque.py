@@ -1,6 +1,14 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+import click
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
 from flask_login import login_required, current_user
-from models import db, Produto, MovimentoEstoque
+from models import db, Produto, MovimentoEstoque, EntradaMercadoria, ItemEntradaMercadoria, Fornecedor
+from services.catalogo import catalogo
+from services.entradas import registrar_entrada, EntradaErro
+from services.saldos import gerar_saldos, ontem
+from services.exportacao import exportar, FORMATOS_EXPORTACAO
+from services.paginacao import paginar_keyset
+from sqlalchemy.orm import joinedload
 
 estoque_bp = Blueprint('estoque', __name__, url_prefix='/estoque')
 
@@ -27,10 +35,12 @@ def index():
 def movimentos():
     """Histórico de movimentos de estoque"""
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     produto_id = request.args.get('produto_id', type=int)
     tipo = request.args.get('tipo', '')
+    formato = request.args.get('formato', 'html')
     
-    query = MovimentoEstoque.query
+    query = MovimentoEstoque.query.options(joinedload(MovimentoEstoque.produto))
     
     if produto_id:
         query = query.filter_by(produto_id=produto_id)
@@ -38,9 +48,31 @@ def movimentos():
     if tipo:
         query = query.filter_by(tipo=tipo)
     
-    movimentos = query.order_by(MovimentoEstoque.data_movimento.desc()).paginate(
-        page=page, per_page=50, error_out=False
-    )
+    if formato in FORMATOS_EXPORTACAO:
+        consulta = query.order_by(
+            MovimentoEstoque.data_movimento.desc()
+        ).yield_per(1000)
+        linhas = ([
+            m.data_movimento,
+            m.produto.codigo,
+            m.produto.nome,
+            m.tipo,
+            m.quantidade,
+            m.estoque_anterior,
+            m.estoque_atual,
+            m.motivo
+        ] for m in consulta)
+        return exportar(formato, 'movimentos_estoque',
+                        ['Data', 'Código', 'Produto', 'Tipo', 'Quantidade', 'Estoque Anterior', 'Estoque Atual', 'Motivo'],
+                        linhas)
+    
+    if cursor is not None or current_app.config.get('PAGINACAO_KEYSET'):
+        movimentos = paginar_keyset(query, (MovimentoEstoque.data_movimento, MovimentoEstoque.id),
+                                    cursor, por_pagina=50)
+    else:
+        movimentos = query.order_by(MovimentoEstoque.data_movimento.desc()).paginate(
+            page=page, per_page=50, error_out=False
+        )
     
     produtos = Produto.query.filter_by(ativo=True).order_by(Produto.nome).all()
     
@@ -90,6 +122,7 @@ def ajustar(produto_id):
             )
             
             db.session.add(movimento)
+            catalogo.registrar_estoques({produto.id: produto.estoque_atual})
             db.session.commit()
             
             flash('Estoque ajustado com sucesso!', 'success')
@@ -100,3 +133,109 @@ def ajustar(produto_id):
             flash(f'Erro ao ajustar estoque: {str(e)}', 'danger')
     
     return render_template('estoque/ajustar.html', produto=produto)
+
+@estoque_bp.route('/entradas')
+@login_required
+def entradas():
+    """Entradas de mercadoria registradas"""
+    page = request.args.get('page', 1, type=int)
+    fornecedor_id = request.args.get('fornecedor_id', type=int)
+    
+    query = EntradaMercadoria.query.options(joinedload(EntradaMercadoria.fornecedor))
+    
+    if fornecedor_id:
+        query = query.filter_by(fornecedor_id=fornecedor_id)
+    
+    entradas = query.order_by(EntradaMercadoria.data_entrada.desc()).paginate(
+        page=page, per_page=20, error_out=False
+    )
+    
+    fornecedores = Fornecedor.query.filter_by(ativo=True).order_by(Fornecedor.nome).all()
+    
+    return render_template('estoque/entradas.html',
+                         entradas=entradas,
+                         fornecedores=fornecedores,
+                         fornecedor_id=fornecedor_id)
+
+def ler_itens_entrada(form):
+    """Linhas do formulário de entrada (código, quantidade, custo), com os códigos resolvidos numa consulta"""
+    linhas = [
+        (codigo.strip(), quantidade, custo)
+        for codigo, quantidade, custo in zip(form.getlist('codigo'), form.getlist('quantidade'),
+                                             form.getlist('custo_unitario'))
+        if codigo.strip()
+    ]
+    ids = dict(db.session.query(Produto.codigo, Produto.id).filter(
+        Produto.codigo.in_({codigo for codigo, _, _ in linhas})
+    ).all())
+    
+    itens = []
+    for codigo, quantidade, custo in linhas:
+        if codigo not in ids:
+            raise EntradaErro(f'Produto com código {codigo} não encontrado')
+        itens.append({'produto_id': ids[codigo], 'quantidade': quantidade, 'custo_unitario': custo})
+    return itens
+
+@estoque_bp.route('/entradas/nova', methods=['GET', 'POST'])
+@login_required
+def nova_entrada():
+    """Registrar entrada de mercadoria (JSON ou formulário)"""
+    if request.method == 'POST':
+        if request.is_json:
+            dados = request.get_json()
+            try:
+                entrada = registrar_entrada(
+                    dados.get('fornecedor_id'), dados.get('itens', []), current_user.id,
+                    dados.get('numero_documento'), dados.get('observacoes'), bool(dados.get('custo_medio'))
+                )
+                db.session.commit()
+                return jsonify({'success': True, 'entrada_id': entrada.id, 'numero': entrada.numero})
+            except EntradaErro as e:
+                db.session.rollback()
+                return jsonify({'success': False, 'error': str(e)}), 400
+            except Exception as e:
+                db.session.rollback()
+                return jsonify({'success': False, 'error': str(e)}), 500
+        
+        try:
+            entrada = registrar_entrada(
+                request.form.get('fornecedor_id', type=int),
+                ler_itens_entrada(request.form),
+                current_user.id,
+                request.form.get('numero_documento'),
+                request.form.get('observacoes'),
+                request.form.get('custo_medio') == 'on'
+            )
+            db.session.commit()
+            flash(f'Entrada {entrada.numero} registrada com sucesso!', 'success')
+            return redirect(url_for('estoque.entrada', id=entrada.id))
+        except EntradaErro as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Erro ao registrar entrada: {str(e)}', 'danger')
+    
+    fornecedores = Fornecedor.query.filter_by(ativo=True).order_by(Fornecedor.nome).all()
+    
+    return render_template('estoque/entrada_form.html', fornecedores=fornecedores)
+
+@estoque_bp.route('/entradas/<int:id>')
+@login_required
+def entrada(id):
+    """Detalhes de uma entrada de mercadoria"""
+    entrada = EntradaMercadoria.query.options(
+        joinedload(EntradaMercadoria.fornecedor),
+        joinedload(EntradaMercadoria.itens).joinedload(ItemEntradaMercadoria.produto)
+    ).filter_by(id=id).first_or_404()
+    
+    return render_template('estoque/entrada.html', entrada=entrada)
+
+@estoque_bp.cli.command('gerar-saldos')
+@click.option('--data', help='Dia do fechamento (AAAA-MM-DD). Padrão: ontem.')
+def gerar_saldos_comando(data):
+    """Grava os saldos de estoque (quantidade e valor) no fechamento do dia"""
+    dia = datetime.strptime(data, '%Y-%m-%d').date() if data else ontem()
+    produtos = gerar_saldos(dia)
+    db.session.commit()
+    click.echo(f'Saldos de {dia.strftime("%d/%m/%Y")} gravados: {produtos} produto(s) com estoque.')
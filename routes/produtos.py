@@ -1,7 +1,13 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from models import db, Produto, Categoria, Fornecedor, MovimentoEstoque
+from services.catalogo import catalogo
+from services.importacao import ler_linhas, importar_produtos
+from services.precos import (validar_reajuste, condicoes_reajuste, previsualizar_reajuste,
+                             aplicar_reajuste, registrar_alteracao_preco)
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
+import click
 import os
 
 produtos_bp = Blueprint('produtos', __name__, url_prefix='/produtos')
@@ -14,7 +20,7 @@ def listar():
     busca = request.args.get('busca', '')
     categoria_id = request.args.get('categoria', type=int)
     
-    query = Produto.query
+    query = Produto.query.options(joinedload(Produto.categoria))
     
     if busca:
         query = query.filter(
@@ -74,6 +80,7 @@ def novo():
                 )
                 db.session.add(movimento)
             
+            catalogo.registrar_produto(produto)
             db.session.commit()
             flash('Produto cadastrado com sucesso!', 'success')
             return redirect(url_for('produtos.listar'))
@@ -89,6 +96,78 @@ def novo():
                          categorias=categorias,
                          fornecedores=fornecedores)
 
+@produtos_bp.route('/importar', methods=['GET', 'POST'])
+@login_required
+def importar():
+    """Importar produtos de uma planilha CSV ou XLSX"""
+    resultado = None
+    
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not arquivo.filename:
+            flash('Selecione um arquivo CSV ou XLSX.', 'danger')
+            return redirect(url_for('produtos.importar'))
+        
+        try:
+            resultado = importar_produtos(ler_linhas(arquivo.stream, arquivo.filename), current_user.id)
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('produtos.importar'))
+        
+        flash(f'Importação concluída: {resultado["inseridos"]} produto(s) novo(s), '
+              f'{resultado["atualizados"]} atualizado(s), {len(resultado["erros"])} erro(s).',
+              'warning' if resultado['erros'] else 'success')
+    
+    return render_template('produtos/importar.html', resultado=resultado)
+
+def ler_reajuste(dados):
+    """(campo, modo, valor, condições) do formulário de reajuste; levanta ValueError"""
+    campo = dados.get('campo', 'preco_venda')
+    modo = dados.get('modo', 'percentual')
+    valor = validar_reajuste(campo, modo, dados.get('valor', ''))
+    condicoes = condicoes_reajuste(
+        categoria_id=dados.get('categoria_id', type=int),
+        fornecedor_id=dados.get('fornecedor_id', type=int),
+        margem_minima=dados.get('margem_minima', type=float),
+        margem_maxima=dados.get('margem_maxima', type=float)
+    )
+    return campo, modo, valor, condicoes
+
+@produtos_bp.route('/reajuste', methods=['GET', 'POST'])
+@login_required
+def reajuste():
+    """Reajuste de preços em massa, com prévia do impacto"""
+    if request.method == 'POST':
+        try:
+            campo, modo, valor, condicoes = ler_reajuste(request.form)
+            alterados = aplicar_reajuste(campo, modo, valor, condicoes, current_user.id,
+                                         request.form.get('motivo') or 'Reajuste em massa')
+            db.session.commit()
+            flash(f'Preço reajustado em {alterados} produto(s).', 'success')
+            return redirect(url_for('produtos.listar'))
+        except ValueError as e:
+            flash(str(e), 'danger')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Erro ao reajustar preços: {str(e)}', 'danger')
+        return redirect(url_for('produtos.reajuste', **request.form))
+    
+    previa = None
+    if request.args.get('valor'):
+        try:
+            previa = previsualizar_reajuste(*ler_reajuste(request.args))
+        except ValueError as e:
+            flash(str(e), 'danger')
+    
+    categorias = Categoria.query.filter_by(ativo=True).order_by(Categoria.nome).all()
+    fornecedores = Fornecedor.query.filter_by(ativo=True).order_by(Fornecedor.nome).all()
+    
+    return render_template('produtos/reajuste.html',
+                         previa=previa,
+                         categorias=categorias,
+                         fornecedores=fornecedores)
+
 @produtos_bp.route('/<int:id>/editar', methods=['GET', 'POST'])
 @login_required
 def editar(id):
@@ -102,12 +181,16 @@ def editar(id):
             produto.descricao = request.form.get('descricao')
             produto.categoria_id = request.form.get('categoria_id') or None
             produto.fornecedor_id = request.form.get('fornecedor_id') or None
+            preco_custo_anterior, preco_venda_anterior = produto.preco_custo, produto.preco_venda
             produto.preco_custo = float(request.form.get('preco_custo', 0))
             produto.preco_venda = float(request.form.get('preco_venda', 0))
             produto.estoque_minimo = int(request.form.get('estoque_minimo', 0))
             produto.unidade_medida = request.form.get('unidade_medida', 'UN')
             produto.ativo = request.form.get('ativo') == 'on'
             
+            registrar_alteracao_preco(produto, preco_custo_anterior, preco_venda_anterior,
+                                      current_user.id, 'Edição do produto')
+            catalogo.registrar_produto(produto)
             db.session.commit()
             flash('Produto atualizado com sucesso!', 'success')
             return redirect(url_for('produtos.listar'))
@@ -131,6 +214,7 @@ def deletar(id):
     
     try:
         produto.ativo = False
+        catalogo.registrar_produto(produto)
         db.session.commit()
         flash('Produto desativado com sucesso!', 'success')
     except Exception as e:
@@ -148,24 +232,56 @@ def api_buscar():
     if len(termo) < 2:
         return jsonify([])
     
-    produtos = Produto.query.filter(
-        Produto.ativo == True,
-        db.or_(
-            Produto.nome.ilike(f'%{termo}%'),
-            Produto.codigo.ilike(f'%{termo}%')
-        )
-    ).limit(10).all()
-    
-    resultado = [{
-        'id': p.id,
-        'codigo': p.codigo,
-        'nome': p.nome,
-        'preco_venda': float(p.preco_venda),
-        'estoque_atual': p.estoque_atual,
-        'unidade_medida': p.unidade_medida
-    } for p in produtos]
-    
-    return jsonify(resultado)
+    return jsonify(catalogo.buscar(termo, limite=10))
+
+@produtos_bp.route('/api/codigo/<codigo>')
+@login_required
+def api_codigo(codigo):
+    """API de leitura de código de barras (busca exata pelo código)"""
+    produto = catalogo.por_codigo(codigo)
+    
+    if not produto:
+        # Pode ter sido cadastrado em outro processo depois da última recarga
+        encontrado = Produto.query.filter_by(codigo=codigo, ativo=True).first()
+        if not encontrado:
+            return jsonify({'error': 'Produto não encontrado'}), 404
+        catalogo.adicionar(encontrado)
+        produto = catalogo.por_codigo(codigo)
+    
+    return jsonify(produto)
+
+@produtos_bp.route('/api/codigos', methods=['POST'])
+@login_required
+def api_codigos():
+    """API de leitura em lote: resolve uma lista de códigos numa única requisição"""
+    data = request.get_json(silent=True) or {}
+    codigos = [str(c) for c in data.get('codigos', []) if c]
+    
+    if len(codigos) > 500:
+        return jsonify({'error': 'Máximo de 500 códigos por requisição'}), 400
+    
+    produtos, faltando = catalogo.por_codigos(codigos)
+    
+    if faltando:
+        for produto in Produto.query.filter(Produto.codigo.in_(faltando), Produto.ativo == True):
+            catalogo.adicionar(produto)
+        encontrados, faltando = catalogo.por_codigos(faltando)
+        produtos.update(encontrados)
+    
+    return jsonify({'produtos': produtos, 'nao_encontrados': faltando})
+
+@produtos_bp.route('/api/catalogo')
+@login_required
+def api_catalogo():
+    """API do catálogo completo de produtos ativos, guardado pelo PDV para funcionar offline"""
+    versao, produtos = catalogo.todos()
+    
+    if request.if_none_match.contains(versao):
+        return '', 304
+    
+    resposta = jsonify({'versao': versao, 'produtos': produtos})
+    resposta.set_etag(versao)
+    return resposta
 
 @produtos_bp.route('/categorias')
 @login_required
@@ -195,3 +311,19 @@ def nova_categoria():
         flash(f'Erro ao cadastrar categoria: {str(e)}', 'danger')
     
     return redirect(url_for('produtos.categorias'))
+
+@produtos_bp.cli.command('importar')
+@click.argument('caminho', type=click.Path(exists=True, dir_okay=False))
+def importar_comando(caminho):
+    """Importa produtos de um arquivo CSV ou XLSX"""
+    try:
+        with open(caminho, 'rb') as arquivo:
+            resultado = importar_produtos(ler_linhas(arquivo, caminho))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    
+    for numero, mensagem in resultado['erros']:
+        click.echo(f'Linha {numero}: {mensagem}', err=True)
+    click.echo(f'{resultado["inseridos"]} produto(s) novo(s), {resultado["atualizados"]} atualizado(s), '
+               f'{len(resultado["erros"])} erro(s) em {resultado["segundos"]:.1f} s '
+               f'({resultado["linhas_por_segundo"]:.0f} linhas/s).')
@@ -1,32 +1,50 @@
-from flask import Blueprint, render_template, request, send_file
-from flask_login import login_required
-from models import db, Venda, ItemVenda, Produto, Cliente
+import click
+from flask import Blueprint, render_template, request, send_file, current_app
+from flask_login import login_required, current_user
+from models import db, Venda, ItemVenda, Produto, Cliente, ResumoVendaDiario, ResumoProdutoDiario
+from services.exportacao import exportar, escrever_xlsx, nome_arquivo, FORMATOS_EXPORTACAO, MIMETYPE_XLSX
+from services.tarefas import tipo_tarefa, enfileirar
+from services.leitura import sessao_relatorios
+from services.analise import carregar_itens, analisar_vendas, linhas_exportacao, TABELAS_EXPORTACAO
+from services.resumos import reconstruir_resumos
+from services.saldos import consulta_saldos, totais_saldos
+from routes.tarefas import resposta_tarefa
 from sqlalchemy import func, extract
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
-import io
+import tempfile
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle, Paragraph
 from reportlab.lib.units import cm
 
 relatorios_bp = Blueprint('relatorios', __name__, url_prefix='/relatorios')
 
-@relatorios_bp.route('/')
-@login_required
-def index():
-    """Página principal de relatórios"""
-    return render_template('relatorios/index.html')
+# Layout da tabela de vendas do PDF
+ALTURA_CABECALHO_TABELA = 30
+ALTURA_LINHA_TABELA = 18
+ESTILO_TABELA_VENDAS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
 
-@relatorios_bp.route('/vendas')
-@login_required
-def vendas():
-    """Relatório de vendas"""
+CABECALHO_VENDAS = ['Nº Venda', 'Data', 'Cliente', 'Vendedor', 'Forma de Pagamento', 'Subtotal', 'Desconto', 'Total']
+
+# Formatos do relatório de vendas gerados em segundo plano (RELATORIOS_ASSINCRONOS)
+FORMATOS_ASSINCRONOS = ('pdf', 'xlsx')
+
+def obter_periodo():
+    """Lê data_inicio/data_fim da requisição (padrão: últimos 30 dias)"""
     data_inicio = request.args.get('data_inicio')
     data_fim = request.args.get('data_fim')
-    formato = request.args.get('formato', 'html')
     
-    # Definir período padrão (últimos 30 dias)
     if not data_inicio or not data_fim:
         data_fim = datetime.utcnow()
         data_inicio = data_fim - timedelta(days=30)
@@ -34,32 +52,100 @@ def vendas():
         data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d')
         data_fim = datetime.strptime(data_fim, '%Y-%m-%d')
     
-    # Buscar vendas
-    vendas = Venda.query.filter(
-        Venda.data_venda.between(data_inicio, data_fim),
+    return data_inicio, data_fim
+
+def filtro_periodo(coluna, data_inicio, data_fim):
+    """Filtro por dias inteiros: do início de data_inicio ao fim de data_fim"""
+    inicio = datetime.combine(data_inicio.date(), datetime.min.time())
+    fim = datetime.combine(data_fim.date() + timedelta(days=1), datetime.min.time())
+    return db.and_(coluna >= inicio, coluna < fim)
+
+@relatorios_bp.route('/')
+@login_required
+def index():
+    """Página principal de relatórios"""
+    return render_template('relatorios/index.html')
+
+def consultar_vendas(sessao, data_inicio, data_fim):
+    """Vendas concluídas do período (clientes carregados no mesmo SELECT)"""
+    return sessao.query(Venda).options(joinedload(Venda.cliente)).filter(
+        filtro_periodo(Venda.data_venda, data_inicio, data_fim),
         Venda.status == 'concluida'
-    ).order_by(Venda.data_venda.desc()).all()
-    
-    # Calcular totais
-    total_vendas = len(vendas)
-    valor_total = sum(v.total for v in vendas)
+    ).order_by(Venda.data_venda.desc())
+
+def totais_vendas(sessao, data_inicio, data_fim):
+    """(total de vendas, valor total, ticket médio) do período, pelos resumos diários"""
+    total_vendas, valor_total = sessao.query(
+        func.coalesce(func.sum(ResumoVendaDiario.quantidade_vendas), 0),
+        func.coalesce(func.sum(ResumoVendaDiario.total), 0)
+    ).filter(ResumoVendaDiario.dia.between(data_inicio.date(), data_fim.date())).one()
     ticket_medio = valor_total / total_vendas if total_vendas > 0 else 0
-    
-    # Vendas por forma de pagamento
-    vendas_por_pagamento = db.session.query(
-        Venda.forma_pagamento,
-        func.count(Venda.id).label('quantidade'),
-        func.sum(Venda.total).label('total')
+    return total_vendas, valor_total, ticket_medio
+
+def linhas_vendas(consulta_vendas):
+    """Linhas da exportação do relatório de vendas (CABECALHO_VENDAS), lidas em blocos"""
+    return ([
+        v.numero_venda,
+        v.data_venda,
+        v.cliente.nome if v.cliente else '',
+        v.vendedor.nome,
+        v.forma_pagamento,
+        v.subtotal,
+        v.desconto,
+        v.total
+    ] for v in consulta_vendas.options(joinedload(Venda.vendedor)).yield_per(1000))
+
+def impressao_digital_vendas(sessao, data_inicio, data_fim):
+    """
+    Resumo barato das vendas do período (quantidade, maior id e soma). Muda
+    quando uma venda entra ou é cancelada, invalidando o relatório já gerado.
+    """
+    quantidade, maior_id, soma = sessao.query(
+        func.count(Venda.id), func.max(Venda.id), func.coalesce(func.sum(Venda.total), 0)
     ).filter(
-        Venda.data_venda.between(data_inicio, data_fim),
+        filtro_periodo(Venda.data_venda, data_inicio, data_fim),
         Venda.status == 'concluida'
-    ).group_by(Venda.forma_pagamento).all()
+    ).one()
+    return [quantidade, maior_id, str(soma)]
+
+@relatorios_bp.route('/vendas')
+@login_required
+def vendas():
+    """Relatório de vendas"""
+    formato = request.args.get('formato', 'html')
+    data_inicio, data_fim = obter_periodo()
+    sessao = sessao_relatorios()
+    
+    if formato in FORMATOS_ASSINCRONOS and current_app.config.get('RELATORIOS_ASSINCRONOS'):
+        parametros = {
+            'data_inicio': data_inicio.strftime('%Y-%m-%d'),
+            'data_fim': data_fim.strftime('%Y-%m-%d'),
+            'formato': formato
+        }
+        tarefa = enfileirar('relatorio_vendas', parametros, current_user.id,
+                            impressao_digital_vendas(sessao, data_inicio, data_fim))
+        return resposta_tarefa(tarefa)
+    
+    consulta_vendas = consultar_vendas(sessao, data_inicio, data_fim)
+    total_vendas, valor_total, ticket_medio = totais_vendas(sessao, data_inicio, data_fim)
     
     if formato == 'pdf':
-        return gerar_pdf_vendas(vendas, data_inicio, data_fim, total_vendas, valor_total, ticket_medio)
+        return gerar_pdf_vendas(consulta_vendas, data_inicio, data_fim, total_vendas, valor_total, ticket_medio)
+    
+    if formato in FORMATOS_EXPORTACAO:
+        return exportar(formato, 'relatorio_vendas', CABECALHO_VENDAS, linhas_vendas(consulta_vendas))
+    
+    # Vendas por forma de pagamento
+    vendas_por_pagamento = sessao.query(
+        ResumoVendaDiario.forma_pagamento,
+        func.sum(ResumoVendaDiario.quantidade_vendas).label('quantidade'),
+        func.sum(ResumoVendaDiario.total).label('total')
+    ).filter(
+        ResumoVendaDiario.dia.between(data_inicio.date(), data_fim.date())
+    ).group_by(ResumoVendaDiario.forma_pagamento).all()
     
     return render_template('relatorios/vendas.html',
-                         vendas=vendas,
+                         vendas=consulta_vendas.all(),
                          data_inicio=data_inicio,
                          data_fim=data_fim,
                          total_vendas=total_vendas,
@@ -67,35 +153,49 @@ def vendas():
                          ticket_medio=ticket_medio,
                          vendas_por_pagamento=vendas_por_pagamento)
 
+@tipo_tarefa('relatorio_vendas')
+def tarefa_relatorio_vendas(parametros, caminho):
+    """Gera o relatório de vendas (PDF ou XLSX) em segundo plano"""
+    data_inicio = datetime.strptime(parametros['data_inicio'], '%Y-%m-%d')
+    data_fim = datetime.strptime(parametros['data_fim'], '%Y-%m-%d')
+    sessao = sessao_relatorios()
+    consulta_vendas = consultar_vendas(sessao, data_inicio, data_fim)
+    
+    if parametros['formato'] == 'pdf':
+        escrever_pdf_vendas(caminho, consulta_vendas, data_inicio, data_fim,
+                            *totais_vendas(sessao, data_inicio, data_fim))
+        return nome_arquivo('relatorio_vendas', 'pdf'), 'application/pdf'
+    
+    escrever_xlsx(caminho, 'relatorio_vendas', CABECALHO_VENDAS, linhas_vendas(consulta_vendas))
+    return nome_arquivo('relatorio_vendas', 'xlsx'), MIMETYPE_XLSX
+
 @relatorios_bp.route('/produtos')
 @login_required
 def produtos():
     """Relatório de produtos mais vendidos"""
-    data_inicio = request.args.get('data_inicio')
-    data_fim = request.args.get('data_fim')
-    
-    # Definir período padrão (últimos 30 dias)
-    if not data_inicio or not data_fim:
-        data_fim = datetime.utcnow()
-        data_inicio = data_fim - timedelta(days=30)
-    else:
-        data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d')
-        data_fim = datetime.strptime(data_fim, '%Y-%m-%d')
+    formato = request.args.get('formato', 'html')
+    data_inicio, data_fim = obter_periodo()
     
-    # Produtos mais vendidos
-    produtos_vendidos = db.session.query(
+    # Produtos mais vendidos (resumos diários)
+    quantidade_vendida = func.sum(ResumoProdutoDiario.quantidade).label('quantidade_vendida')
+    produtos_vendidos = sessao_relatorios().query(
         Produto,
-        func.sum(ItemVenda.quantidade).label('quantidade_vendida'),
-        func.sum(ItemVenda.total).label('valor_total')
-    ).join(ItemVenda).join(Venda).filter(
-        Venda.data_venda.between(data_inicio, data_fim),
-        Venda.status == 'concluida'
-    ).group_by(Produto.id).order_by(
-        db.text('quantidade_vendida DESC')
-    ).limit(50).all()
+        quantidade_vendida,
+        func.sum(ResumoProdutoDiario.total).label('valor_total')
+    ).join(ResumoProdutoDiario, ResumoProdutoDiario.produto_id == Produto.id).filter(
+        ResumoProdutoDiario.dia.between(data_inicio.date(), data_fim.date())
+    ).group_by(Produto.id).having(quantidade_vendida > 0).order_by(
+        quantidade_vendida.desc()
+    )
+    
+    if formato in FORMATOS_EXPORTACAO:
+        linhas = ([p.codigo, p.nome, quantidade, valor]
+                  for p, quantidade, valor in produtos_vendidos.yield_per(1000))
+        return exportar(formato, 'relatorio_produtos',
+                        ['Código', 'Produto', 'Quantidade Vendida', 'Valor Total'], linhas)
     
     return render_template('relatorios/produtos.html',
-                         produtos_vendidos=produtos_vendidos,
+                         produtos_vendidos=produtos_vendidos.limit(50).all(),
                          data_inicio=data_inicio,
                          data_fim=data_fim)
 
@@ -103,45 +203,134 @@ def produtos():
 @login_required
 def clientes():
     """Relatório de clientes"""
-    data_inicio = request.args.get('data_inicio')
-    data_fim = request.args.get('data_fim')
-    
-    # Definir período padrão (últimos 30 dias)
-    if not data_inicio or not data_fim:
-        data_fim = datetime.utcnow()
-        data_inicio = data_fim - timedelta(days=30)
-    else:
-        data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d')
-        data_fim = datetime.strptime(data_fim, '%Y-%m-%d')
+    formato = request.args.get('formato', 'html')
+    data_inicio, data_fim = obter_periodo()
     
-    # Clientes que mais compraram
-    clientes_top = db.session.query(
+    # Clientes que mais compraram (o cliente não faz parte dos resumos diários)
+    clientes_top = sessao_relatorios().query(
         Cliente,
         func.count(Venda.id).label('total_compras'),
         func.sum(Venda.total).label('valor_total')
     ).join(Venda).filter(
-        Venda.data_venda.between(data_inicio, data_fim),
+        filtro_periodo(Venda.data_venda, data_inicio, data_fim),
         Venda.status == 'concluida'
     ).group_by(Cliente.id).order_by(
         db.text('valor_total DESC')
-    ).limit(50).all()
+    )
+    
+    if formato in FORMATOS_EXPORTACAO:
+        linhas = ([c.nome, c.cpf_nuit, c.telefone, c.email, compras, valor]
+                  for c, compras, valor in clientes_top.yield_per(1000))
+        return exportar(formato, 'relatorio_clientes',
+                        ['Cliente', 'NUIT', 'Telefone', 'Email', 'Total de Compras', 'Valor Total'], linhas)
     
     return render_template('relatorios/clientes.html',
-                         clientes_top=clientes_top,
+                         clientes_top=clientes_top.limit(50).all(),
                          data_inicio=data_inicio,
                          data_fim=data_fim)
 
-def gerar_pdf_vendas(vendas, data_inicio, data_fim, total_vendas, valor_total, ticket_medio):
-    """Gerar PDF do relatório de vendas"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
+@relatorios_bp.route('/analise')
+@login_required
+def analise():
+    """Análise de vendas: pagamentos, mapa de calor, curva ABC e margem por categoria"""
+    formato = request.args.get('formato', 'html')
+    tabela = request.args.get('tabela', 'curva_abc')
+    data_inicio, data_fim = obter_periodo()
+    
+    itens = carregar_itens(sessao_relatorios(), filtro_periodo(Venda.data_venda, data_inicio, data_fim))
+    resultado = analisar_vendas(itens)
+    
+    if formato in FORMATOS_EXPORTACAO and tabela in TABELAS_EXPORTACAO:
+        cabecalho, linhas = linhas_exportacao(resultado, tabela)
+        return exportar(formato, f'analise_{tabela}', cabecalho, linhas)
+    
+    return render_template('relatorios/analise.html',
+                         data_inicio=data_inicio,
+                         data_fim=data_fim,
+                         **resultado)
+
+@relatorios_bp.route('/estoque')
+@login_required
+def estoque():
+    """Inventário valorizado no fechamento de um dia (padrão: hoje)"""
+    formato = request.args.get('formato', 'html')
+    data = request.args.get('data')
+    dia = datetime.strptime(data, '%Y-%m-%d').date() if data else datetime.utcnow().date()
+    sessao = sessao_relatorios()
+    
+    saldos = consulta_saldos(sessao, dia)
+    
+    if formato in FORMATOS_EXPORTACAO:
+        linhas = ([s.codigo, s.nome, s.quantidade, s.custo_unitario, s.valor]
+                  for s in sessao.execute(saldos.order_by(Produto.nome)).yield_per(1000))
+        return exportar(formato, f'inventario_{dia.strftime("%Y%m%d")}',
+                        ['Código', 'Produto', 'Quantidade', 'Custo Unitário', 'Valor'], linhas)
+    
+    total_produtos, total_unidades, valor_total = totais_saldos(sessao, dia)
+    
+    return render_template('relatorios/estoque.html',
+                         dia=dia,
+                         saldos=sessao.execute(saldos.order_by(db.text('valor DESC')).limit(100)).all(),
+                         total_produtos=total_produtos,
+                         total_unidades=total_unidades,
+                         valor_total=valor_total)
+
+@relatorios_bp.cli.command('reconstruir-resumos')
+@click.option('--desde', help='Data inicial (AAAA-MM-DD). Padrão: todo o histórico.')
+def reconstruir_resumos_comando(desde):
+    """Recalcula os resumos diários de vendas a partir das vendas gravadas"""
+    reconstruir_resumos(datetime.strptime(desde, '%Y-%m-%d').date() if desde else None)
+    db.session.commit()
+    click.echo('Resumos diários reconstruídos com sucesso.')
+
+def gerar_pdf_vendas(consulta_vendas, data_inicio, data_fim, total_vendas, valor_total, ticket_medio):
+    """Gerar PDF do relatório de vendas num arquivo temporário e enviá-lo"""
+    arquivo = tempfile.TemporaryFile()
+    escrever_pdf_vendas(arquivo, consulta_vendas, data_inicio, data_fim, total_vendas, valor_total, ticket_medio)
+    arquivo.seek(0)
+    
+    return send_file(
+        arquivo,
+        as_attachment=True,
+        download_name=nome_arquivo('relatorio_vendas', 'pdf'),
+        mimetype='application/pdf'
+    )
+
+def escrever_pdf_vendas(arquivo, consulta_vendas, data_inicio, data_fim, total_vendas, valor_total, ticket_medio):
+    """
+    Grava em `arquivo` (caminho ou arquivo aberto) o PDF do relatório de
+    vendas com todas as vendas do período.
+    
+    As vendas são lidas do banco em blocos (yield_per) e cada página é
+    desenhada e descartada antes da seguinte, direto no arquivo em disco,
+    para que o consumo de memória não cresça com o período.
+    """
+    pdf = canvas.Canvas(arquivo, pagesize=A4)
+    largura, altura = A4
+    margem = 2*cm
     styles = getSampleStyleSheet()
+    pagina = 1
+    
+    def desenhar(flowable, y):
+        _, h = flowable.wrap(largura - 2*margem, altura)
+        flowable.drawOn(pdf, margem, y - h)
+        return y - h
+    
+    def desenhar_pagina(linhas, y):
+        tabela = Table([['Nº Venda', 'Data', 'Cliente', 'Total']] + linhas,
+                       colWidths=[3*cm, 3*cm, 7*cm, 3*cm])
+        tabela.setStyle(ESTILO_TABELA_VENDAS)
+        desenhar(tabela, y)
+        pdf.setFont('Helvetica', 8)
+        pdf.drawRightString(largura - margem, margem / 2, f'Página {pagina}')
+        pdf.showPage()
+    
+    def linhas_que_cabem(y):
+        return max(1, int((y - margem - ALTURA_CABECALHO_TABELA) / ALTURA_LINHA_TABELA))
     
     # Título
     titulo = Paragraph(f"<b>Relatório de Vendas</b><br/>{data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}", styles['Title'])
-    elements.append(titulo)
-    elements.append(Spacer(1, 0.5*cm))
+    y = desenhar(titulo, altura - margem) - 0.5*cm
     
     # Resumo
     resumo_data = [
@@ -155,37 +344,26 @@ def gerar_pdf_vendas(vendas, data_inicio, data_fim, total_vendas, valor_total, t
         ('GRID', (0, 0), (-1, -1), 1, colors.black),
         ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
     ]))
-    elements.append(resumo_table)
-    elements.append(Spacer(1, 1*cm))
+    y = desenhar(resumo_table, y) - 1*cm
     
-    # Tabela de vendas
-    vendas_data = [['Nº Venda', 'Data', 'Cliente', 'Total']]
-    for venda in vendas[:50]:  # Limitar a 50 vendas
-        vendas_data.append([
+    # Tabela de vendas, uma página por vez
+    linhas = []
+    capacidade = linhas_que_cabem(y)
+    for venda in consulta_vendas.yield_per(500):
+        linhas.append([
             venda.numero_venda,
             venda.data_venda.strftime('%d/%m/%Y'),
             venda.cliente.nome if venda.cliente else 'Cliente não informado',
             f"{venda.total:,.2f}"
         ])
+        if len(linhas) == capacidade:
+            desenhar_pagina(linhas, y)
+            pagina += 1
+            linhas = []
+            y = altura - margem
+            capacidade = linhas_que_cabem(y)
     
-    vendas_table = Table(vendas_data, colWidths=[3*cm, 3*cm, 7*cm, 3*cm])
-    vendas_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(vendas_table)
-    
-    doc.build(elements)
-    buffer.seek(0)
+    if linhas or pagina == 1:
+        desenhar_pagina(linhas, y)
     
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=f'relatorio_vendas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
-        mimetype='application/pdf'
-    )
+    pdf.save()
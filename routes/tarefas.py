@@ -0,0 +1,83 @@
+import os
+import click
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, send_file, abort
+from flask_login import login_required, current_user
+from models import db, Tarefa
+from services.tarefas import processar_pendentes, limpar_antigas, retomar_se_parada
+
+tarefas_bp = Blueprint('tarefas', __name__, url_prefix='/tarefas')
+
+def quer_json():
+    """A requisição veio de um cliente que espera JSON (fetch/XHR)"""
+    return request.is_json or request.accept_mimetypes.best == 'application/json' or \
+        request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+def dados_tarefa(tarefa):
+    dados = {
+        'success': True,
+        'tarefa_id': tarefa.id,
+        'status': tarefa.status,
+        'status_url': url_for('tarefas.status', tarefa_id=tarefa.id),
+        'criada_em': tarefa.criada_em.isoformat() if tarefa.criada_em else None,
+        'concluida_em': tarefa.concluida_em.isoformat() if tarefa.concluida_em else None
+    }
+    if tarefa.status == 'concluida':
+        dados['download_url'] = url_for('tarefas.download', tarefa_id=tarefa.id)
+    elif tarefa.status == 'erro':
+        dados['error'] = tarefa.erro
+    return dados
+
+def resposta_tarefa(tarefa):
+    """Resposta a um pedido de relatório em segundo plano: 202 com o id (JSON) ou a página de acompanhamento"""
+    if quer_json():
+        return jsonify(dados_tarefa(tarefa)), 200 if tarefa.status == 'concluida' else 202
+    return redirect(url_for('tarefas.status', tarefa_id=tarefa.id))
+
+def obter_tarefa(tarefa_id):
+    """Tarefa do usuário logado (administradores veem todas)"""
+    tarefa = db.session.get(Tarefa, tarefa_id)
+    if tarefa is None:
+        abort(404)
+    if tarefa.usuario_id != current_user.id and current_user.tipo != 'admin':
+        abort(403)
+    return tarefa
+
+@tarefas_bp.route('/<tarefa_id>')
+@login_required
+def status(tarefa_id):
+    """Situação da tarefa"""
+    tarefa = obter_tarefa(tarefa_id)
+    retomar_se_parada(tarefa)
+
+    if quer_json():
+        return jsonify(dados_tarefa(tarefa))
+
+    return render_template('tarefas/status.html', tarefa=tarefa)
+
+@tarefas_bp.route('/<tarefa_id>/download')
+@login_required
+def download(tarefa_id):
+    """Baixa o arquivo gerado pela tarefa"""
+    tarefa = obter_tarefa(tarefa_id)
+
+    if tarefa.status != 'concluida' or not tarefa.arquivo or not os.path.exists(tarefa.arquivo):
+        abort(404)
+
+    return send_file(tarefa.arquivo,
+                     as_attachment=True,
+                     download_name=tarefa.nome_arquivo,
+                     mimetype=tarefa.mimetype)
+
+@tarefas_bp.cli.command('processar')
+@click.option('--limite', type=int, help='Quantidade máxima de tarefas a executar.')
+def processar_comando(limite):
+    """Executa as tarefas pendentes (worker separado ou tarefas perdidas num reinício)"""
+    executadas = processar_pendentes(limite)
+    click.echo(f'{executadas} tarefa(s) executada(s).')
+
+@tarefas_bp.cli.command('limpar')
+@click.option('--dias', type=int, default=7, show_default=True, help='Idade mínima das tarefas apagadas.')
+def limpar_comando(dias):
+    """Apaga tarefas terminadas e os arquivos gerados"""
+    apagadas = limpar_antigas(dias)
+    click.echo(f'{apagadas} tarefa(s) apagada(s).')
@@ -1,28 +1,52 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
-from models import db, Venda, ItemVenda, Produto, Cliente, MovimentoEstoque, Caixa, MovimentoCaixa
+from models import db, Venda, ItemVenda, Produto, Cliente, MovimentoEstoque
+from services.caixa import caixa_aberto_atual
+from services.dashboard import invalidar_metricas
+from services.paginacao import paginar_keyset
+from services.vendas import registrar_venda, sincronizar_vendas, cancelar_venda, validar_uuid_cliente, venda_por_uuid, VendaErro
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
 
 vendas_bp = Blueprint('vendas', __name__, url_prefix='/vendas')
 
+# Vendas aceitas por requisição em /vendas/sincronizar
+MAX_VENDAS_SINCRONIZACAO = 200
+
+def carregamento_venda_completa():
+    """Venda com cliente, vendedor e itens/produtos (detalhes e recibo)"""
+    return (
+        joinedload(Venda.cliente),
+        joinedload(Venda.vendedor),
+        selectinload(Venda.itens).joinedload(ItemVenda.produto)
+    )
+
 @vendas_bp.route('/')
 @login_required
 def listar():
     """Lista todas as vendas"""
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     data_inicio = request.args.get('data_inicio')
     data_fim = request.args.get('data_fim')
     
-    query = Venda.query
+    query = Venda.query.options(
+        joinedload(Venda.cliente),
+        joinedload(Venda.vendedor)
+    )
     
     if data_inicio:
         query = query.filter(Venda.data_venda >= datetime.strptime(data_inicio, '%Y-%m-%d'))
     if data_fim:
         query = query.filter(Venda.data_venda <= datetime.strptime(data_fim, '%Y-%m-%d'))
     
-    vendas = query.order_by(Venda.data_venda.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    if cursor is not None or current_app.config.get('PAGINACAO_KEYSET'):
+        vendas = paginar_keyset(query, (Venda.data_venda, Venda.id), cursor, por_pagina=20)
+    else:
+        vendas = query.order_by(Venda.data_venda.desc()).paginate(
+            page=page, per_page=20, error_out=False
+        )
     
     return render_template('vendas/listar.html', vendas=vendas)
 
@@ -30,7 +54,7 @@ def listar():
 @login_required
 def detalhes(id):
     """Detalhes de uma venda"""
-    venda = Venda.query.get_or_404(id)
+    venda = Venda.query.options(*carregamento_venda_completa()).get_or_404(id)
     return render_template('vendas/detalhes.html', venda=venda)
 
 @vendas_bp.route('/pdv')
@@ -38,7 +62,7 @@ def detalhes(id):
 def pdv():
     """Ponto de Venda (PDV)"""
     # Verificar se há caixa aberto
-    caixa_aberto = Caixa.query.filter_by(status='aberto').first()
+    caixa_aberto = caixa_aberto_atual()
     
     if not caixa_aberto:
         flash('Nenhum caixa está aberto. Por favor, abra um caixa primeiro.', 'warning')
@@ -50,12 +74,26 @@ def pdv():
 @vendas_bp.route('/processar', methods=['POST'])
 @login_required
 def processar_venda():
-    """Processar uma nova venda"""
+    """
+    Processar uma nova venda.
+    
+    Aceita uma chave de idempotência (cabeçalho Idempotency-Key ou campo
+    uuid_cliente, um UUID): repetir a requisição com a mesma chave devolve a
+    venda já gravada, sem processá-la de novo.
+    """
+    chave = None
     try:
         data = request.get_json()
         
+        chave = validar_uuid_cliente(request.headers.get('Idempotency-Key') or data.get('uuid_cliente'))
+        if chave:
+            data['uuid_cliente'] = chave
+            gravada = venda_por_uuid(chave)
+            if gravada:
+                return resposta_venda_repetida(*gravada)
+        
         # Verificar caixa aberto
-        caixa_aberto = Caixa.query.filter_by(status='aberto').first()
+        caixa_aberto = caixa_aberto_atual()
         if not caixa_aberto:
             return jsonify({'success': False, 'error': 'Nenhum caixa está aberto'}), 400
         
@@ -63,86 +101,66 @@ def processar_venda():
         if not data.get('itens') or len(data['itens']) == 0:
             return jsonify({'success': False, 'error': 'Nenhum item na venda'}), 400
         
-        # Gerar número da venda
-        ultima_venda = Venda.query.order_by(Venda.id.desc()).first()
-        numero_venda = f"VND{(ultima_venda.id + 1):06d}" if ultima_venda else "VND000001"
-        
-        # Criar venda
-        venda = Venda(
-            numero_venda=numero_venda,
-            cliente_id=data.get('cliente_id') or None,
-            vendedor_id=current_user.id,
-            subtotal=float(data['subtotal']),
-            desconto=float(data.get('desconto', 0)),
-            total=float(data['total']),
-            forma_pagamento=data['forma_pagamento'],
-            observacoes=data.get('observacoes')
-        )
-        
-        db.session.add(venda)
-        db.session.flush()
-        
-        # Processar itens da venda
-        for item_data in data['itens']:
-            produto = Produto.query.get(item_data['produto_id'])
-            
-            if not produto:
-                db.session.rollback()
-                return jsonify({'success': False, 'error': f'Produto {item_data["produto_id"]} não encontrado'}), 400
-            
-            if produto.estoque_atual < item_data['quantidade']:
-                db.session.rollback()
-                return jsonify({'success': False, 'error': f'Estoque insuficiente para {produto.nome}'}), 400
-            
-            # Criar item da venda
-            item = ItemVenda(
-                venda_id=venda.id,
-                produto_id=produto.id,
-                quantidade=item_data['quantidade'],
-                preco_unitario=float(item_data['preco_unitario']),
-                subtotal=float(item_data['subtotal']),
-                desconto=float(item_data.get('desconto', 0)),
-                total=float(item_data['total'])
-            )
-            db.session.add(item)
-            
-            # Atualizar estoque
-            estoque_anterior = produto.estoque_atual
-            produto.estoque_atual -= item_data['quantidade']
-            
-            # Registrar movimento de estoque
-            movimento = MovimentoEstoque(
-                produto_id=produto.id,
-                tipo='saida',
-                quantidade=item_data['quantidade'],
-                estoque_anterior=estoque_anterior,
-                estoque_atual=produto.estoque_atual,
-                motivo=f'Venda {numero_venda}',
-                usuario_id=current_user.id
-            )
-            db.session.add(movimento)
-        
-        # Registrar movimento de caixa
-        movimento_caixa = MovimentoCaixa(
-            caixa_id=caixa_aberto.id,
-            tipo='entrada',
-            valor=venda.total,
-            forma_pagamento=venda.forma_pagamento,
-            descricao=f'Venda {numero_venda}',
-            venda_id=venda.id,
-            usuario_id=current_user.id
-        )
-        db.session.add(movimento_caixa)
+        venda = registrar_venda(data, current_user.id, caixa_aberto)
+        venda_id, numero_venda = venda.id, venda.numero_venda
         
         db.session.commit()
+        invalidar_metricas()
         
         return jsonify({
             'success': True,
-            'venda_id': venda.id,
-            'numero_venda': venda.numero_venda,
+            'venda_id': venda_id,
+            'numero_venda': numero_venda,
             'message': 'Venda processada com sucesso!'
         })
         
+    except VendaErro as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except IntegrityError:
+        db.session.rollback()
+        # Outra requisição com a mesma chave gravou a venda primeiro
+        gravada = venda_por_uuid(chave) if chave else None
+        if gravada:
+            return resposta_venda_repetida(*gravada)
+        return jsonify({'success': False, 'error': 'Erro de integridade ao gravar a venda'}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def resposta_venda_repetida(venda_id, numero_venda):
+    """Resposta de /vendas/processar para uma chave de idempotência já usada"""
+    resposta = jsonify({
+        'success': True,
+        'venda_id': venda_id,
+        'numero_venda': numero_venda,
+        'message': 'Venda já processada anteriormente.'
+    })
+    resposta.headers['Idempotent-Replayed'] = 'true'
+    return resposta
+
+@vendas_bp.route('/sincronizar', methods=['POST'])
+@login_required
+def sincronizar():
+    """Recebe em lote as vendas feitas pelo PDV enquanto estava offline"""
+    try:
+        vendas = (request.get_json() or {}).get('vendas') or []
+        
+        if not vendas:
+            return jsonify({'success': False, 'error': 'Nenhuma venda para sincronizar'}), 400
+        if len(vendas) > MAX_VENDAS_SINCRONIZACAO:
+            return jsonify({'success': False, 'error': f'Envie no máximo {MAX_VENDAS_SINCRONIZACAO} vendas por lote'}), 400
+        
+        caixa_aberto = caixa_aberto_atual()
+        if not caixa_aberto:
+            return jsonify({'success': False, 'error': 'Nenhum caixa está aberto'}), 400
+        
+        resultados = sincronizar_vendas(vendas, current_user.id, caixa_aberto)
+        db.session.commit()
+        invalidar_metricas()
+        
+        return jsonify({'success': True, 'resultados': resultados})
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -151,51 +169,23 @@ def processar_venda():
 @login_required
 def cancelar(id):
     """Cancelar uma venda"""
-    venda = Venda.query.get_or_404(id)
+    venda = Venda.query.options(selectinload(Venda.itens)).get_or_404(id)
     
     if venda.status == 'cancelada':
         flash('Esta venda já foi cancelada.', 'warning')
         return redirect(url_for('vendas.detalhes', id=id))
     
     try:
-        # Reverter estoque
-        for item in venda.itens:
-            produto = item.produto
-            estoque_anterior = produto.estoque_atual
-            produto.estoque_atual += item.quantidade
-            
-            # Registrar movimento de estoque
-            movimento = MovimentoEstoque(
-                produto_id=produto.id,
-                tipo='entrada',
-                quantidade=item.quantidade,
-                estoque_anterior=estoque_anterior,
-                estoque_atual=produto.estoque_atual,
-                motivo=f'Cancelamento venda {venda.numero_venda}',
-                usuario_id=current_user.id
-            )
-            db.session.add(movimento)
-        
-        # Atualizar status da venda
-        venda.status = 'cancelada'
-        
-        # Registrar movimento de caixa (saída)
-        caixa_aberto = Caixa.query.filter_by(status='aberto').first()
-        if caixa_aberto:
-            movimento_caixa = MovimentoCaixa(
-                caixa_id=caixa_aberto.id,
-                tipo='saida',
-                valor=venda.total,
-                forma_pagamento=venda.forma_pagamento,
-                descricao=f'Cancelamento venda {venda.numero_venda}',
-                venda_id=venda.id,
-                usuario_id=current_user.id
-            )
-            db.session.add(movimento_caixa)
+        # Estornar estoque, resumos diários e caixa (saída no caixa aberto deste terminal)
+        cancelar_venda(venda, current_user.id, caixa_aberto_atual())
         
         db.session.commit()
+        invalidar_metricas()
         flash('Venda cancelada com sucesso!', 'success')
         
+    except VendaErro as e:
+        db.session.rollback()
+        flash(str(e), 'warning')
     except Exception as e:
         db.session.rollback()
         flash(f'Erro ao cancelar venda: {str(e)}', 'danger')
@@ -206,5 +196,5 @@ def cancelar(id):
 @login_required
 def imprimir(id):
     """Imprimir recibo da venda"""
-    venda = Venda.query.get_or_404(id)
+    venda = Venda.query.options(*carregamento_venda_completa()).get_or_404(id)
     return render_template('vendas/recibo.html', venda=venda)
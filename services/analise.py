@@ -0,0 +1,161 @@
+"""
+Análise de vendas do período com pandas.
+
+Os itens das vendas concluídas do período são lidos numa única consulta
+(pd.read_sql, colunas tipadas) e todos os indicadores saem de operações
+vetorizadas sobre esse DataFrame, sem hidratar objetos do ORM:
+
+- totais, ticket médio e participação de cada forma de pagamento;
+- mapa de calor de vendas por dia da semana x hora;
+- curva ABC dos produtos por faturamento;
+- margem por categoria.
+
+A margem usa o preço de custo atual do produto (o custo não é gravado no
+item da venda).
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from models import Venda, ItemVenda, Produto, Categoria
+
+DIAS_SEMANA = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+
+# Limites de participação acumulada no faturamento para as classes A e B
+LIMITE_CLASSE_A = 0.80
+LIMITE_CLASSE_B = 0.95
+
+TIPOS_COLUNAS = {
+    'venda_id': 'int64',
+    'forma_pagamento': 'category',
+    'total_venda': 'float64',
+    'produto_id': 'int64',
+    'codigo': 'string',
+    'produto': 'string',
+    'categoria': 'string',
+    'quantidade': 'int64',
+    'total_item': 'float64',
+    'custo_item': 'float64'
+}
+
+
+def carregar_itens(sessao, filtro_periodo):
+    """DataFrame com um item de venda por linha (e os dados da venda repetidos)"""
+    consulta = select(
+        ItemVenda.venda_id,
+        Venda.data_venda,
+        Venda.forma_pagamento,
+        Venda.total.label('total_venda'),
+        ItemVenda.produto_id,
+        Produto.codigo,
+        Produto.nome.label('produto'),
+        Categoria.nome.label('categoria'),
+        ItemVenda.quantidade,
+        ItemVenda.total.label('total_item'),
+        (Produto.preco_custo * ItemVenda.quantidade).label('custo_item')
+    ).join(Venda, ItemVenda.venda_id == Venda.id).join(
+        Produto, ItemVenda.produto_id == Produto.id
+    ).outerjoin(Categoria, Produto.categoria_id == Categoria.id).where(
+        filtro_periodo, Venda.status == 'concluida'
+    )
+
+    itens = pd.read_sql(consulta, sessao.connection(), parse_dates=['data_venda'])
+    itens['categoria'] = itens['categoria'].fillna('Sem categoria')
+    return itens.astype(TIPOS_COLUNAS)
+
+
+def _totais(vendas):
+    quantidade = len(vendas)
+    valor = float(vendas['total_venda'].sum())
+    return {
+        'total_vendas': quantidade,
+        'valor_total': valor,
+        'ticket_medio': valor / quantidade if quantidade else 0
+    }
+
+
+def _por_pagamento(vendas):
+    resumo = vendas.groupby('forma_pagamento', observed=True)['total_venda'].agg(
+        quantidade='count', total='sum'
+    ).sort_values('total', ascending=False)
+    total = resumo['total'].sum()
+    resumo['percentual'] = resumo['total'] / total * 100 if total else 0.0
+    return resumo.reset_index()
+
+
+def _mapa_calor(vendas):
+    """Valor vendido por dia da semana (linhas, segunda a domingo) e hora (colunas, 0-23)"""
+    mapa = vendas.pivot_table(
+        index=vendas['data_venda'].dt.dayofweek,
+        columns=vendas['data_venda'].dt.hour,
+        values='total_venda',
+        aggfunc='sum',
+        fill_value=0
+    ).reindex(index=range(7), columns=range(24), fill_value=0)
+    mapa.index = DIAS_SEMANA
+    return mapa
+
+
+def _curva_abc(itens):
+    curva = itens.groupby(['produto_id', 'codigo', 'produto'], observed=True).agg(
+        quantidade=('quantidade', 'sum'), total=('total_item', 'sum')
+    ).sort_values('total', ascending=False).reset_index()
+    total = curva['total'].sum()
+    curva['percentual'] = curva['total'] / total * 100 if total else 0.0
+    curva['acumulado'] = curva['percentual'].cumsum()
+    # A classe vem da participação acumulada *antes* do produto, para que o
+    # item que cruza o limite ainda conte na classe anterior
+    anterior = (curva['acumulado'] - curva['percentual']) / 100
+    curva['classe'] = np.select(
+        [anterior < LIMITE_CLASSE_A, anterior < LIMITE_CLASSE_B], ['A', 'B'], default='C'
+    )
+    return curva
+
+
+def _margem_por_categoria(itens):
+    margem = itens.groupby('categoria', observed=True).agg(
+        receita=('total_item', 'sum'), custo=('custo_item', 'sum')
+    )
+    margem['margem'] = margem['receita'] - margem['custo']
+    margem['margem_percentual'] = (margem['margem'] / margem['receita'].where(margem['receita'] != 0)).fillna(0) * 100
+    return margem.sort_values('margem', ascending=False).reset_index()
+
+
+def analisar_vendas(itens):
+    """Todos os indicadores do período a partir do DataFrame de carregar_itens"""
+    vendas = itens.drop_duplicates('venda_id')[['venda_id', 'data_venda', 'forma_pagamento', 'total_venda']]
+    analise = _totais(vendas)
+    analise.update({
+        'por_pagamento': _por_pagamento(vendas),
+        'mapa_calor': _mapa_calor(vendas),
+        'curva_abc': _curva_abc(itens),
+        'margem_categoria': _margem_por_categoria(itens)
+    })
+    return analise
+
+
+# Tabelas exportáveis: nome -> (cabeçalho, função que gera as linhas)
+TABELAS_EXPORTACAO = {
+    'pagamentos': (
+        ['Forma de Pagamento', 'Vendas', 'Total', '%'],
+        lambda a: a['por_pagamento'][['forma_pagamento', 'quantidade', 'total', 'percentual']]
+    ),
+    'mapa_calor': (
+        ['Dia'] + [f'{h:02d}h' for h in range(24)],
+        lambda a: a['mapa_calor'].reset_index()
+    ),
+    'curva_abc': (
+        ['Código', 'Produto', 'Quantidade', 'Total', '%', '% Acumulado', 'Classe'],
+        lambda a: a['curva_abc'][['codigo', 'produto', 'quantidade', 'total', 'percentual', 'acumulado', 'classe']]
+    ),
+    'margem_categoria': (
+        ['Categoria', 'Receita', 'Custo', 'Margem', 'Margem %'],
+        lambda a: a['margem_categoria'][['categoria', 'receita', 'custo', 'margem', 'margem_percentual']]
+    )
+}
+
+
+def linhas_exportacao(analise, tabela):
+    """(cabeçalho, linhas) de uma das TABELAS_EXPORTACAO, com tipos nativos do Python"""
+    cabecalho, montar = TABELAS_EXPORTACAO[tabela]
+    dados = montar(analise).round(2).astype(object)
+    return cabecalho, (list(linha) for linha in dados.itertuples(index=False, name=None))
@@ -0,0 +1,46 @@
+"""
+Cache em memória com validade (TTL) e limite de entradas (LRU).
+
+Cada worker tem o seu próprio cache; por isso a validade deve ser curta e a
+invalidação explícita só alcança o processo que fez a alteração.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheTTL:
+    """Dicionário thread-safe cujas entradas expiram após `ttl` segundos"""
+
+    def __init__(self, ttl, max_entradas=1024):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave, padrao=None):
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None:
+                return padrao
+            valor, expira_em = entrada
+            if expira_em < time.monotonic():
+                del self._dados[chave]
+                return padrao
+            self._dados.move_to_end(chave)
+            return valor
+
+    def definir(self, chave, valor):
+        with self._lock:
+            self._dados[chave] = (valor, time.monotonic() + self.ttl)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entradas:
+                self._dados.popitem(last=False)
+
+    def invalidar(self, chave=None):
+        """Remove uma entrada, ou todas se nenhuma chave for informada"""
+        with self._lock:
+            if chave is None:
+                self._dados.clear()
+            else:
+                self._dados.pop(chave, None)
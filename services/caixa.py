@@ -0,0 +1,95 @@
+"""
+Movimentos de caixa com totais acumulados.
+
+Cada movimento grava a linha em movimentos_caixa e, na mesma transação,
+soma o valor em caixas.total_entradas/total_saidas (UPDATE com incremento
+no próprio banco, sem ler-modificar-gravar) e no total da forma de
+pagamento em totais_caixa_pagamento. Assim as telas do caixa mostram
+saldo e totais sem somar todos os movimentos do dia.
+
+Cada terminal (ou operador) tem o seu próprio caixa aberto. O terminal é
+identificado pelo cookie 'terminal', definido ao abrir o caixa; sem ele,
+vale o operador logado ('usuario-<id>'). O id do caixa aberto fica na
+sessão do usuário e é conferido por chave primária a cada uso.
+"""
+from decimal import Decimal
+from flask import request, session
+from flask_login import current_user
+from sqlalchemy import insert, update
+from models import db, Caixa, MovimentoCaixa, TotalCaixaPagamento
+from services.resumos import acumular
+
+TIPOS_MOVIMENTO = ('entrada', 'saida')
+
+COOKIE_TERMINAL = 'terminal'
+
+
+def terminal_atual():
+    """Identificação do terminal da requisição: cookie do terminal ou o operador logado"""
+    return request.cookies.get(COOKIE_TERMINAL) or f'usuario-{current_user.id}'
+
+
+def caixa_aberto_atual(bloquear=False):
+    """
+    Caixa aberto do terminal atual, ou None. Com bloquear=True a linha do
+    caixa é lida com SELECT ... FOR UPDATE (fechamento).
+    """
+    terminal = terminal_atual()
+    caixa_id = session.get('caixa_id')
+
+    if caixa_id is not None:
+        if bloquear:
+            caixa = Caixa.query.filter_by(id=caixa_id).with_for_update().first()
+        else:
+            caixa = db.session.get(Caixa, caixa_id)
+        if caixa is not None and caixa.status == 'aberto' and caixa.terminal == terminal:
+            return caixa
+
+    consulta = Caixa.query.filter_by(terminal=terminal, status='aberto')
+    if bloquear:
+        consulta = consulta.with_for_update()
+    caixa = consulta.first()
+
+    if caixa is None:
+        session.pop('caixa_id', None)
+    else:
+        session['caixa_id'] = caixa.id
+    return caixa
+
+
+def registrar_movimento(caixa_id, tipo, valor, forma_pagamento=None, descricao=None,
+                        usuario_id=None, venda_id=None):
+    """
+    Grava um movimento no caixa e atualiza os totais. Não faz commit.
+    Levanta ValueError para tipo ou valor inválido. Valor zero (venda com
+    desconto total ou brinde, e o cancelamento dela) não gera movimento.
+    """
+    if tipo not in TIPOS_MOVIMENTO:
+        raise ValueError(f'Tipo de movimento inválido: {tipo}')
+    valor = Decimal(str(valor))
+    if not valor.is_finite() or valor < 0:
+        raise ValueError('Valor do movimento inválido')
+    if valor == 0:
+        return
+
+    db.session.execute(insert(MovimentoCaixa).values(
+        caixa_id=caixa_id,
+        tipo=tipo,
+        valor=valor,
+        forma_pagamento=forma_pagamento,
+        descricao=descricao,
+        venda_id=venda_id,
+        usuario_id=usuario_id
+    ))
+
+    coluna = Caixa.total_entradas if tipo == 'entrada' else Caixa.total_saidas
+    db.session.execute(
+        update(Caixa).where(Caixa.id == caixa_id).values({coluna: coluna + valor})
+    )
+
+    acumular(TotalCaixaPagamento, ['caixa_id', 'forma_pagamento'], [{
+        'caixa_id': caixa_id,
+        'forma_pagamento': forma_pagamento or '',
+        'entradas': valor if tipo == 'entrada' else 0,
+        'saidas': valor if tipo == 'saida' else 0
+    }])
@@ -0,0 +1,293 @@
+"""
+Índice em memória do catálogo de produtos, usado pela busca do PDV.
+
+O índice é montado com uma única consulta na primeira busca do processo e
+depois mantido incrementalmente: as rotas que alteram produtos ou estoque
+agendam a alteração na sessão e ela só é aplicada ao índice depois do
+commit (um rollback descarta o que foi agendado). Como cada worker tem o
+seu próprio índice, ele também é recarregado por completo a cada
+CATALOGO_RECARGA_SEGUNDOS para absorver alterações feitas por outros
+processos. Alterações agendadas dentro de um savepoint que é desfeito
+(sincronização de vendas do PDV offline) também são descartadas.
+
+Estruturas mantidas:
+- código exato -> id (leitura de código de barras em O(1));
+- lista ordenada de palavras do nome e do código (busca por prefixo);
+- trigramas -> ids (busca por trecho em qualquer posição; termos de duas
+  letras completam a busca por prefixo com uma varredura das chaves).
+
+A busca ignora maiúsculas e acentos ("agua" encontra "Água"); a leitura
+de código não, porque "AB12" e "ab12" são produtos diferentes no banco.
+"""
+import bisect
+import os
+import threading
+import time
+import unicodedata
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Produto
+
+
+def normalizar(texto):
+    """Remove acentos e converte para minúsculas"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower().strip()
+
+
+def chave_codigo(codigo):
+    """Chave da leitura por código: o código como gravado, sem espaços nas pontas"""
+    return (codigo or '').strip()
+
+
+def trigramas(texto):
+    """Conjunto de trigramas de um texto já normalizado"""
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _dados_produto(produto):
+    return {
+        'id': produto.id,
+        'codigo': produto.codigo,
+        'nome': produto.nome,
+        'preco_venda': float(produto.preco_venda),
+        'estoque_atual': produto.estoque_atual,
+        'unidade_medida': produto.unidade_medida
+    }
+
+
+class CatalogoProdutos:
+    """Índice de busca dos produtos ativos"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._carregado_em = None
+        self.versao = 0
+        self._limpar()
+
+    def _limpar(self):
+        self._produtos = {}
+        self._chaves = {}
+        self._por_codigo = {}
+        self._palavras = []
+        self._trigramas = {}
+
+    # Manutenção do índice
+
+    def carregar(self):
+        """Recarrega o índice inteiro a partir do banco"""
+        produtos = db.session.query(
+            Produto.id, Produto.codigo, Produto.nome, Produto.preco_venda,
+            Produto.estoque_atual, Produto.unidade_medida
+        ).filter(Produto.ativo == True).all()
+
+        with self._lock:
+            self._limpar()
+            for produto in produtos:
+                self._indexar(_dados_produto(produto))
+            self._palavras.sort()
+            self._carregado_em = time.monotonic()
+            self.versao += 1
+
+    def _garantir_carregado(self):
+        validade = current_app.config.get('CATALOGO_RECARGA_SEGUNDOS', 300)
+        if self._carregado_em is None or time.monotonic() - self._carregado_em > validade:
+            self.carregar()
+
+    def _indexar(self, dados, ordenado=False):
+        produto_id = dados['id']
+        chave = f"{normalizar(dados['nome'])} {normalizar(dados['codigo'])}"
+
+        self._produtos[produto_id] = dados
+        self._chaves[produto_id] = chave
+        self._por_codigo[chave_codigo(dados['codigo'])] = produto_id
+
+        for palavra in set(chave.split()):
+            if ordenado:
+                bisect.insort(self._palavras, (palavra, produto_id))
+            else:
+                self._palavras.append((palavra, produto_id))
+        for trigrama in trigramas(chave):
+            self._trigramas.setdefault(trigrama, set()).add(produto_id)
+
+    def _desindexar(self, produto_id):
+        dados = self._produtos.pop(produto_id, None)
+        if dados is None:
+            return
+        chave = self._chaves.pop(produto_id)
+        codigo = chave_codigo(dados['codigo'])
+        if self._por_codigo.get(codigo) == produto_id:
+            del self._por_codigo[codigo]
+
+        for palavra in set(chave.split()):
+            posicao = bisect.bisect_left(self._palavras, (palavra, produto_id))
+            if posicao < len(self._palavras) and self._palavras[posicao] == (palavra, produto_id):
+                del self._palavras[posicao]
+        for trigrama in trigramas(chave):
+            ids = self._trigramas.get(trigrama)
+            if ids:
+                ids.discard(produto_id)
+                if not ids:
+                    del self._trigramas[trigrama]
+
+    def _aplicar_produto(self, dados, ativo):
+        with self._lock:
+            if self._carregado_em is None:
+                return
+            self._desindexar(dados['id'])
+            if ativo:
+                self._indexar(dados, ordenado=True)
+            self.versao += 1
+
+    def _aplicar_estoques(self, estoques):
+        with self._lock:
+            for produto_id, estoque in estoques.items():
+                dados = self._produtos.get(produto_id)
+                if dados is not None:
+                    dados['estoque_atual'] = estoque
+            self.versao += 1
+
+    def invalidar(self):
+        """Força a recarga completa na próxima consulta (ex.: importação em massa)"""
+        with self._lock:
+            self._carregado_em = None
+
+    def adicionar(self, produto):
+        """Indexa imediatamente um produto já gravado (ex.: criado por outro worker)"""
+        self._aplicar_produto(_dados_produto(produto), produto.ativo is not False)
+
+    # Alterações agendadas para depois do commit
+
+    def _agendar(self, operacao):
+        # Guarda a transação (ou savepoint) corrente para descartar a operação se ela for desfeita
+        sessao = db.session()
+        transacao = sessao.get_nested_transaction() or sessao.get_transaction()
+        sessao.info.setdefault('catalogo_pendente', []).append((transacao, operacao))
+
+    def registrar_produto(self, produto):
+        """Agenda a (re)indexação de um produto criado ou editado"""
+        dados = _dados_produto(produto)
+        ativo = produto.ativo is not False
+        self._agendar(lambda: self._aplicar_produto(dados, ativo))
+
+    def registrar_estoques(self, estoques):
+        """Agenda a atualização de estoque: {produto_id: estoque_atual}"""
+        estoques = dict(estoques)
+        self._agendar(lambda: self._aplicar_estoques(estoques))
+
+    def registrar_recarga(self):
+        """Agenda a recarga completa do índice (alterações em massa feitas com UPDATE)"""
+        self._agendar(self.invalidar)
+
+    # Consultas
+
+    def buscar(self, termo, limite=10):
+        """Busca por código, prefixo ou trecho do nome/código"""
+        self._garantir_carregado()
+        codigo = chave_codigo(termo)
+        termo = normalizar(termo)
+        palavras = termo.split()
+        if len(termo) < 2 or not palavras:
+            return []
+
+        with self._lock:
+            longas = [p for p in palavras if len(p) >= 3]
+            if longas:
+                candidatos = None
+                for trigrama in sorted(set().union(*(trigramas(p) for p in longas)),
+                                       key=lambda t: len(self._trigramas.get(t, ()))):
+                    ids = self._trigramas.get(trigrama, set())
+                    candidatos = set(ids) if candidatos is None else candidatos & ids
+                    if not candidatos:
+                        break
+            else:
+                candidatos = set()
+                prefixo = max(palavras, key=len)
+                posicao = bisect.bisect_left(self._palavras, (prefixo,))
+                while posicao < len(self._palavras) and self._palavras[posicao][0].startswith(prefixo):
+                    candidatos.add(self._palavras[posicao][1])
+                    posicao += 1
+                if len(candidatos) < limite:
+                    # Termos curtos sem trigramas: completa com trechos no meio das palavras
+                    candidatos.update(pid for pid, chave in self._chaves.items() if prefixo in chave)
+
+            exato = self._por_codigo.get(codigo)
+            encontrados = [
+                produto_id for produto_id in (candidatos or ())
+                if all(p in self._chaves[produto_id] for p in palavras)
+            ]
+
+            def relevancia(produto_id):
+                chave = self._chaves[produto_id]
+                prefixo = any(c.startswith(palavras[0]) for c in chave.split())
+                return (produto_id != exato, not prefixo, chave)
+
+            encontrados.sort(key=relevancia)
+            if exato is not None and exato not in encontrados:
+                encontrados.insert(0, exato)
+
+            return [dict(self._produtos[produto_id]) for produto_id in encontrados[:limite]]
+
+    def todos(self):
+        """
+        (versão, lista de todos os produtos indexados) para o catálogo offline
+        do PDV. A versão muda a cada alteração e identifica o processo.
+        """
+        self._garantir_carregado()
+        with self._lock:
+            versao = f'{os.getpid()}-{self._carregado_em:.3f}-{self.versao}'
+            return versao, [dict(dados) for dados in self._produtos.values()]
+
+    def por_codigo(self, codigo):
+        """Produto ativo com o código exato, ou None"""
+        self._garantir_carregado()
+        with self._lock:
+            produto_id = self._por_codigo.get(chave_codigo(codigo))
+            return dict(self._produtos[produto_id]) if produto_id is not None else None
+
+    def por_codigos(self, codigos):
+        """Resolve vários códigos de uma vez: ({codigo: produto}, [códigos não indexados])"""
+        self._garantir_carregado()
+        encontrados, faltando = {}, []
+        with self._lock:
+            for codigo in codigos:
+                produto_id = self._por_codigo.get(chave_codigo(codigo))
+                if produto_id is None:
+                    faltando.append(codigo)
+                else:
+                    encontrados[codigo] = dict(self._produtos[produto_id])
+        return encontrados, faltando
+
+
+catalogo = CatalogoProdutos()
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_pendentes(sessao):
+    for _, operacao in sessao.info.pop('catalogo_pendente', []):
+        operacao()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_pendentes(sessao, transacao_desfeita):
+    """Descarta o que foi agendado na transação desfeita ou em savepoints dentro dela"""
+    pendentes = sessao.info.get('catalogo_pendente')
+    if not pendentes:
+        return
+
+    def desfeita(transacao):
+        while transacao is not None:
+            if transacao is transacao_desfeita:
+                return True
+            transacao = transacao.parent
+        return False
+
+    sessao.info['catalogo_pendente'] = [(t, op) for t, op in pendentes if not desfeita(t)]
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _encerrar_pendentes(sessao, transacao):
+    # Transação principal encerrada sem commit (ex.: close): nada mais a aplicar
+    if transacao.parent is None:
+        sessao.info.pop('catalogo_pendente', None)
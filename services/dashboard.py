@@ -0,0 +1,110 @@
+"""
+Indicadores do dashboard.
+
+Todos os números saem de poucas consultas agregadas (contagens de cadastro
+e a série diária lida dos resumos de vendas) e ficam em cache por
+DASHBOARD_CACHE_SEGUNDOS. O cache é invalidado quando uma venda é gravada
+ou cancelada neste processo. As leituras passam pela sessão de relatórios
+(réplica, se configurada).
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import joinedload
+from models import Produto, Cliente, Venda, ResumoVendaDiario, ResumoProdutoDiario
+from services.cache import CacheTTL
+from services.leitura import sessao_relatorios
+
+_cache = CacheTTL(ttl=30, max_entradas=4)
+
+
+def invalidar_metricas():
+    """Descarta os indicadores em cache (chamar após gravar/cancelar vendas)"""
+    _cache.invalidar()
+
+
+def _contagens(sessao):
+    total_clientes = select(func.count(Cliente.id)).where(
+        Cliente.ativo == True
+    ).scalar_subquery()
+
+    total_produtos, estoque_baixo, clientes = sessao.query(
+        func.count(Produto.id),
+        func.coalesce(func.sum(case((Produto.estoque_atual <= Produto.estoque_minimo, 1), else_=0)), 0),
+        total_clientes
+    ).filter(Produto.ativo == True).one()
+
+    return {
+        'total_produtos': total_produtos,
+        'total_clientes': clientes,
+        'produtos_estoque_baixo': estoque_baixo
+    }
+
+
+def _vendas_por_dia(sessao, hoje, inicio_mes):
+    inicio = min(hoje - timedelta(days=6), inicio_mes.date())
+
+    totais = {
+        dia: float(total or 0)
+        for dia, total in sessao.query(
+            ResumoVendaDiario.dia, func.sum(ResumoVendaDiario.total)
+        ).filter(ResumoVendaDiario.dia >= inicio).group_by(ResumoVendaDiario.dia).all()
+    }
+
+    return {
+        'vendas_hoje': totais.get(hoje, 0),
+        'vendas_mes': sum(t for d, t in totais.items() if d >= inicio_mes.date()),
+        'vendas_por_dia': [{
+            'dia': (hoje - timedelta(days=i)).strftime('%d/%m'),
+            'total': totais.get(hoje - timedelta(days=i), 0)
+        } for i in range(6, -1, -1)]
+    }
+
+
+def _ultimas_vendas(sessao):
+    vendas = sessao.query(Venda).options(joinedload(Venda.cliente)).filter_by(
+        status='concluida'
+    ).order_by(Venda.data_venda.desc()).limit(10).all()
+
+    # Guardar dados simples: objetos ORM não podem ser reaproveitados entre sessões
+    return [{
+        'id': v.id,
+        'numero_venda': v.numero_venda,
+        'data_venda': v.data_venda,
+        'cliente': {'nome': v.cliente.nome} if v.cliente else None,
+        'forma_pagamento': v.forma_pagamento,
+        'total': v.total
+    } for v in vendas]
+
+
+def _produtos_mais_vendidos(sessao, inicio_mes):
+    total_vendido = func.sum(ResumoProdutoDiario.quantidade).label('total_vendido')
+    linhas = sessao.query(
+        Produto.id, Produto.nome, total_vendido
+    ).join(ResumoProdutoDiario, ResumoProdutoDiario.produto_id == Produto.id).filter(
+        ResumoProdutoDiario.dia >= inicio_mes.date()
+    ).group_by(Produto.id, Produto.nome).having(
+        total_vendido > 0
+    ).order_by(total_vendido.desc()).limit(5).all()
+
+    return [({'id': pid, 'nome': nome}, quantidade) for pid, nome, quantidade in linhas]
+
+
+def metricas_dashboard():
+    """Retorna (do cache, se possível) todos os dados exibidos no dashboard"""
+    metricas = _cache.obter('dashboard')
+    if metricas is not None:
+        return metricas
+
+    hoje = datetime.utcnow().date()
+    inicio_mes = datetime(hoje.year, hoje.month, 1)
+
+    sessao = sessao_relatorios()
+    metricas = _contagens(sessao)
+    metricas.update(_vendas_por_dia(sessao, hoje, inicio_mes))
+    metricas['ultimas_vendas'] = _ultimas_vendas(sessao)
+    metricas['produtos_mais_vendidos'] = _produtos_mais_vendidos(sessao, inicio_mes)
+
+    _cache.ttl = current_app.config.get('DASHBOARD_CACHE_SEGUNDOS', 30)
+    _cache.definir('dashboard', metricas)
+    return metricas
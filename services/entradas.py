@@ -0,0 +1,149 @@
+"""
+Entrada de mercadoria (recebimento de compras de fornecedores).
+
+A entrada inteira é gravada numa única transação, com um número fixo de
+comandos SQL qualquer que seja a quantidade de linhas:
+
+- os produtos são bloqueados numa única consulta SELECT ... FOR UPDATE em
+  ordem de id (a mesma ordem do checkout do PDV, então entradas e vendas
+  concorrentes não entram em deadlock);
+- itens da entrada e movimentos de estoque são gravados em inserções em
+  lote e o estoque é incrementado com um único UPDATE (CASE por produto);
+- opcionalmente o preço de custo passa a ser o custo médio ponderado
+  entre o estoque existente e o recebido, no mesmo UPDATE, e a alteração
+  é registrada no histórico de preços.
+"""
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import case, insert, update
+from models import (db, EntradaMercadoria, ItemEntradaMercadoria, Fornecedor, Produto,
+                    MovimentoEstoque, HistoricoPreco, entrada_numero_seq)
+from services.catalogo import catalogo
+from services.numeracao import proximo_numero
+from services.vendas import carregar_produtos_bloqueados
+
+CENTAVOS = Decimal('0.01')
+
+
+class EntradaErro(Exception):
+    """Erro de validação de uma entrada de mercadoria"""
+
+
+def validar_itens(itens):
+    """
+    Normaliza as linhas ({produto_id, quantidade, custo_unitario}) e levanta
+    EntradaErro para valores inválidos.
+    """
+    if not itens:
+        raise EntradaErro('Informe ao menos um item')
+
+    linhas = []
+    for numero, item in enumerate(itens, 1):
+        try:
+            produto_id = int(item['produto_id'])
+            quantidade = int(item['quantidade'])
+            custo = Decimal(str(item.get('custo_unitario') or 0).replace(',', '.'))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise EntradaErro(f'Item {numero}: dados inválidos')
+        if quantidade <= 0:
+            raise EntradaErro(f'Item {numero}: a quantidade deve ser maior que zero')
+        if not custo.is_finite() or custo < 0:
+            raise EntradaErro(f'Item {numero}: custo unitário inválido')
+        linhas.append({
+            'produto_id': produto_id,
+            'quantidade': quantidade,
+            'custo_unitario': custo.quantize(CENTAVOS),
+            'total': (custo * quantidade).quantize(CENTAVOS)
+        })
+    return linhas
+
+
+def custo_medio_ponderado(estoque, custo_atual, quantidade, custo_total_entrada):
+    """Custo médio entre o estoque existente e o recebido (estoque zerado ou negativo: custo da entrada)"""
+    if estoque <= 0:
+        return (custo_total_entrada / quantidade).quantize(CENTAVOS)
+    return ((estoque * Decimal(custo_atual) + custo_total_entrada) / (estoque + quantidade)).quantize(CENTAVOS)
+
+
+def registrar_entrada(fornecedor_id, itens, usuario_id=None, numero_documento=None,
+                      observacoes=None, custo_medio=False):
+    """Grava a entrada e atualiza o estoque (e o custo, se pedido). Não faz commit."""
+    if db.session.get(Fornecedor, fornecedor_id) is None:
+        raise EntradaErro('Fornecedor não encontrado')
+
+    linhas = validar_itens(itens)
+    por_produto = {}
+    for linha in linhas:
+        quantidade, total = por_produto.get(linha['produto_id'], (0, Decimal('0')))
+        por_produto[linha['produto_id']] = (quantidade + linha['quantidade'], total + linha['total'])
+
+    produtos = carregar_produtos_bloqueados(por_produto.keys())
+    faltando = sorted(set(por_produto) - set(produtos))
+    if faltando:
+        raise EntradaErro(f'Produto {faltando[0]} não encontrado')
+
+    agora = datetime.utcnow()
+    entrada = EntradaMercadoria(
+        numero=proximo_numero(entrada_numero_seq, EntradaMercadoria, 'ENT'),
+        fornecedor_id=fornecedor_id,
+        numero_documento=numero_documento or None,
+        data_entrada=agora,
+        usuario_id=usuario_id,
+        total=sum(linha['total'] for linha in linhas),
+        custo_medio=bool(custo_medio),
+        observacoes=observacoes or None
+    )
+    db.session.add(entrada)
+    db.session.flush()
+
+    db.session.execute(insert(ItemEntradaMercadoria.__table__),
+                       [dict(linha, entrada_id=entrada.id) for linha in linhas])
+
+    quantidades = {pid: quantidade for pid, (quantidade, _) in por_produto.items()}
+    valores = {Produto.estoque_atual: Produto.estoque_atual + case(quantidades, value=Produto.id)}
+
+    custos = {}
+    if custo_medio:
+        for pid, (quantidade, total) in por_produto.items():
+            produto = produtos[pid]
+            novo = custo_medio_ponderado(produto.estoque_atual, produto.preco_custo, quantidade, total)
+            if novo != produto.preco_custo:
+                custos[pid] = novo
+        if custos:
+            valores[Produto.preco_custo] = case(custos, value=Produto.id, else_=Produto.preco_custo)
+
+    db.session.execute(
+        update(Produto)
+        .where(Produto.id.in_(quantidades))
+        .values(valores)
+        .execution_options(synchronize_session=False)
+    )
+
+    motivo = f'Entrada de mercadoria {entrada.numero}'
+    db.session.execute(insert(MovimentoEstoque.__table__), [{
+        'produto_id': pid,
+        'tipo': 'entrada',
+        'quantidade': quantidade,
+        'estoque_anterior': produtos[pid].estoque_atual,
+        'estoque_atual': produtos[pid].estoque_atual + quantidade,
+        'motivo': motivo,
+        'data_movimento': agora,
+        'usuario_id': usuario_id
+    } for pid, quantidade in sorted(quantidades.items())])
+
+    if custos:
+        db.session.execute(insert(HistoricoPreco.__table__), [{
+            'produto_id': pid,
+            'preco_custo_anterior': produtos[pid].preco_custo,
+            'preco_custo': custo,
+            'preco_venda_anterior': produtos[pid].preco_venda,
+            'preco_venda': produtos[pid].preco_venda,
+            'motivo': motivo,
+            'data_alteracao': agora,
+            'usuario_id': usuario_id
+        } for pid, custo in sorted(custos.items())])
+
+    catalogo.registrar_estoques({
+        pid: produtos[pid].estoque_atual + quantidade for pid, quantidade in quantidades.items()
+    })
+    return entrada
@@ -0,0 +1,84 @@
+"""
+Exportação de relatórios em CSV e XLSX.
+
+As linhas chegam por um iterador (normalmente uma consulta com yield_per),
+então nenhum dos formatos precisa da lista inteira em memória: o CSV é
+enviado ao navegador à medida que é gerado e o XLSX é montado pelo modo
+write-only do openpyxl num arquivo temporário em disco.
+"""
+import csv
+import io
+import tempfile
+from datetime import datetime
+from flask import Response, send_file, stream_with_context
+from openpyxl import Workbook
+
+FORMATOS_EXPORTACAO = ('csv', 'xlsx')
+
+# Quantidade de linhas acumuladas antes de cada envio do CSV
+LINHAS_POR_BLOCO = 500
+
+MIMETYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def nome_arquivo(nome, extensao):
+    return f'{nome}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extensao}'
+
+
+def _valor_csv(valor):
+    if isinstance(valor, datetime):
+        return valor.strftime('%d/%m/%Y %H:%M:%S')
+    return valor
+
+
+def resposta_csv(nome, cabecalho, linhas):
+    """Resposta em streaming com o CSV (separador ';', compatível com o Excel em português)"""
+    def gerar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, delimiter=';')
+        buffer.write('\ufeff')
+        escritor.writerow(cabecalho)
+        for i, linha in enumerate(linhas, 1):
+            escritor.writerow([_valor_csv(v) for v in linha])
+            if i % LINHAS_POR_BLOCO == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(gerar()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={nome_arquivo(nome, "csv")}'}
+    )
+
+
+def escrever_xlsx(arquivo, nome, cabecalho, linhas):
+    """Grava a planilha em modo write-only em `arquivo` (caminho ou arquivo aberto)"""
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(title=nome[:31])
+    aba.append(cabecalho)
+    for linha in linhas:
+        aba.append(linha)
+    planilha.save(arquivo)
+
+
+def resposta_xlsx(nome, cabecalho, linhas):
+    """Planilha XLSX gerada em modo write-only num arquivo temporário"""
+    arquivo = tempfile.TemporaryFile()
+    escrever_xlsx(arquivo, nome, cabecalho, linhas)
+    arquivo.seek(0)
+
+    return send_file(
+        arquivo,
+        as_attachment=True,
+        download_name=nome_arquivo(nome, 'xlsx'),
+        mimetype=MIMETYPE_XLSX
+    )
+
+
+def exportar(formato, nome, cabecalho, linhas):
+    """Resposta de download no formato pedido ('csv' ou 'xlsx')"""
+    if formato == 'xlsx':
+        return resposta_xlsx(nome, cabecalho, linhas)
+    return resposta_csv(nome, cabecalho, linhas)
@@ -0,0 +1,330 @@
+"""
+Importação de produtos em massa a partir de CSV ou XLSX.
+
+O arquivo é lido linha a linha (CSV com separador ';' ou ',', ou XLSX em
+modo read-only do openpyxl) e processado em lotes de TAMANHO_LOTE linhas:
+
+- cada linha é validada em Python e os nomes de categoria e fornecedor são
+  resolvidos por um mapa em memória carregado uma vez (os que não existem
+  são cadastrados na hora);
+- o lote é gravado com um único INSERT ... ON CONFLICT (codigo) DO UPDATE,
+  que cria os produtos novos e atualiza os existentes;
+- o estoque inicial dos produtos novos vira um único INSERT em lote de
+  movimentos de estoque. O estoque de produtos já cadastrados não é
+  alterado pela importação (use os ajustes de estoque);
+- as mudanças de preço dos produtos já cadastrados vão para o histórico
+  de preços (motivo 'Importação') num único INSERT em lote;
+- cada lote é uma transação: um erro de banco descarta só aquele lote.
+
+Linhas inválidas não interrompem a importação; o resultado traz a lista de
+erros com o número da linha no arquivo.
+"""
+import csv
+import io
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from openpyxl import load_workbook
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Produto, Categoria, Fornecedor, MovimentoEstoque, HistoricoPreco
+from services.catalogo import catalogo, normalizar
+from services.resumos import insert_com_conflito
+
+TAMANHO_LOTE = 1000
+
+EXTENSOES_IMPORTACAO = ('csv', 'xlsx')
+
+# Limite das colunas de preço (Numeric(10, 2))
+PRECO_MAXIMO = Decimal('100000000')
+INTEIRO_MAXIMO = 2**31 - 1
+
+# Nomes aceitos no cabeçalho (sem acentos, minúsculas, '_' no lugar de espaços)
+COLUNAS = {
+    'codigo': 'codigo',
+    'codigo_de_barras': 'codigo',
+    'nome': 'nome',
+    'produto': 'nome',
+    'descricao': 'descricao',
+    'categoria': 'categoria',
+    'fornecedor': 'fornecedor',
+    'preco_custo': 'preco_custo',
+    'preco_de_custo': 'preco_custo',
+    'custo': 'preco_custo',
+    'preco_venda': 'preco_venda',
+    'preco_de_venda': 'preco_venda',
+    'preco': 'preco_venda',
+    'estoque': 'estoque',
+    'estoque_inicial': 'estoque',
+    'estoque_atual': 'estoque',
+    'estoque_minimo': 'estoque_minimo',
+    'unidade': 'unidade_medida',
+    'unidade_medida': 'unidade_medida'
+}
+
+# Campos atualizados quando o código já existe
+CAMPOS_ATUALIZADOS = ('nome', 'descricao', 'categoria_id', 'fornecedor_id',
+                      'preco_custo', 'preco_venda', 'estoque_minimo', 'unidade_medida')
+
+
+class LinhaInvalida(ValueError):
+    """Erro de validação de uma linha do arquivo"""
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _decimal(valor, campo, obrigatorio=False):
+    texto = _texto(valor)
+    if not texto:
+        if obrigatorio:
+            raise LinhaInvalida(f'{campo} é obrigatório')
+        return Decimal('0')
+    # Com vírgula e ponto, o último é o separador decimal e o outro agrupa
+    # milhares (1.234,56 ou 1,234.56); só com um deles, ele é o decimal
+    if ',' in texto and '.' in texto:
+        milhar = '.' if texto.rfind(',') > texto.rfind('.') else ','
+        texto = texto.replace(milhar, '')
+    texto = texto.replace(',', '.')
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        numero = None
+    if numero is None or not numero.is_finite():
+        raise LinhaInvalida(f'{campo} inválido: {valor}')
+    if isinstance(valor, str) and numero.as_tuple().exponent < -2:
+        # "1.234" ou "1,234": milhar sem centavos ou três casas decimais? Não arredondar
+        raise LinhaInvalida(f'{campo} ambíguo: {valor} (informe os centavos, ex.: 1.234,00)')
+    if numero < 0:
+        raise LinhaInvalida(f'{campo} não pode ser negativo')
+    if numero >= PRECO_MAXIMO:
+        raise LinhaInvalida(f'{campo} acima do limite')
+    return numero.quantize(Decimal('0.01'))
+
+
+def _inteiro(valor, campo):
+    texto = _texto(valor)
+    if not texto:
+        return 0
+    try:
+        numero = int(Decimal(texto.replace(',', '.')))
+    except (InvalidOperation, ValueError, OverflowError):
+        raise LinhaInvalida(f'{campo} inválido: {valor}')
+    if numero < 0:
+        raise LinhaInvalida(f'{campo} não pode ser negativo')
+    if numero > INTEIRO_MAXIMO:
+        raise LinhaInvalida(f'{campo} acima do limite')
+    return numero
+
+
+def _limitado(valor, campo, tamanho, obrigatorio=False):
+    texto = _texto(valor)
+    if obrigatorio and not texto:
+        raise LinhaInvalida(f'{campo} é obrigatório')
+    if len(texto) > tamanho:
+        raise LinhaInvalida(f'{campo} com mais de {tamanho} caracteres')
+    return texto
+
+
+def _mapear_cabecalho(cabecalho):
+    colunas = [COLUNAS.get(normalizar(_texto(nome)).replace(' ', '_')) for nome in cabecalho]
+    faltando = {'codigo', 'nome', 'preco_venda'} - set(colunas)
+    if faltando:
+        raise ValueError(f'Colunas obrigatórias ausentes: {", ".join(sorted(faltando))}')
+    return colunas
+
+
+def ler_linhas(arquivo, nome_arquivo):
+    """
+    Itera (número da linha, {coluna: valor}) de um CSV ou XLSX, sem carregar
+    o arquivo inteiro. Levanta ValueError se o formato ou o cabeçalho for inválido.
+    """
+    extensao = nome_arquivo.rsplit('.', 1)[-1].lower() if '.' in nome_arquivo else ''
+    planilha = None
+    if extensao == 'xlsx':
+        planilha = load_workbook(arquivo, read_only=True, data_only=True)
+        linhas = planilha.active.iter_rows(values_only=True)
+    elif extensao == 'csv':
+        texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+        amostra = texto.readline()
+        separador = ';' if amostra.count(';') >= amostra.count(',') else ','
+        linhas = csv.reader(
+            (linha for bloco in ([amostra], texto) for linha in bloco), delimiter=separador
+        )
+    else:
+        raise ValueError('Formato não suportado; envie um arquivo .csv ou .xlsx')
+
+    try:
+        colunas = _mapear_cabecalho(next(linhas, None) or [])
+        for numero, valores in enumerate(linhas, 2):
+            if not any(_texto(v) for v in valores):
+                continue
+            yield numero, {coluna: valor for coluna, valor in zip(colunas, valores) if coluna}
+    finally:
+        if planilha is not None:
+            planilha.close()
+
+
+class _Cadastros:
+    """Mapa nome normalizado -> id de categorias e fornecedores, criando os que faltam"""
+
+    def __init__(self):
+        self.categorias = {normalizar(nome): id for id, nome in
+                           db.session.execute(select(Categoria.id, Categoria.nome))}
+        self.fornecedores = {normalizar(nome): id for id, nome in
+                             db.session.execute(select(Fornecedor.id, Fornecedor.nome))}
+
+    def _resolver(self, mapa, modelo, nome):
+        chave = normalizar(nome)
+        if not chave:
+            return None
+        if chave not in mapa:
+            registro = modelo(nome=nome)
+            db.session.add(registro)
+            db.session.flush()
+            mapa[chave] = registro.id
+        return mapa[chave]
+
+    def categoria(self, nome):
+        return self._resolver(self.categorias, Categoria, nome)
+
+    def fornecedor(self, nome):
+        return self._resolver(self.fornecedores, Fornecedor, nome)
+
+
+def validar_linha(linha, cadastros):
+    """Dados do produto e estoque inicial de uma linha; levanta LinhaInvalida"""
+    produto = {
+        'codigo': _limitado(linha.get('codigo'), 'Código', 50, obrigatorio=True),
+        'nome': _limitado(linha.get('nome'), 'Nome', 200, obrigatorio=True),
+        'descricao': _texto(linha.get('descricao')) or None,
+        'preco_custo': _decimal(linha.get('preco_custo'), 'Preço de custo'),
+        'preco_venda': _decimal(linha.get('preco_venda'), 'Preço de venda', obrigatorio=True),
+        'estoque_minimo': _inteiro(linha.get('estoque_minimo'), 'Estoque mínimo'),
+        'unidade_medida': _limitado(linha.get('unidade_medida'), 'Unidade', 20).upper() or 'UN'
+    }
+    estoque = _inteiro(linha.get('estoque'), 'Estoque')
+    categoria = _limitado(linha.get('categoria'), 'Categoria', 100)
+    fornecedor = _limitado(linha.get('fornecedor'), 'Fornecedor', 150)
+    produto['categoria_id'] = cadastros.categoria(categoria)
+    produto['fornecedor_id'] = cadastros.fornecedor(fornecedor)
+    return produto, estoque
+
+
+def _gravar_lote(produtos, estoques, usuario_id):
+    """Upsert do lote e movimentos de estoque inicial dos produtos novos: (inseridos, atualizados)"""
+    codigos = [p['codigo'] for p in produtos]
+    agora = datetime.utcnow()
+    # Preços atuais dos produtos já cadastrados, para o histórico de preços
+    existentes = {codigo: (id, custo, venda) for codigo, id, custo, venda in db.session.execute(
+        select(Produto.codigo, Produto.id, Produto.preco_custo, Produto.preco_venda)
+        .where(Produto.codigo.in_(codigos))
+    )}
+
+    # Um único INSERT compilado para o lote inteiro (executemany / insertmanyvalues)
+    tabela = Produto.__table__
+    stmt = insert_com_conflito(tabela)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['codigo'],
+        set_={campo: getattr(stmt.excluded, campo) for campo in CAMPOS_ATUALIZADOS}
+    ).returning(tabela.c.id, tabela.c.codigo)
+    ids = {codigo: id for id, codigo in db.session.execute(stmt, [
+        dict(p, estoque_atual=0 if p['codigo'] in existentes else estoques[p['codigo']],
+             ativo=True, data_cadastro=agora)
+        for p in produtos
+    ])}
+
+    movimentos = [{
+        'produto_id': ids[codigo],
+        'tipo': 'entrada',
+        'quantidade': estoques[codigo],
+        'estoque_anterior': 0,
+        'estoque_atual': estoques[codigo],
+        'motivo': 'Estoque inicial (importação)',
+        'usuario_id': usuario_id,
+        'data_movimento': agora
+    } for codigo in codigos if codigo not in existentes and estoques[codigo] > 0]
+    if movimentos:
+        db.session.execute(insert(MovimentoEstoque.__table__), movimentos)
+
+    historico = []
+    for p in produtos:
+        if p['codigo'] not in existentes:
+            continue
+        id, custo, venda = existentes[p['codigo']]
+        custo, venda = Decimal(custo or 0), Decimal(venda or 0)
+        if (custo, venda) != (p['preco_custo'], p['preco_venda']):
+            historico.append({
+                'produto_id': id,
+                'preco_custo_anterior': custo,
+                'preco_custo': p['preco_custo'],
+                'preco_venda_anterior': venda,
+                'preco_venda': p['preco_venda'],
+                'motivo': 'Importação',
+                'data_alteracao': agora,
+                'usuario_id': usuario_id
+            })
+    if historico:
+        db.session.execute(insert(HistoricoPreco.__table__), historico)
+
+    return len(codigos) - len(existentes), len(existentes)
+
+
+def importar_produtos(linhas, usuario_id=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa as linhas de ler_linhas. Retorna um dicionário com inseridos,
+    atualizados, erros ([(linha, mensagem)]), segundos e linhas_por_segundo.
+    """
+    inicio = time.perf_counter()
+    cadastros = _Cadastros()
+    resultado = {'inseridos': 0, 'atualizados': 0, 'erros': []}
+    vistos = set()
+    total = 0
+
+    while True:
+        bloco = list(islice(linhas, tamanho_lote))
+        if not bloco:
+            break
+        total += len(bloco)
+
+        produtos, estoques, numeros = [], {}, []
+        for numero, linha in bloco:
+            try:
+                produto, estoque = validar_linha(linha, cadastros)
+            except LinhaInvalida as e:
+                resultado['erros'].append((numero, str(e)))
+                continue
+            if produto['codigo'] in vistos:
+                resultado['erros'].append((numero, f'Código {produto["codigo"]} repetido no arquivo'))
+                continue
+            vistos.add(produto['codigo'])
+            produtos.append(produto)
+            estoques[produto['codigo']] = estoque
+            numeros.append(numero)
+
+        try:
+            if produtos:
+                inseridos, atualizados = _gravar_lote(produtos, estoques, usuario_id)
+                resultado['inseridos'] += inseridos
+                resultado['atualizados'] += atualizados
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            # Categorias e fornecedores criados no lote também foram desfeitos
+            cadastros = _Cadastros()
+            mensagem = f'Lote não gravado: {e.__class__.__name__}: {getattr(e, "orig", e)}'
+            resultado['erros'].extend((numero, mensagem) for numero in numeros)
+
+    catalogo.invalidar()
+
+    segundos = time.perf_counter() - inicio
+    resultado['segundos'] = segundos
+    resultado['linhas_por_segundo'] = total / segundos if segundos else 0
+    resultado['erros'].sort()
+    return resultado
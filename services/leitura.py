@@ -0,0 +1,75 @@
+"""
+Sessão de leitura para relatórios e dashboard.
+
+Se SQLALCHEMY_BINDS['reporting'] estiver configurado (REPORTING_DATABASE_URL,
+normalmente uma réplica do PostgreSQL), as consultas pesadas de relatórios
+usam esse banco e não disputam o pool de conexões do PDV. Enquanto o
+atraso da réplica passar de RELATORIOS_ATRASO_MAXIMO_SEGUNDOS, ou se ela
+não responder, as leituras voltam para o banco principal.
+
+Sem o bind (desenvolvimento, testes) tudo é lido do banco principal.
+"""
+import logging
+from flask import current_app, g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from models import db
+from services.cache import CacheTTL
+
+BIND_RELATORIOS = 'reporting'
+
+logger = logging.getLogger(__name__)
+
+# Atraso medido da réplica, reaproveitado por alguns segundos
+_atrasos = CacheTTL(ttl=10, max_entradas=4)
+
+
+def atraso_replica(engine):
+    """Atraso da réplica em segundos (0 se o banco não for uma réplica em recuperação)"""
+    if engine.dialect.name != 'postgresql':
+        return 0.0
+    with engine.connect() as conn:
+        atraso = conn.execute(text(
+            'SELECT CASE WHEN pg_is_in_recovery() '
+            'THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+            'ELSE 0 END'
+        )).scalar()
+    return float(atraso or 0)
+
+
+def _replica_disponivel(engine):
+    atraso = _atrasos.obter(BIND_RELATORIOS)
+    if atraso is None:
+        try:
+            atraso = atraso_replica(engine)
+        except OperationalError:
+            logger.warning('Banco de relatórios indisponível; lendo do banco principal')
+            atraso = float('inf')
+        _atrasos.definir(BIND_RELATORIOS, atraso)
+
+    tolerancia = current_app.config.get('RELATORIOS_ATRASO_MAXIMO_SEGUNDOS', 300)
+    if atraso > tolerancia:
+        logger.warning('Réplica de relatórios atrasada (%.0f s); lendo do banco principal', atraso)
+        return False
+    return True
+
+
+def sessao_relatorios():
+    """Sessão para as leituras de relatórios: réplica, se configurada e em dia; senão db.session"""
+    if 'sessao_relatorios' not in g:
+        engine = db.engines.get(BIND_RELATORIOS)
+        if engine is not None and _replica_disponivel(engine):
+            g.sessao_relatorios = Session(bind=engine)
+        else:
+            g.sessao_relatorios = db.session
+    return g.sessao_relatorios
+
+
+def iniciar_leitura(app):
+    """Fecha a sessão de relatórios ao fim de cada contexto da aplicação"""
+    @app.teardown_appcontext
+    def _fechar_sessao_relatorios(exc):
+        sessao = g.pop('sessao_relatorios', None)
+        if sessao is not None and sessao is not db.session:
+            sessao.close()
@@ -0,0 +1,39 @@
+"""
+Numeração sequencial de documentos (vendas, caixas).
+
+No PostgreSQL os números saem de sequências do banco: nextval() não bloqueia
+nem participa da transação, então terminais concorrentes nunca recebem o
+mesmo número. Em bancos sem sequências (SQLite em desenvolvimento) usa-se o
+maior id da tabela.
+"""
+from sqlalchemy import func, select, text
+from models import db
+
+
+def proximo_numero(sequencia, modelo, prefixo):
+    """Retorna o próximo número formatado, ex.: VND000123"""
+    if db.session.get_bind().dialect.supports_sequences:
+        valor = db.session.scalar(select(sequencia.next_value()))
+    else:
+        valor = (db.session.query(func.max(modelo.id)).scalar() or 0) + 1
+    return f"{prefixo}{valor:06d}"
+
+
+def sincronizar_sequencia(sequencia, coluna):
+    """
+    Posiciona a sequência depois do maior número já emitido: o maior sufixo
+    numérico de `coluna` (ex.: Venda.numero_venda), o maior id (numeração
+    antiga) e o próprio valor atual da sequência. Nunca a faz voltar: números
+    consumidos por transações desfeitas não foram gravados, mas podem estar
+    à frente do maior id.
+    """
+    if not db.session.get_bind().dialect.supports_sequences:
+        return
+    tabela = coluna.table.name
+    db.session.execute(text(
+        f"SELECT setval('{sequencia.name}', GREATEST("
+        f"(SELECT COALESCE(MAX(CAST(SUBSTRING({coluna.name} FROM '[0-9]+$') AS BIGINT)), 0) + 1 FROM {tabela}), "
+        f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {tabela}), "
+        f"(SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM {sequencia.name})"
+        f"), false)"
+    ))
@@ -0,0 +1,144 @@
+"""
+Paginação por chave (keyset) para históricos grandes.
+
+Em vez de COUNT(*) + OFFSET, cada página continua a partir da última linha
+da anterior: WHERE (data, id) < (:data, :id) ORDER BY data DESC, id DESC
+LIMIT n. O custo é o mesmo na página 1 e na página 5.000, desde que haja
+índice na coluna de data.
+
+Colunas de data sem valor (NULL) vêm antes de qualquer data na ordem
+decrescente, como no índice do PostgreSQL; o cursor de uma linha sem data
+continua pelas demais linhas sem data e depois passa para as datadas, em
+vez de uma comparação de tuplas com NULL descartar todas elas.
+
+Os cursores são opacos para o navegador (JSON em base64) e guardam a
+direção e os valores da linha de referência. O total é apenas estimado
+(pelo plano do EXPLAIN no PostgreSQL) e fica None nos outros bancos.
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, false, tuple_
+from models import db
+
+
+def codificar_cursor(direcao, valores):
+    """Cursor opaco para a página seguinte ('p') ou anterior ('a') a partir de `valores`"""
+    dados = [direcao] + [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    return base64.urlsafe_b64encode(json.dumps(dados).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, colunas):
+    """(direcao, valores) de um cursor, ou None se ele for inválido"""
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direcao, valores = dados[0], dados[1:]
+        if direcao not in ('p', 'a') or len(valores) != len(colunas):
+            return None
+        return direcao, [
+            datetime.fromisoformat(v) if v is not None and isinstance(coluna.type, DateTime) else v
+            for coluna, v in zip(colunas, valores)
+        ]
+    except (ValueError, TypeError, IndexError):
+        return None
+
+
+def estimar_total(query):
+    """Total de linhas estimado pelo planejador do PostgreSQL (None nos outros bancos)"""
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return None
+    sql = query.statement.compile(bind, compile_kwargs={'literal_binds': True})
+    plano = db.session.execute(db.text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]['Plan']['Plan Rows'])
+
+
+class PaginaKeyset:
+    """
+    Página de resultados com a mesma interface básica do Pagination do
+    Flask-SQLAlchemy (items, has_next, has_prev, total, per_page), mais os
+    cursores proximo_cursor e cursor_anterior.
+    """
+
+    def __init__(self, items, por_pagina, proximo_cursor, cursor_anterior, total):
+        self.items = items
+        self.per_page = por_pagina
+        self.proximo_cursor = proximo_cursor
+        self.cursor_anterior = cursor_anterior
+        self.total = total
+        self.page = None
+        self.pages = None
+        self.next_num = None
+        self.prev_num = None
+
+    @property
+    def has_next(self):
+        return self.proximo_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.cursor_anterior is not None
+
+    def iter_pages(self, **kwargs):
+        return iter(())
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def _alem_do_cursor(colunas, valores, seguinte):
+    """
+    Linhas depois (seguinte) ou antes da posição do cursor na ordem
+    decrescente das colunas, com NULL antes de qualquer valor.
+    """
+    if seguinte and None not in valores:
+        # Caminho comum: comparação de tuplas, que usa o índice da data
+        return tuple_(*colunas) < tuple_(*valores)
+
+    coluna, valor = colunas[0], valores[0]
+    if valor is None:
+        passa = coluna.isnot(None) if seguinte else false()
+        empata = coluna.is_(None)
+    else:
+        passa = coluna < valor if seguinte else db.or_(coluna > valor, coluna.is_(None))
+        empata = coluna == valor
+    if len(colunas) == 1:
+        return passa
+    return db.or_(passa, db.and_(empata, _alem_do_cursor(colunas[1:], valores[1:], seguinte)))
+
+
+def paginar_keyset(query, colunas, cursor=None, por_pagina=20):
+    """
+    Página da consulta em ordem decrescente de `colunas` (ex.: data e id,
+    que precisa ser a última para desempatar), a partir do cursor recebido.
+    """
+    total = estimar_total(query) if not cursor else None
+    posicao = decodificar_cursor(cursor, colunas) if cursor else None
+
+    if posicao and posicao[0] == 'a':
+        # Página anterior: lê em ordem crescente a partir do cursor e inverte
+        linhas = query.filter(_alem_do_cursor(colunas, posicao[1], seguinte=False)).order_by(
+            *[c.asc().nulls_last() for c in colunas]
+        ).limit(por_pagina + 1).all()
+        mais_antes = len(linhas) > por_pagina
+        items = list(reversed(linhas[:por_pagina]))
+        tem_proxima, tem_anterior = True, mais_antes
+    else:
+        if posicao:
+            query = query.filter(_alem_do_cursor(colunas, posicao[1], seguinte=True))
+        linhas = query.order_by(*[c.desc().nulls_first() for c in colunas]).limit(por_pagina + 1).all()
+        items = linhas[:por_pagina]
+        tem_proxima, tem_anterior = len(linhas) > por_pagina, posicao is not None
+
+    def valores(item):
+        return [getattr(item, c.key) for c in colunas]
+
+    return PaginaKeyset(
+        items,
+        por_pagina,
+        codificar_cursor('p', valores(items[-1])) if items and tem_proxima else None,
+        codificar_cursor('a', valores(items[0])) if items and tem_anterior else None,
+        total
+    )
@@ -0,0 +1,139 @@
+"""
+Perfil de SQL por requisição (opcional, ativado com PERFIL_SQL).
+
+Eventos do engine do SQLAlchemy contam as consultas e o tempo gasto no
+banco em cada requisição. O resultado vai:
+- para o cabeçalho Server-Timing da resposta (visível no DevTools);
+- para estatísticas em memória por endpoint (percentis das últimas
+  requisições), exibidas em /debug/perf para administradores;
+- para o log 'loja.sql_lento' quando uma consulta passa de
+  PERFIL_SQL_LIMITE_LENTO_MS (arquivo próprio se PERFIL_SQL_ARQUIVO_LOG
+  estiver definido).
+"""
+import logging
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+logger_sql_lento = logging.getLogger('loja.sql_lento')
+
+# Requisições guardadas por endpoint para o cálculo dos percentis
+AMOSTRAS_POR_ENDPOINT = 500
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) de uma lista de números, pelo método do vizinho mais próximo"""
+    if not valores:
+        return 0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+class ColetorPerfil:
+    """Estatísticas recentes de tempo e SQL por endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def registrar(self, endpoint, duracao_ms, db_ms, consultas, mais_lentas):
+        with self._lock:
+            dados = self._endpoints.setdefault(endpoint, {
+                'amostras': deque(maxlen=AMOSTRAS_POR_ENDPOINT),
+                'mais_lentas': []
+            })
+            dados['amostras'].append((duracao_ms, db_ms, consultas))
+            dados['mais_lentas'] = sorted(dados['mais_lentas'] + mais_lentas, reverse=True)[:5]
+
+    def resumo(self):
+        """Lista de dicionários por endpoint, do mais lento (p95) para o mais rápido"""
+        with self._lock:
+            copia = {e: (list(d['amostras']), list(d['mais_lentas'])) for e, d in self._endpoints.items()}
+
+        linhas = []
+        for endpoint, (amostras, mais_lentas) in copia.items():
+            duracoes = [a[0] for a in amostras]
+            tempos_db = [a[1] for a in amostras]
+            linhas.append({
+                'endpoint': endpoint,
+                'requisicoes': len(amostras),
+                'p50': percentil(duracoes, 50),
+                'p95': percentil(duracoes, 95),
+                'p99': percentil(duracoes, 99),
+                'db_p50': percentil(tempos_db, 50),
+                'db_p95': percentil(tempos_db, 95),
+                'consultas_media': sum(a[2] for a in amostras) / len(amostras),
+                'consultas_max': max(a[2] for a in amostras),
+                'mais_lentas': mais_lentas
+            })
+        return sorted(linhas, key=lambda l: l['p95'], reverse=True)
+
+
+coletor = ColetorPerfil()
+
+
+def iniciar_perfil(app):
+    """Liga o perfil de SQL na aplicação, se PERFIL_SQL estiver ativo"""
+    if not app.config.get('PERFIL_SQL'):
+        return
+
+    limite_lento = app.config.get('PERFIL_SQL_LIMITE_LENTO_MS', 200)
+    arquivo_log = app.config.get('PERFIL_SQL_ARQUIVO_LOG')
+    if arquivo_log and not logger_sql_lento.handlers:
+        handler = RotatingFileHandler(arquivo_log, maxBytes=5 * 1024 * 1024, backupCount=3)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger_sql_lento.addHandler(handler)
+        logger_sql_lento.setLevel(logging.WARNING)
+
+    def antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('perfil_inicio', []).append(time.perf_counter())
+
+    def consulta_com_erro(contexto_erro):
+        # Comando que falhou (erro de SQL, statement_timeout): descartar o
+        # início dele, senão os próximos tempos desta conexão do pool sairiam trocados
+        conn = contexto_erro.connection
+        if conn is not None and conn.info.get('perfil_inicio'):
+            conn.info['perfil_inicio'].pop()
+
+    def depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+        duracao_ms = (time.perf_counter() - conn.info['perfil_inicio'].pop()) * 1000
+        em_requisicao = has_request_context()
+
+        if duracao_ms >= limite_lento:
+            endpoint = request.endpoint if em_requisicao else '-'
+            logger_sql_lento.warning('%.1f ms [%s] %s', duracao_ms, endpoint, ' '.join(statement.split()))
+
+        perfil = g.get('perfil_sql') if em_requisicao else None
+        if perfil is not None:
+            perfil['consultas'] += 1
+            perfil['db_ms'] += duracao_ms
+            perfil['mais_lentas'].append((round(duracao_ms, 1), ' '.join(statement.split())[:300]))
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', antes_da_consulta)
+            event.listen(engine, 'after_cursor_execute', depois_da_consulta)
+            event.listen(engine, 'handle_error', consulta_com_erro)
+
+    @app.before_request
+    def _iniciar_requisicao():
+        g.perfil_sql = {'inicio': time.perf_counter(), 'consultas': 0, 'db_ms': 0.0, 'mais_lentas': []}
+
+    @app.after_request
+    def _finalizar_requisicao(response):
+        perfil = g.pop('perfil_sql', None)
+        if perfil is None:
+            return response
+
+        duracao_ms = (time.perf_counter() - perfil['inicio']) * 1000
+        response.headers.add('Server-Timing', f'db;dur={perfil["db_ms"]:.1f};desc="{perfil["consultas"]} consultas"')
+        response.headers.add('Server-Timing', f'app;dur={duracao_ms:.1f}')
+
+        if request.endpoint and request.endpoint != 'static':
+            mais_lentas = sorted(perfil['mais_lentas'], reverse=True)[:3]
+            coletor.registrar(request.endpoint, duracao_ms, perfil['db_ms'], perfil['consultas'], mais_lentas)
+        return response
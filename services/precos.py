@@ -0,0 +1,151 @@
+"""
+Reajuste de preços em massa e histórico de preços.
+
+O reajuste (percentual ou valor fixo sobre o preço de venda ou de custo)
+vale para os produtos ativos que passam pelos filtros de categoria,
+fornecedor e faixa de margem, e é aplicado no banco com dois comandos, na
+mesma transação:
+
+1. INSERT ... SELECT grava em historico_precos os preços anterior e novo
+   de cada produto afetado;
+2. um único UPDATE aplica o novo preço.
+
+A prévia usa as mesmas expressões numa consulta agregada (quantidade de
+produtos e margem média antes e depois), sem alterar nada. A margem é a
+mesma de Produto.margem_lucro: (venda - custo) / custo, em percentual.
+"""
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import case, func, insert, literal, select, update
+from models import db, Produto, HistoricoPreco
+from services.catalogo import catalogo
+
+CAMPOS_REAJUSTE = ('preco_venda', 'preco_custo')
+MODOS_REAJUSTE = ('percentual', 'valor')
+
+
+def validar_reajuste(campo, modo, valor):
+    """Valor do reajuste como Decimal; levanta ValueError para parâmetros inválidos"""
+    if campo not in CAMPOS_REAJUSTE:
+        raise ValueError('Escolha o preço a reajustar')
+    if modo not in MODOS_REAJUSTE:
+        raise ValueError('Escolha reajuste percentual ou em valor')
+    try:
+        valor = Decimal(str(valor).replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError('Valor do reajuste inválido')
+    if not valor.is_finite() or valor == 0:
+        raise ValueError('Informe um valor de reajuste diferente de zero')
+    if modo == 'percentual' and valor <= -100:
+        raise ValueError('A redução percentual deve ser menor que 100%')
+    return valor
+
+
+def _margem(custo, venda):
+    return case((custo > 0, (venda - custo) * 100 / custo), else_=None)
+
+
+def _novo_preco(coluna, modo, valor):
+    if modo == 'percentual':
+        novo = func.round(coluna * (100 + valor) / 100, 2)
+    else:
+        novo = coluna + valor
+    return case((novo < 0, 0), else_=novo)
+
+
+def condicoes_reajuste(categoria_id=None, fornecedor_id=None, margem_minima=None, margem_maxima=None):
+    """Filtros dos produtos atingidos pelo reajuste"""
+    condicoes = [Produto.ativo == True]
+    if categoria_id:
+        condicoes.append(Produto.categoria_id == categoria_id)
+    if fornecedor_id:
+        condicoes.append(Produto.fornecedor_id == fornecedor_id)
+    margem = _margem(Produto.preco_custo, Produto.preco_venda)
+    if margem_minima is not None:
+        condicoes.append(margem >= margem_minima)
+    if margem_maxima is not None:
+        condicoes.append(margem <= margem_maxima)
+    return condicoes
+
+
+def _precos_novos(campo, modo, valor):
+    """(custo novo, venda novo) como expressões SQL"""
+    if campo == 'preco_custo':
+        return _novo_preco(Produto.preco_custo, modo, valor), Produto.preco_venda
+    return Produto.preco_custo, _novo_preco(Produto.preco_venda, modo, valor)
+
+
+def previsualizar_reajuste(campo, modo, valor, condicoes):
+    """Impacto do reajuste: quantidade de produtos, margem média antes e depois e soma dos preços"""
+    custo_novo, venda_novo = _precos_novos(campo, modo, valor)
+    coluna = getattr(Produto, campo)
+    novo = custo_novo if campo == 'preco_custo' else venda_novo
+
+    quantidade, margem_atual, margem_nova, soma_atual, soma_nova = db.session.execute(
+        select(
+            func.count(Produto.id),
+            func.avg(_margem(Produto.preco_custo, Produto.preco_venda)),
+            func.avg(_margem(custo_novo, venda_novo)),
+            func.coalesce(func.sum(coluna), 0),
+            func.coalesce(func.sum(novo), 0)
+        ).where(*condicoes, novo != coluna)
+    ).one()
+
+    return {
+        'quantidade': quantidade,
+        'margem_media_atual': float(margem_atual) if margem_atual is not None else None,
+        'margem_media_nova': float(margem_nova) if margem_nova is not None else None,
+        'variacao_margem': float(margem_nova - margem_atual)
+        if margem_atual is not None and margem_nova is not None else None,
+        'soma_atual': float(soma_atual),
+        'soma_nova': float(soma_nova)
+    }
+
+
+def aplicar_reajuste(campo, modo, valor, condicoes, usuario_id=None, motivo=None):
+    """Grava o histórico e aplica o reajuste com um único UPDATE. Não faz commit. Retorna a quantidade."""
+    custo_novo, venda_novo = _precos_novos(campo, modo, valor)
+    coluna = getattr(Produto, campo)
+    novo = custo_novo if campo == 'preco_custo' else venda_novo
+    condicoes = [*condicoes, novo != coluna]
+
+    db.session.execute(insert(HistoricoPreco.__table__).from_select(
+        ['produto_id', 'preco_custo_anterior', 'preco_custo', 'preco_venda_anterior', 'preco_venda',
+         'motivo', 'data_alteracao', 'usuario_id'],
+        select(
+            Produto.id, Produto.preco_custo, custo_novo, Produto.preco_venda, venda_novo,
+            literal(motivo, HistoricoPreco.motivo.type),
+            literal(datetime.utcnow(), HistoricoPreco.data_alteracao.type),
+            literal(usuario_id, HistoricoPreco.usuario_id.type)
+        ).where(*condicoes)
+    ))
+
+    alterados = db.session.execute(
+        update(Produto).where(*condicoes).values({coluna: novo}),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+
+    if campo == 'preco_venda' and alterados:
+        catalogo.registrar_recarga()
+    return alterados
+
+
+def registrar_alteracao_preco(produto, preco_custo_anterior, preco_venda_anterior, usuario_id=None, motivo=None):
+    """Grava no histórico a alteração de preço de um produto editado (se houver). Não faz commit."""
+    centavos = Decimal('0.01')
+    anterior = (Decimal(str(preco_custo_anterior)).quantize(centavos),
+                Decimal(str(preco_venda_anterior)).quantize(centavos))
+    atual = (Decimal(str(produto.preco_custo)).quantize(centavos),
+             Decimal(str(produto.preco_venda)).quantize(centavos))
+    if anterior == atual:
+        return
+
+    db.session.add(HistoricoPreco(
+        produto_id=produto.id,
+        preco_custo_anterior=anterior[0],
+        preco_custo=atual[0],
+        preco_venda_anterior=anterior[1],
+        preco_venda=atual[1],
+        motivo=motivo,
+        usuario_id=usuario_id
+    ))
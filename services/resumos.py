@@ -0,0 +1,98 @@
+"""
+Resumos diários de vendas (tabelas resumo_vendas_diario e
+resumo_produtos_diario).
+
+Os resumos são atualizados na mesma transação que grava ou cancela a venda,
+com INSERT ... ON CONFLICT DO UPDATE somando (ou subtraindo) os valores.
+Relatórios e dashboard leem esses totais em vez de reagregar o histórico
+inteiro de vendas. A migração 0010_resumos_vendas cria as tabelas e faz a
+carga inicial; para recalcular a partir das vendas (correção) use:
+
+    flask relatorios reconstruir-resumos [--desde AAAA-MM-DD]
+"""
+from datetime import datetime, time
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Venda, ItemVenda, ResumoVendaDiario, ResumoProdutoDiario
+
+_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+
+def insert_com_conflito(modelo):
+    """INSERT com suporte a ON CONFLICT no banco em uso (PostgreSQL ou SQLite)"""
+    return _INSERTS[db.session.get_bind().dialect.name](modelo)
+
+
+def acumular(modelo, chaves, linhas):
+    """Soma os valores das linhas aos registros existentes (ou cria os que faltam)"""
+    if not linhas:
+        return
+    stmt = insert_com_conflito(modelo).values(linhas)
+    campos = [c for c in linhas[0] if c not in chaves]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=chaves,
+        set_={c: getattr(modelo, c) + getattr(stmt.excluded, c) for c in campos}
+    )
+    db.session.execute(stmt)
+
+
+def acumular_venda(venda, itens, sinal=1):
+    """
+    Lança a venda nos resumos do dia dela. `itens` são dicionários com
+    produto_id, quantidade e total; use sinal=-1 para estornar (cancelamento).
+    """
+    dia = venda.data_venda.date()
+    chave = {'dia': dia, 'forma_pagamento': venda.forma_pagamento, 'vendedor_id': venda.vendedor_id}
+
+    acumular(ResumoVendaDiario, ['dia', 'forma_pagamento', 'vendedor_id'], [dict(
+        chave,
+        quantidade_vendas=sinal,
+        subtotal=sinal * float(venda.subtotal),
+        desconto=sinal * float(venda.desconto or 0),
+        total=sinal * float(venda.total)
+    )])
+
+    por_produto = {}
+    for item in itens:
+        quantidade, total = por_produto.get(int(item['produto_id']), (0, 0.0))
+        por_produto[int(item['produto_id'])] = (quantidade + int(item['quantidade']),
+                                                total + float(item['total']))
+
+    acumular(ResumoProdutoDiario, ['dia', 'produto_id', 'forma_pagamento', 'vendedor_id'], [
+        dict(chave, produto_id=produto_id, quantidade=sinal * quantidade, total=sinal * total)
+        for produto_id, (quantidade, total) in sorted(por_produto.items())
+    ])
+
+
+def reconstruir_resumos(desde=None):
+    """Apaga e recalcula os resumos a partir das vendas concluídas (desde a data informada)"""
+    dia = func.date(Venda.data_venda)
+    filtros = [Venda.status == 'concluida']
+    if desde:
+        filtros.append(Venda.data_venda >= datetime.combine(desde, time.min))
+        ResumoVendaDiario.query.filter(ResumoVendaDiario.dia >= desde).delete(synchronize_session=False)
+        ResumoProdutoDiario.query.filter(ResumoProdutoDiario.dia >= desde).delete(synchronize_session=False)
+    else:
+        ResumoVendaDiario.query.delete(synchronize_session=False)
+        ResumoProdutoDiario.query.delete(synchronize_session=False)
+
+    db.session.execute(insert(ResumoVendaDiario).from_select(
+        ['dia', 'forma_pagamento', 'vendedor_id', 'quantidade_vendas', 'subtotal', 'desconto', 'total'],
+        select(
+            dia, Venda.forma_pagamento, Venda.vendedor_id, func.count(Venda.id),
+            func.sum(Venda.subtotal), func.coalesce(func.sum(Venda.desconto), 0), func.sum(Venda.total)
+        ).where(*filtros).group_by(dia, Venda.forma_pagamento, Venda.vendedor_id)
+    ))
+
+    db.session.execute(insert(ResumoProdutoDiario).from_select(
+        ['dia', 'produto_id', 'forma_pagamento', 'vendedor_id', 'quantidade', 'total'],
+        select(
+            dia, ItemVenda.produto_id, Venda.forma_pagamento, Venda.vendedor_id,
+            func.sum(ItemVenda.quantidade), func.sum(ItemVenda.total)
+        ).join(Venda, ItemVenda.venda_id == Venda.id).where(*filtros).group_by(
+            dia, ItemVenda.produto_id, Venda.forma_pagamento, Venda.vendedor_id
+        )
+    ))
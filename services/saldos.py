@@ -0,0 +1,120 @@
+"""
+Saldos de estoque por data (fotografias do razão de movimentos).
+
+movimentos_estoque é um razão só de inserção: cada movimento guarda o
+estoque anterior e o novo, então a variação é estoque_atual -
+estoque_anterior (vale também para ajustes absolutos). O comando
+
+    flask estoque gerar-saldos [--data AAAA-MM-DD]
+
+grava em saldos_estoque a quantidade, o custo e o valor de cada produto com
+estoque no fechamento do dia (padrão: ontem). Rodado diariamente ou no fim
+de cada mês pelo cron, o estoque em qualquer data passada sai de:
+
+- a fotografia mais recente até a data + a soma das variações dos
+  movimentos entre ela e o fim do dia pedido; ou
+- sem fotografia anterior, o estoque atual - a soma das variações dos
+  movimentos posteriores ao dia pedido.
+
+Nos dois casos só os movimentos do intervalo são lidos (índice por data),
+nunca o histórico inteiro. O custo na data é o preço de custo atual, ou o
+"preço anterior" da primeira alteração registrada em historico_precos
+depois da data.
+"""
+from datetime import datetime, time, timedelta
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import aliased
+from models import db, Produto, MovimentoEstoque, HistoricoPreco, SaldoEstoque
+
+
+def fim_do_dia(dia):
+    """Início do dia seguinte (limite exclusivo dos movimentos do dia)"""
+    return datetime.combine(dia + timedelta(days=1), time.min)
+
+
+def _variacoes(inicio=None, fim=None):
+    """Soma das variações de estoque por produto no intervalo [inicio, fim)"""
+    condicoes = []
+    if inicio is not None:
+        condicoes.append(MovimentoEstoque.data_movimento >= inicio)
+    if fim is not None:
+        condicoes.append(MovimentoEstoque.data_movimento < fim)
+    return select(
+        MovimentoEstoque.produto_id,
+        func.sum(MovimentoEstoque.estoque_atual - MovimentoEstoque.estoque_anterior).label('variacao')
+    ).where(*condicoes).group_by(MovimentoEstoque.produto_id).subquery()
+
+
+def _custos_na_data(fim):
+    """(subconsulta, alias do histórico, expressão) do preço de custo de cada produto no instante `fim`"""
+    proxima = select(
+        HistoricoPreco.produto_id, func.min(HistoricoPreco.id).label('id')
+    ).where(HistoricoPreco.data_alteracao >= fim).group_by(HistoricoPreco.produto_id).subquery()
+    historico = aliased(HistoricoPreco)
+    return proxima, historico, func.coalesce(historico.preco_custo_anterior, Produto.preco_custo)
+
+
+def consulta_saldos(sessao, dia):
+    """
+    SELECT com produto_id, codigo, nome, quantidade, custo_unitario e valor
+    de cada produto com estoque diferente de zero no fechamento do dia.
+    """
+    fim = fim_do_dia(dia)
+    data_saldo = sessao.scalar(select(func.max(SaldoEstoque.data)).where(SaldoEstoque.data <= dia))
+
+    if data_saldo is not None:
+        fotografia = select(SaldoEstoque.produto_id, SaldoEstoque.quantidade).where(
+            SaldoEstoque.data == data_saldo
+        ).subquery()
+        variacoes = _variacoes(fim_do_dia(data_saldo), fim)
+        quantidade = func.coalesce(fotografia.c.quantidade, 0) + func.coalesce(variacoes.c.variacao, 0)
+    else:
+        fotografia = None
+        variacoes = _variacoes(inicio=fim)
+        quantidade = func.coalesce(Produto.estoque_atual, 0) - func.coalesce(variacoes.c.variacao, 0)
+
+    proxima, historico, custo = _custos_na_data(fim)
+
+    consulta = select(
+        Produto.id.label('produto_id'),
+        Produto.codigo,
+        Produto.nome,
+        quantidade.label('quantidade'),
+        custo.label('custo_unitario'),
+        (quantidade * custo).label('valor')
+    ).select_from(Produto)
+    if fotografia is not None:
+        consulta = consulta.outerjoin(fotografia, fotografia.c.produto_id == Produto.id)
+    return consulta.outerjoin(
+        variacoes, variacoes.c.produto_id == Produto.id
+    ).outerjoin(
+        proxima, proxima.c.produto_id == Produto.id
+    ).outerjoin(
+        historico, historico.id == proxima.c.id
+    ).where(quantidade != 0)
+
+
+def gerar_saldos(dia):
+    """(Re)grava a fotografia do fechamento do dia. Não faz commit. Retorna a quantidade de produtos."""
+    db.session.execute(delete(SaldoEstoque).where(SaldoEstoque.data == dia))
+    saldos = consulta_saldos(db.session, dia).subquery()
+    db.session.execute(insert(SaldoEstoque.__table__).from_select(
+        ['data', 'produto_id', 'quantidade', 'custo_unitario', 'valor'],
+        select(literal(dia, SaldoEstoque.data.type), saldos.c.produto_id, saldos.c.quantidade,
+               saldos.c.custo_unitario, saldos.c.valor)
+    ))
+    return db.session.scalar(select(func.count(SaldoEstoque.id)).where(SaldoEstoque.data == dia))
+
+
+def totais_saldos(sessao, dia):
+    """(quantidade de produtos, unidades, valor total) do estoque no fechamento do dia"""
+    saldos = consulta_saldos(sessao, dia).subquery()
+    produtos, unidades, valor = sessao.execute(select(
+        func.count(), func.coalesce(func.sum(saldos.c.quantidade), 0), func.coalesce(func.sum(saldos.c.valor), 0)
+    )).one()
+    return produtos, unidades, valor
+
+
+def ontem():
+    """Dia anterior (UTC, como as datas gravadas), padrão do fechamento diário"""
+    return datetime.utcnow().date() - timedelta(days=1)
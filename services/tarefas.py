@@ -0,0 +1,217 @@
+"""
+Fila de tarefas em segundo plano para relatórios pesados.
+
+A tabela `tarefas` é a fila: uma requisição grava a tarefa ('pendente') e
+a entrega a um pool de threads do próprio processo, liberando o worker do
+gunicorn na hora. Quem executa primeiro "reivindica" a tarefa com um
+UPDATE condicional (pendente -> executando), então ela também pode ser
+processada por um worker separado (`flask tarefas processar`), sem
+nenhum broker externo. Tarefa pendente cuja thread se perdeu (reinício do
+worker) é reenviada ao pool quando pedida ou consultada de novo, no
+máximo uma vez a cada TEMPO_MAXIMO_ESPERA (reenviada_em).
+
+O arquivo gerado fica em TAREFAS_PASTA. Tarefas com os mesmos parâmetros
+e a mesma impressão digital dos dados (ex.: quantidade, maior id e soma
+das vendas do período) reaproveitam o arquivo já gerado.
+
+Os tipos de tarefa são registrados com o decorador @tipo_tarefa; a função
+recebe os parâmetros e o caminho do arquivo a gravar e retorna
+(nome_para_download, mimetype).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, update
+from models import db, Tarefa
+
+logger = logging.getLogger(__name__)
+
+TIPOS_TAREFA = {}
+
+# Tarefa em execução há mais tempo que isso é considerada perdida (processo
+# reiniciado no meio da geração) e deixa de bloquear novos pedidos iguais
+TEMPO_MAXIMO_EXECUCAO = timedelta(hours=1)
+
+# Tarefa pendente há mais tempo que isso, desde a criação ou o último
+# reenvio, provavelmente perdeu a thread que a executaria (worker do
+# gunicorn reiniciado): é reenviada ao pool de threads. Só uma execução
+# consegue reivindicá-la, mas sem o intervalo cada consulta de situação
+# (polling do navegador) empilharia mais um reenvio na fila.
+TEMPO_MAXIMO_ESPERA = timedelta(minutes=2)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def tipo_tarefa(nome):
+    """Registra a função que executa as tarefas do tipo `nome`"""
+    def registrar(funcao):
+        TIPOS_TAREFA[nome] = funcao
+        return funcao
+    return registrar
+
+
+def _pasta():
+    pasta = current_app.config['TAREFAS_PASTA']
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def _obter_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('TAREFAS_THREADS', 2),
+                thread_name_prefix='tarefas'
+            )
+        return _executor
+
+
+def _expirar_interrompidas():
+    db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.status == 'executando',
+               Tarefa.iniciada_em < datetime.utcnow() - TEMPO_MAXIMO_EXECUCAO)
+        .values(status='erro', erro='Tarefa interrompida', concluida_em=datetime.utcnow())
+    )
+
+
+def chave_cache(tipo, parametros, impressao_digital):
+    """Chave que identifica o mesmo relatório sobre os mesmos dados"""
+    conteudo = json.dumps([tipo, parametros, impressao_digital], sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def enfileirar(tipo, parametros, usuario_id=None, impressao_digital=None):
+    """
+    Cria a tarefa e agenda a execução, ou devolve uma tarefa equivalente
+    (em andamento ou concluída com o arquivo ainda em disco).
+    """
+    if tipo not in TIPOS_TAREFA:
+        raise ValueError(f'Tipo de tarefa desconhecido: {tipo}')
+
+    _expirar_interrompidas()
+    db.session.commit()
+    chave = chave_cache(tipo, parametros, impressao_digital)
+    existente = Tarefa.query.filter(
+        Tarefa.chave_cache == chave,
+        Tarefa.status != 'erro'
+    ).order_by(Tarefa.criada_em.desc()).first()
+    if existente and (existente.status != 'concluida' or os.path.exists(existente.arquivo or '')):
+        retomar_se_parada(existente)
+        return existente
+
+    tarefa = Tarefa(
+        tipo=tipo,
+        parametros=json.dumps(parametros, default=str),
+        chave_cache=chave,
+        usuario_id=usuario_id
+    )
+    db.session.add(tarefa)
+    db.session.commit()
+
+    _agendar(tarefa.id)
+    return tarefa
+
+
+def retomar_se_parada(tarefa):
+    """
+    Reenvia ao pool de threads a tarefa pendente há mais de
+    TEMPO_MAXIMO_ESPERA desde a criação e desde o último reenvio. O UPDATE
+    condicional garante um único reenvio por intervalo, mesmo com vários
+    workers consultando a mesma tarefa.
+    """
+    if tarefa.status != 'pendente':
+        return
+    agora = datetime.utcnow()
+    limite = agora - TEMPO_MAXIMO_ESPERA
+    reenviada = db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.id == tarefa.id, Tarefa.status == 'pendente', Tarefa.criada_em < limite,
+               or_(Tarefa.reenviada_em.is_(None), Tarefa.reenviada_em < limite))
+        .values(reenviada_em=agora)
+    ).rowcount
+    db.session.commit()
+    if reenviada:
+        _agendar(tarefa.id)
+
+
+def _agendar(tarefa_id):
+    app = current_app._get_current_object()
+    _obter_executor(app).submit(_executar_em_contexto, app, tarefa_id)
+
+
+def _executar_em_contexto(app, tarefa_id):
+    with app.app_context():
+        executar(tarefa_id)
+
+
+def executar(tarefa_id):
+    """Reivindica e executa uma tarefa pendente. Retorna False se outro worker a pegou."""
+    reivindicada = db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.id == tarefa_id, Tarefa.status == 'pendente')
+        .values(status='executando', iniciada_em=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    if not reivindicada:
+        return False
+
+    tarefa = db.session.get(Tarefa, tarefa_id)
+    caminho = os.path.join(_pasta(), tarefa.id)
+    try:
+        nome_arquivo, mimetype = TIPOS_TAREFA[tarefa.tipo](json.loads(tarefa.parametros), caminho)
+        tarefa.status = 'concluida'
+        tarefa.arquivo = caminho
+        tarefa.nome_arquivo = nome_arquivo
+        tarefa.mimetype = mimetype
+    except Exception as e:
+        logger.exception('Erro na tarefa %s (%s)', tarefa_id, tarefa.tipo)
+        db.session.rollback()
+        tarefa = db.session.get(Tarefa, tarefa_id)
+        tarefa.status = 'erro'
+        tarefa.erro = str(e)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+    tarefa.concluida_em = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def processar_pendentes(limite=None):
+    """Executa as tarefas pendentes, da mais antiga para a mais nova. Retorna quantas executou."""
+    _expirar_interrompidas()
+    db.session.commit()
+    executadas = 0
+    while limite is None or executadas < limite:
+        proxima = db.session.query(Tarefa.id).filter(
+            Tarefa.status == 'pendente'
+        ).order_by(Tarefa.criada_em).first()
+        db.session.commit()
+        if proxima is None:
+            break
+        if executar(proxima.id):
+            executadas += 1
+    return executadas
+
+
+def limpar_antigas(dias):
+    """Apaga tarefas terminadas há mais de `dias` dias e os seus arquivos"""
+    limite = datetime.utcnow() - timedelta(days=dias)
+    antigas = Tarefa.query.filter(
+        Tarefa.status.in_(['concluida', 'erro']),
+        Tarefa.concluida_em < limite
+    ).all()
+    for tarefa in antigas:
+        if tarefa.arquivo and os.path.exists(tarefa.arquivo):
+            os.remove(tarefa.arquivo)
+        db.session.delete(tarefa)
+    db.session.commit()
+    return len(antigas)
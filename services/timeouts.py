@@ -0,0 +1,38 @@
+"""
+Limite de tempo dos comandos SQL por classe de requisição.
+
+No início de cada transação do PostgreSQL é executado SET LOCAL
+statement_timeout com o limite da requisição corrente: SQL_TIMEOUT_MS para
+as telas e o PDV, SQL_TIMEOUT_RELATORIOS_MS para o blueprint de relatórios
+e para exportações (?formato=csv/xlsx). Por ser LOCAL, o limite termina com
+a transação e a conexão volta limpa para o pool.
+"""
+from flask import has_request_context, request
+from sqlalchemy import event
+from models import db
+from services.exportacao import FORMATOS_EXPORTACAO
+
+
+def limite_da_requisicao(app):
+    """Timeout em ms para a requisição corrente (0 = sem limite)"""
+    if not has_request_context():
+        return 0
+    if request.blueprint == 'relatorios' or request.args.get('formato') in FORMATOS_EXPORTACAO:
+        return app.config.get('SQL_TIMEOUT_RELATORIOS_MS', 0)
+    return app.config.get('SQL_TIMEOUT_MS', 0)
+
+
+def iniciar_timeouts(app):
+    """Liga os limites de tempo nos engines PostgreSQL da aplicação, se configurados"""
+    if not (app.config.get('SQL_TIMEOUT_MS') or app.config.get('SQL_TIMEOUT_RELATORIOS_MS')):
+        return
+
+    def no_inicio_da_transacao(conn):
+        limite = limite_da_requisicao(app)
+        if limite:
+            conn.exec_driver_sql(f'SET LOCAL statement_timeout = {int(limite)}')
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'postgresql':
+                event.listen(engine, 'begin', no_inicio_da_transacao)
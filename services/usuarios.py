@@ -0,0 +1,62 @@
+"""
+Carregamento do usuário logado (user_loader do Flask-Login) com cache.
+
+O Flask-Login carrega o usuário em toda requisição autenticada, inclusive
+em cada tecla digitada na busca do PDV. As colunas do usuário ficam em
+cache por USUARIOS_CACHE_SEGUNDOS e, num acerto, o objeto é reconstruído
+e anexado à sessão sem consultar a tabela de usuários.
+
+Qualquer UPDATE ou DELETE de um usuário (troca de senha, desativação)
+descarta a entrada depois do commit. Usuários inativos não são carregados,
+o que encerra a sessão de quem foi desativado.
+"""
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from models import db, Usuario
+from services.cache import CacheTTL
+
+_cache = CacheTTL(ttl=60, max_entradas=1024)
+
+
+def invalidar_usuario(usuario_id=None):
+    """Descarta o usuário do cache (ou todos, sem id)"""
+    _cache.invalidar(usuario_id)
+
+
+def _colunas(usuario):
+    return {coluna.key: getattr(usuario, coluna.key) for coluna in Usuario.__table__.columns}
+
+
+def carregar_usuario(usuario_id):
+    """Usuário ativo com o id informado, ou None"""
+    dados = _cache.obter(usuario_id)
+    if dados is None:
+        usuario = db.session.get(Usuario, usuario_id)
+        if usuario is None:
+            return None
+        _cache.ttl = current_app.config.get('USUARIOS_CACHE_SEGUNDOS', 60)
+        _cache.definir(usuario_id, _colunas(usuario))
+    else:
+        usuario = Usuario(**dados)
+        make_transient_to_detached(usuario)
+        usuario = db.session.merge(usuario, load=False)
+
+    return usuario if usuario.ativo else None
+
+
+@event.listens_for(Usuario, 'after_update')
+@event.listens_for(Usuario, 'after_delete')
+def _agendar_invalidacao(mapper, connection, usuario):
+    Session.object_session(usuario).info.setdefault('usuarios_alterados', set()).add(usuario.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_alterados(sessao):
+    for usuario_id in sessao.info.pop('usuarios_alterados', ()):
+        _cache.invalidar(usuario_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alterados(sessao):
+    sessao.info.pop('usuarios_alterados', None)
@@ -0,0 +1,325 @@
+"""
+Motor de checkout do PDV.
+
+Processa o carrinho inteiro com um número fixo de comandos SQL, qualquer
+que seja a quantidade de itens: os produtos são carregados (e bloqueados)
+numa única consulta, o estoque é validado em memória e itens, movimentos
+de estoque e de caixa são gravados em inserções múltiplas.
+
+Há dois modos de baixa de estoque, escolhidos por VENDAS_MODO_CHECKOUT:
+
+- 'bloqueio': SELECT ... FOR UPDATE nos produtos, validação em memória e
+  UPDATE em lote;
+- 'atomico': um único UPDATE condicional (estoque_atual >= quantidade) com
+  RETURNING, sem bloqueio prévio. Terminais concorrentes nunca vendem além
+  do estoque e não esperam uns pelos outros na leitura.
+"""
+import uuid
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Venda, ItemVenda, Produto, MovimentoEstoque, venda_numero_seq
+from services.caixa import registrar_movimento
+from services.catalogo import catalogo
+from services.numeracao import proximo_numero
+from services.resumos import acumular_venda
+
+
+class VendaErro(Exception):
+    """Erro de validação ao processar uma venda (resposta 400 no PDV)"""
+
+
+def agrupar_quantidades(itens):
+    """Soma as quantidades por produto (o mesmo produto pode aparecer em várias linhas)"""
+    quantidades = {}
+    for item in itens:
+        produto_id = int(item['produto_id'])
+        quantidade = int(item['quantidade'])
+        if quantidade <= 0:
+            raise VendaErro(f'Quantidade inválida para o produto {produto_id}')
+        quantidades[produto_id] = quantidades.get(produto_id, 0) + quantidade
+    return quantidades
+
+
+def validar_uuid_cliente(valor):
+    """UUID gerado pelo PDV em forma canônica, ou None se ausente"""
+    if not valor:
+        return None
+    try:
+        return str(uuid.UUID(str(valor)))
+    except ValueError:
+        raise VendaErro(f'Identificador de venda inválido: {valor}')
+
+
+def venda_por_uuid(uuid_cliente):
+    """(venda_id, numero_venda) da venda já gravada com o uuid_cliente, ou None"""
+    return db.session.query(Venda.id, Venda.numero_venda).filter(
+        Venda.uuid_cliente == uuid_cliente
+    ).first()
+
+
+def data_venda_cliente(valor, caixa):
+    """
+    Data/hora (ISO 8601) em que o PDV registrou a venda offline, em UTC sem
+    fuso, como as demais datas do sistema; None se ausente. Limitada ao
+    intervalo entre a abertura do caixa e agora: uma venda nunca cai num dia
+    já fechado (resumos diários e saldos de estoque) nem no futuro.
+    """
+    if not valor:
+        return None
+    try:
+        data = datetime.fromisoformat(str(valor))
+    except ValueError:
+        raise VendaErro(f'Data de venda inválida: {valor}')
+    if data.tzinfo is not None:
+        data = data.astimezone(timezone.utc).replace(tzinfo=None)
+    data = min(data, datetime.utcnow())
+    if caixa.data_abertura is not None:
+        data = max(data, caixa.data_abertura)
+    return data
+
+
+def carregar_produtos_bloqueados(ids):
+    """Carrega os produtos com SELECT ... FOR UPDATE, sempre na ordem do id para evitar deadlocks"""
+    produtos = Produto.query.filter(
+        Produto.id.in_(ids)
+    ).order_by(Produto.id).with_for_update().all()
+    return {p.id: p for p in produtos}
+
+
+def baixar_estoque_bloqueado(quantidades):
+    """
+    Bloqueia os produtos, valida o estoque em memória e decrementa com um
+    único UPDATE. Retorna {produto_id: estoque_atual_novo}.
+    """
+    produtos = carregar_produtos_bloqueados(quantidades.keys())
+
+    for produto_id, quantidade in quantidades.items():
+        produto = produtos.get(produto_id)
+        if not produto:
+            raise VendaErro(f'Produto {produto_id} não encontrado')
+        if produto.estoque_atual < quantidade:
+            raise VendaErro(f'Estoque insuficiente para {produto.nome}')
+
+    db.session.execute(
+        update(Produto)
+        .where(Produto.id.in_(quantidades))
+        .values(estoque_atual=Produto.estoque_atual - case(quantidades, value=Produto.id))
+        .execution_options(synchronize_session=False)
+    )
+    return {pid: produtos[pid].estoque_atual - qtd for pid, qtd in quantidades.items()}
+
+
+def baixar_estoque_atomico(quantidades):
+    """
+    Decrementa o estoque no próprio banco, apenas onde há saldo suficiente.
+    Retorna {produto_id: estoque_atual_novo}.
+    """
+    quantidade = case(quantidades, value=Produto.id)
+    resultado = db.session.execute(
+        update(Produto)
+        .where(Produto.id.in_(quantidades), Produto.estoque_atual >= quantidade)
+        .values(estoque_atual=Produto.estoque_atual - quantidade)
+        .returning(Produto.id, Produto.estoque_atual)
+        .execution_options(synchronize_session=False)
+    )
+    estoques = dict(resultado.all())
+
+    faltando = set(quantidades) - set(estoques)
+    if faltando:
+        # A transação será desfeita por quem chama; aqui só montamos a mensagem
+        produtos = {p.id: p for p in Produto.query.filter(Produto.id.in_(faltando)).all()}
+        produto_id = min(faltando)
+        if produto_id not in produtos:
+            raise VendaErro(f'Produto {produto_id} não encontrado')
+        raise VendaErro(f'Estoque insuficiente para {produtos[produto_id].nome}')
+
+    return estoques
+
+
+def registrar_venda(dados, usuario_id, caixa, data_venda=None):
+    """
+    Registra a venda descrita em `dados` (payload do PDV) no caixa informado.
+
+    Não faz commit: a transação fica a cargo de quem chama. Levanta
+    VendaErro se algum produto não existir ou não tiver estoque suficiente.
+    A venda é datada agora; só a sincronização offline informa data_venda
+    (a registrada no PDV, já validada por data_venda_cliente).
+    """
+    itens = dados['itens']
+    quantidades = agrupar_quantidades(itens)
+    uuid_cliente = validar_uuid_cliente(dados.get('uuid_cliente'))
+
+    if current_app.config.get('VENDAS_MODO_CHECKOUT') == 'atomico':
+        estoques = baixar_estoque_atomico(quantidades)
+    else:
+        estoques = baixar_estoque_bloqueado(quantidades)
+
+    catalogo.registrar_estoques(estoques)
+
+    numero_venda = proximo_numero(venda_numero_seq, Venda, 'VND')
+    venda = Venda(
+        numero_venda=numero_venda,
+        cliente_id=dados.get('cliente_id') or None,
+        vendedor_id=usuario_id,
+        subtotal=float(dados['subtotal']),
+        desconto=float(dados.get('desconto', 0)),
+        total=float(dados['total']),
+        forma_pagamento=dados['forma_pagamento'],
+        observacoes=dados.get('observacoes'),
+        uuid_cliente=uuid_cliente,
+        data_venda=data_venda or datetime.utcnow()
+    )
+    db.session.add(venda)
+    db.session.flush()
+
+    db.session.execute(insert(ItemVenda), [{
+        'venda_id': venda.id,
+        'produto_id': int(item['produto_id']),
+        'quantidade': int(item['quantidade']),
+        'preco_unitario': float(item['preco_unitario']),
+        'subtotal': float(item['subtotal']),
+        'desconto': float(item.get('desconto', 0)),
+        'total': float(item['total'])
+    } for item in itens])
+
+    acumular_venda(venda, itens)
+
+    db.session.execute(insert(MovimentoEstoque), [{
+        'produto_id': produto_id,
+        'tipo': 'saida',
+        'quantidade': quantidade,
+        'estoque_anterior': estoques[produto_id] + quantidade,
+        'estoque_atual': estoques[produto_id],
+        'motivo': f'Venda {numero_venda}',
+        'usuario_id': usuario_id
+    } for produto_id, quantidade in quantidades.items()])
+
+    registrar_movimento(
+        caixa.id, 'entrada', venda.total,
+        forma_pagamento=venda.forma_pagamento,
+        descricao=f'Venda {numero_venda}',
+        usuario_id=usuario_id,
+        venda_id=venda.id
+    )
+
+    return venda
+
+
+def cancelar_venda(venda, usuario_id, caixa=None):
+    """
+    Cancela a venda: devolve o estoque, estorna os resumos diários e lança a
+    saída no caixa informado (se houver). Não faz commit.
+
+    A troca de status é um UPDATE condicional (status = 'concluida'): de dois
+    cancelamentos simultâneos da mesma venda só um passa, o outro recebe
+    VendaErro. O estoque é devolvido com incremento no próprio banco, como
+    na baixa do checkout, sem perder baixas concorrentes.
+    """
+    cancelada = db.session.execute(
+        update(Venda)
+        .where(Venda.id == venda.id, Venda.status == 'concluida')
+        .values(status='cancelada')
+    ).rowcount
+    if not cancelada:
+        raise VendaErro('Esta venda já foi cancelada.')
+
+    itens = [{
+        'produto_id': item.produto_id,
+        'quantidade': item.quantidade,
+        'total': item.total
+    } for item in venda.itens]
+    quantidades = agrupar_quantidades(itens)
+
+    estoques = dict(db.session.execute(
+        update(Produto)
+        .where(Produto.id.in_(quantidades))
+        .values(estoque_atual=Produto.estoque_atual + case(quantidades, value=Produto.id))
+        .returning(Produto.id, Produto.estoque_atual)
+        .execution_options(synchronize_session=False)
+    ).all())
+
+    catalogo.registrar_estoques(estoques)
+
+    motivo = f'Cancelamento venda {venda.numero_venda}'
+    db.session.execute(insert(MovimentoEstoque), [{
+        'produto_id': produto_id,
+        'tipo': 'entrada',
+        'quantidade': quantidade,
+        'estoque_anterior': estoques[produto_id] - quantidade,
+        'estoque_atual': estoques[produto_id],
+        'motivo': motivo,
+        'usuario_id': usuario_id
+    } for produto_id, quantidade in sorted(quantidades.items()) if produto_id in estoques])
+
+    acumular_venda(venda, itens, sinal=-1)
+
+    if caixa is not None:
+        registrar_movimento(
+            caixa.id, 'saida', venda.total,
+            forma_pagamento=venda.forma_pagamento,
+            descricao=motivo,
+            usuario_id=usuario_id,
+            venda_id=venda.id
+        )
+
+
+def sincronizar_vendas(vendas, usuario_id, caixa):
+    """
+    Aplica um lote de vendas feitas offline pelo PDV, numa única transação.
+
+    Cada venda roda num savepoint: a que falhar (estoque insuficiente,
+    produto inexistente, dados inválidos) é desfeita sozinha e volta como
+    'conflito'. Vendas cujo uuid_cliente já foi gravado voltam como
+    'duplicada', com os dados da venda original. Não faz commit.
+    """
+    uuids = []
+    for dados in vendas:
+        try:
+            uuids.append(validar_uuid_cliente(dados.get('uuid_cliente')))
+        except VendaErro:
+            uuids.append(None)
+
+    gravadas = {
+        u: (venda_id, numero)
+        for u, venda_id, numero in db.session.query(
+            Venda.uuid_cliente, Venda.id, Venda.numero_venda
+        ).filter(Venda.uuid_cliente.in_([u for u in uuids if u]))
+    }
+
+    resultados = []
+    for dados, uuid_cliente in zip(vendas, uuids):
+        resultado = {'uuid_cliente': dados.get('uuid_cliente')}
+        resultados.append(resultado)
+
+        if not uuid_cliente:
+            resultado.update(status='conflito', error='Venda sem uuid_cliente válido')
+            continue
+        if uuid_cliente in gravadas:
+            venda_id, numero_venda = gravadas[uuid_cliente]
+            resultado.update(status='duplicada', venda_id=venda_id, numero_venda=numero_venda)
+            continue
+
+        try:
+            with db.session.begin_nested():
+                if not dados.get('itens'):
+                    raise VendaErro('Nenhum item na venda')
+                venda = registrar_venda(dados, usuario_id, caixa,
+                                        data_venda_cliente(dados.get('data_venda'), caixa))
+        except IntegrityError:
+            # Gravada ao mesmo tempo por outra requisição (reenvio do PDV)
+            gravada = venda_por_uuid(uuid_cliente)
+            if gravada is None:
+                raise
+            resultado.update(status='duplicada', venda_id=gravada[0], numero_venda=gravada[1])
+            continue
+        except (VendaErro, KeyError, ValueError, TypeError) as e:
+            erro = f'Campo obrigatório ausente: {e}' if isinstance(e, KeyError) else str(e)
+            resultado.update(status='conflito', error=erro)
+            continue
+
+        gravadas[uuid_cliente] = (venda.id, venda.numero_venda)
+        resultado.update(status='registrada', venda_id=venda.id, numero_venda=venda.numero_venda)
+
+    return resultados
@@ -0,0 +1,199 @@
+"""
+Benchmark da análise de vendas: pandas (services/analise.py) x ORM.
+
+O caminho antigo carregava as vendas do período como objetos do ORM e
+somava em Python (sum(v.total for v in vendas), dicionários por forma de
+pagamento, hora, produto e categoria). Este script gera um volume
+sintético de itens de venda, roda os dois caminhos sobre o mesmo período,
+confere que os indicadores batem e mostra o tempo de cada um.
+
+Não é coletado pelo pytest (o nome não começa com test_). Uso:
+
+    python -m tests.bench_analise                 # 1.000.000 de itens, SQLite temporário
+    python -m tests.bench_analise --itens 200000
+    DATABASE_URL=postgresql://... python -m tests.bench_analise   # schema temporário no PostgreSQL
+"""
+import argparse
+import random
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import joinedload, selectinload
+from app import create_app
+from models import db, Venda, ItemVenda, Produto
+from services.analise import carregar_itens, analisar_vendas
+from tests.conftest import DATABASE_URL, popular
+
+ITENS_POR_VENDA = 3
+DIAS = 90
+FORMAS_PAGAMENTO = ('dinheiro', 'cartao', 'mpesa', 'emola')
+LOTE = 50000
+
+
+@contextmanager
+def aplicacao():
+    """Aplicação sobre um SQLite temporário ou um schema temporário do PostgreSQL de DATABASE_URL"""
+    if not DATABASE_URL.startswith('postgresql'):
+        with tempfile.TemporaryDirectory() as pasta:
+            app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{pasta}/bench.db'})
+            with app.app_context():
+                db.create_all()
+                popular()
+                yield app
+                db.engine.dispose()
+        return
+
+    esquema = f'bench_{uuid.uuid4().hex[:12]}'
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as conexao:
+        conexao.execute(text(f'CREATE SCHEMA {esquema}'))
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': DATABASE_URL,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'options': f'-csearch_path={esquema},public'}}
+    })
+    try:
+        with app.app_context():
+            db.create_all()
+            popular()
+            yield app
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        with engine.begin() as conexao:
+            conexao.execute(text(f'DROP SCHEMA {esquema} CASCADE'))
+        engine.dispose()
+
+
+def gerar_vendas(quantidade_itens, semente=42):
+    """Vendas concluídas e canceladas dos últimos DIAS dias, com ITENS_POR_VENDA itens cada"""
+    aleatorio = random.Random(semente)
+    produtos = [(p.id, p.preco_venda) for p in Produto.query.all()]
+    agora = datetime.utcnow()
+    quantidade_vendas = quantidade_itens // ITENS_POR_VENDA
+
+    for inicio in range(0, quantidade_vendas, LOTE):
+        vendas, itens = [], []
+        for venda_id in range(inicio + 1, min(inicio + LOTE, quantidade_vendas) + 1):
+            total = Decimal(0)
+            for _ in range(ITENS_POR_VENDA):
+                produto_id, preco = aleatorio.choice(produtos)
+                quantidade = aleatorio.randint(1, 5)
+                itens.append({
+                    'venda_id': venda_id, 'produto_id': produto_id, 'quantidade': quantidade,
+                    'preco_unitario': preco, 'subtotal': preco * quantidade, 'desconto': 0,
+                    'total': preco * quantidade
+                })
+                total += preco * quantidade
+            vendas.append({
+                'id': venda_id, 'numero_venda': f'BEN{venda_id:09d}', 'vendedor_id': 1,
+                'data_venda': agora - timedelta(minutes=aleatorio.randint(0, DIAS * 24 * 60)),
+                'subtotal': total, 'desconto': 0, 'total': total,
+                'forma_pagamento': aleatorio.choice(FORMAS_PAGAMENTO),
+                'status': 'cancelada' if aleatorio.random() < 0.03 else 'concluida'
+            })
+        db.session.execute(insert(Venda), vendas)
+        db.session.execute(insert(ItemVenda), itens)
+        db.session.commit()
+
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('ANALYZE vendas'))
+        db.session.execute(text('ANALYZE itens_venda'))
+        db.session.commit()
+    return quantidade_vendas * ITENS_POR_VENDA
+
+
+def analisar_com_orm(filtro):
+    """Os mesmos indicadores pelo caminho antigo: objetos do ORM e somas em Python"""
+    vendas = Venda.query.options(
+        selectinload(Venda.itens).joinedload(ItemVenda.produto).joinedload(Produto.categoria)
+    ).filter(filtro, Venda.status == 'concluida').all()
+
+    valor_total = sum(v.total for v in vendas)
+    por_pagamento = defaultdict(Decimal)
+    mapa_calor = defaultdict(Decimal)
+    por_produto = defaultdict(Decimal)
+    receita, custo = defaultdict(Decimal), defaultdict(Decimal)
+    for venda in vendas:
+        por_pagamento[venda.forma_pagamento] += venda.total
+        mapa_calor[(venda.data_venda.weekday(), venda.data_venda.hour)] += venda.total
+        for item in venda.itens:
+            categoria = item.produto.categoria.nome if item.produto.categoria else 'Sem categoria'
+            por_produto[item.produto_id] += item.total
+            receita[categoria] += item.total
+            custo[categoria] += item.produto.preco_custo * item.quantidade
+
+    return {
+        'total_vendas': len(vendas),
+        'valor_total': float(valor_total),
+        'por_pagamento': {forma: float(total) for forma, total in por_pagamento.items()},
+        'mapa_calor': float(sum(mapa_calor.values())),
+        'curva_abc': sorted(por_produto, key=por_produto.get, reverse=True),
+        'margem_categoria': {c: float(receita[c] - custo[c]) for c in receita}
+    }
+
+
+def analisar_com_pandas(filtro):
+    """Indicadores de services/analise.py, no mesmo formato de analisar_com_orm"""
+    analise = analisar_vendas(carregar_itens(db.session, filtro))
+    return {
+        'total_vendas': analise['total_vendas'],
+        'valor_total': analise['valor_total'],
+        'por_pagamento': dict(zip(analise['por_pagamento']['forma_pagamento'].astype(str),
+                                  analise['por_pagamento']['total'])),
+        'mapa_calor': float(analise['mapa_calor'].to_numpy().sum()),
+        'curva_abc': list(analise['curva_abc']['produto_id']),
+        'margem_categoria': dict(zip(analise['margem_categoria']['categoria'],
+                                     analise['margem_categoria']['margem']))
+    }
+
+
+def conferir(orm, pandas):
+    """Os dois caminhos precisam chegar aos mesmos números (a menos do arredondamento em float)"""
+    def proximos(a, b):
+        return abs(a - b) <= 0.01 + 1e-9 * abs(a)
+
+    assert orm['total_vendas'] == pandas['total_vendas']
+    assert proximos(orm['valor_total'], pandas['valor_total'])
+    assert proximos(orm['mapa_calor'], pandas['mapa_calor'])
+    assert orm['por_pagamento'].keys() == pandas['por_pagamento'].keys()
+    for chave, valor in orm['por_pagamento'].items():
+        assert proximos(valor, pandas['por_pagamento'][chave])
+    for chave, valor in orm['margem_categoria'].items():
+        assert proximos(valor, pandas['margem_categoria'][chave])
+    assert set(orm['curva_abc']) == set(pandas['curva_abc'])
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--itens', type=int, default=1000000, help='itens de venda gerados (padrão: 1.000.000)')
+    args = parser.parse_args()
+
+    with aplicacao():
+        _, tempo_carga = cronometrar(gerar_vendas, args.itens)
+        filtro = Venda.data_venda >= datetime.utcnow() - timedelta(days=DIAS + 1)
+        print(f'{db.engine.dialect.name}: {args.itens:,} itens gerados em {tempo_carga:.1f} s')
+
+        pandas, tempo_pandas = cronometrar(analisar_com_pandas, filtro)
+        db.session.expunge_all()
+        orm, tempo_orm = cronometrar(analisar_com_orm, filtro)
+        conferir(orm, pandas)
+
+        print(f'{pandas["total_vendas"]:,} vendas concluídas no período; resultados conferem')
+        print(f'ORM (objetos + somas em Python): {tempo_orm:8.2f} s')
+        print(f'pandas (services/analise.py):    {tempo_pandas:8.2f} s')
+        print(f'ganho: {tempo_orm / tempo_pandas:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Fixtures comuns dos testes.
+
+A maior parte dos testes usa um SQLite temporário. Os de concorrência e de
+planos de consulta precisam do PostgreSQL e só rodam com DATABASE_URL
+apontando para um; cada teste cria um schema próprio (apagado no fim), sem
+tocar nas tabelas do banco.
+"""
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine, text
+from app import create_app
+from models import db, Usuario, Categoria, Produto, Caixa
+from services.catalogo import catalogo
+
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+
+requer_postgresql = pytest.mark.skipif(
+    not DATABASE_URL.startswith('postgresql'),
+    reason='requer DATABASE_URL apontando para um PostgreSQL'
+)
+
+EMAIL_ADMIN = 'admin@teste.co.mz'
+SENHA_ADMIN = 'teste123'
+
+
+def popular(produtos=30, estoque=100):
+    """Administrador, uma categoria, produtos e um caixa aberto para o administrador"""
+    catalogo.invalidar()  # o índice é global ao processo: não reaproveitar o de outro teste
+    admin = Usuario(nome='Administrador', email=EMAIL_ADMIN, tipo='admin', ativo=True)
+    admin.set_password(SENHA_ADMIN)
+    categoria = Categoria(nome='Bebidas')
+    db.session.add_all([admin, categoria])
+    db.session.flush()
+
+    db.session.add_all([
+        Produto(codigo=f'P{i:04d}', nome=f'Produto {i}', preco_custo=10, preco_venda=15,
+                estoque_atual=estoque, categoria_id=categoria.id)
+        for i in range(1, produtos + 1)
+    ])
+    db.session.add(Caixa(numero_caixa='CX000001', terminal=f'usuario-{admin.id}',
+                         usuario_abertura_id=admin.id, saldo_inicial=0, status='aberto'))
+    db.session.commit()
+
+
+def entrar(cliente):
+    """Faz login do administrador no cliente de teste"""
+    resposta = cliente.post('/auth/login', data={'email': EMAIL_ADMIN, 'senha': SENHA_ADMIN})
+    assert resposta.status_code == 302
+    return cliente
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Aplicação sobre um SQLite temporário, já populado"""
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "loja.db"}',
+        'TAREFAS_PASTA': str(tmp_path / 'relatorios')
+    })
+    with app.app_context():
+        db.create_all()
+        popular()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def app_postgresql(tmp_path):
+    """Aplicação sobre um schema temporário no PostgreSQL de DATABASE_URL, já populado"""
+    esquema = f'teste_{uuid.uuid4().hex[:12]}'
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as conexao:
+        conexao.execute(text(f'CREATE SCHEMA {esquema}'))
+
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': DATABASE_URL,
+        'SQLALCHEMY_ENGINE_OPTIONS': {
+            'connect_args': {'options': f'-csearch_path={esquema},public'},
+            'pool_size': 20
+        },
+        'TAREFAS_PASTA': str(tmp_path / 'relatorios')
+    })
+    try:
+        with app.app_context():
+            db.create_all()
+            popular()
+        yield app
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        with engine.begin() as conexao:
+            conexao.execute(text(f'DROP SCHEMA {esquema} CASCADE'))
+        engine.dispose()
+
+
+@pytest.fixture
+def cliente(app):
+    """Cliente de teste já autenticado como administrador"""
+    return entrar(app.test_client())
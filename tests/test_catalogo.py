@@ -0,0 +1,27 @@
+"""Índice em memória do catálogo de produtos"""
+from models import db, Produto
+from services.catalogo import catalogo
+
+
+def test_codigos_que_diferem_em_maiusculas_sao_produtos_diferentes(app):
+    with app.app_context():
+        maiusculo = Produto(codigo='AB12', nome='Arroz 1kg', preco_custo=10, preco_venda=15, estoque_atual=5)
+        minusculo = Produto(codigo='ab12', nome='Açúcar 1kg', preco_custo=10, preco_venda=15, estoque_atual=5)
+        db.session.add_all([maiusculo, minusculo])
+        db.session.commit()
+        catalogo.carregar()
+
+        assert catalogo.por_codigo('AB12')['id'] == maiusculo.id
+        assert catalogo.por_codigo(' ab12 ')['id'] == minusculo.id
+        assert catalogo.por_codigo('Ab12') is None
+
+        # Desativar um não tira o outro do índice
+        minusculo.ativo = False
+        catalogo.registrar_produto(minusculo)
+        db.session.commit()
+        assert catalogo.por_codigo('ab12') is None
+        assert catalogo.por_codigo('AB12')['id'] == maiusculo.id
+
+        # A busca por texto continua ignorando maiúsculas e acentos
+        assert [p['id'] for p in catalogo.buscar('acucar')] == []
+        assert catalogo.buscar('arroz')[0]['id'] == maiusculo.id
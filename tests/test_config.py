@@ -0,0 +1,25 @@
+"""Pool de conexões por worker dentro do limite do PostgreSQL"""
+import pytest
+from config import pool_por_worker, verificar_limite_conexoes
+
+
+def test_pool_padrao_dividido_entre_os_workers(monkeypatch):
+    monkeypatch.delenv('DB_POOL_SIZE', raising=False)
+    monkeypatch.delenv('DB_MAX_OVERFLOW', raising=False)
+
+    assert pool_por_worker(5, 90) == {'pool_size': 5, 'max_overflow': 5}
+    for workers in (9, 17, 33, 65, 200):
+        opcoes = pool_por_worker(workers, 90)
+        assert opcoes['pool_size'] >= 1
+        if workers <= 90:
+            verificar_limite_conexoes(workers, opcoes, 90)
+
+
+def test_pool_explicito_acima_do_limite_impede_a_inicializacao(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '10')
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '10')
+    opcoes = pool_por_worker(17, 90)
+
+    assert opcoes == {'pool_size': 10, 'max_overflow': 10}
+    with pytest.raises(RuntimeError, match='17 workers'):
+        verificar_limite_conexoes(17, opcoes, 90)
@@ -0,0 +1,50 @@
+"""Importação de produtos em massa"""
+import io
+from decimal import Decimal
+from models import db, HistoricoPreco, Produto
+from services.importacao import importar_produtos, ler_linhas
+
+
+def importar(texto):
+    return importar_produtos(ler_linhas(io.BytesIO(texto.encode()), 'produtos.csv'), usuario_id=1)
+
+
+def test_importacao_registra_alteracoes_de_preco(app):
+    with app.app_context():
+        resultado = importar(
+            'codigo;nome;preco_custo;preco_venda\n'
+            'P0001;Produto 1;12,00;18,00\n'   # custo e venda alterados
+            'P0002;Produto 2;10,00;15,00\n'   # mesmos preços
+            'N0001;Novo;5,00;8,00\n'          # produto novo: sem histórico
+        )
+        assert (resultado['inseridos'], resultado['atualizados'], resultado['erros']) == (1, 2, [])
+
+        historico = HistoricoPreco.query.all()
+        assert len(historico) == 1
+        alteracao = historico[0]
+        assert alteracao.produto_id == db.session.scalar(db.select(Produto.id).filter_by(codigo='P0001'))
+        assert (alteracao.preco_custo_anterior, alteracao.preco_custo) == (10, 12)
+        assert (alteracao.preco_venda_anterior, alteracao.preco_venda) == (15, 18)
+        assert alteracao.motivo == 'Importação'
+
+
+def test_importacao_de_precos_nos_dois_formatos(app):
+    with app.app_context():
+        resultado = importar(
+            'codigo;nome;preco_venda\n'
+            'D0001;Vírgula decimal;15,5\n'
+            'D0002;Milhar com ponto;1.234,56\n'
+            'D0003;Ponto decimal;15.50\n'
+            'D0004;Milhar com vírgula;1,234.56\n'
+            'D0005;Milhar sem centavos;1.234\n'
+            'D0006;Três casas;1,234\n'
+        )
+        precos = dict(db.session.execute(db.select(Produto.codigo, Produto.preco_venda)).all())
+
+    assert resultado['inseridos'] == 4
+    assert [precos[c] for c in ('D0001', 'D0002', 'D0003', 'D0004')] == [
+        Decimal('15.50'), Decimal('1234.56'), Decimal('15.50'), Decimal('1234.56')
+    ]
+    assert [numero for numero, _ in resultado['erros']] == [6, 7]
+    assert all('ambíguo' in mensagem for _, mensagem in resultado['erros'])
+    assert 'D0005' not in precos and 'D0006' not in precos
@@ -0,0 +1,131 @@
+"""
+As consultas mais frequentes usam os índices (PostgreSQL).
+
+Com enable_seqscan desligado o planejador só escolhe uma varredura
+sequencial quando nenhum índice serve para a consulta; assim o teste não
+depende do volume de dados. Um Seq Scan em vendas, itens_venda ou
+movimentos_estoque indica que o índice correspondente sumiu ou deixou de
+cobrir o filtro/ordenação. As buscas ILIKE '%termo%', a consulta do caixa
+aberto e o relatório por situação e período conferem, além disso, o nome
+do índice usado no plano.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, text
+from models import db, Venda, ItemVenda, MovimentoEstoque, Produto, Cliente, Fornecedor, Caixa
+from tests.conftest import requer_postgresql
+
+pytestmark = requer_postgresql
+
+TABELAS = ('vendas', 'itens_venda', 'movimentos_estoque', 'produtos', 'clientes', 'fornecedores', 'caixas')
+
+TABELAS_SEM_SEQ_SCAN = ('vendas', 'itens_venda', 'movimentos_estoque')
+
+BUSCA = '%agua%'
+
+
+def consultas_frequentes():
+    """(descrição, consulta) das listagens, relatórios e históricos mais usados"""
+    fim = datetime.utcnow()
+    inicio = fim - timedelta(days=30)
+    return [
+        ('listagem de vendas', select(Venda).order_by(Venda.data_venda.desc()).limit(20)),
+        ('relatório de vendas do período', select(Venda).where(
+            Venda.status == 'concluida', Venda.data_venda >= inicio, Venda.data_venda <= fim
+        ).order_by(Venda.data_venda)),
+        ('vendas do cliente', select(Venda).where(Venda.cliente_id == 1)),
+        ('itens da venda', select(ItemVenda).where(ItemVenda.venda_id == 1)),
+        ('vendas do produto', select(ItemVenda).where(ItemVenda.produto_id == 1)),
+        ('histórico de movimentos', select(MovimentoEstoque).where(
+            MovimentoEstoque.data_movimento >= inicio
+        ).order_by(MovimentoEstoque.data_movimento.desc()).limit(20)),
+        ('movimentos do produto', select(MovimentoEstoque).where(
+            MovimentoEstoque.produto_id == 1, MovimentoEstoque.data_movimento >= inicio
+        ).order_by(MovimentoEstoque.data_movimento.desc())),
+    ]
+
+
+def consultas_com_indice():
+    """(descrição, consulta, índices que devem aparecer no plano) das buscas e consultas do caixa"""
+    fim = datetime.utcnow()
+    inicio = fim - timedelta(days=30)
+    return [
+        ('busca de produtos', select(Produto).where(
+            db.or_(Produto.nome.ilike(BUSCA), Produto.codigo.ilike(BUSCA))
+        ).order_by(Produto.nome).limit(20), ('ix_produtos_nome_trgm', 'ix_produtos_codigo_trgm')),
+        ('busca de clientes', select(Cliente).where(
+            db.or_(Cliente.nome.ilike(BUSCA), Cliente.cpf_nuit.ilike(BUSCA), Cliente.telefone.ilike(BUSCA))
+        ).order_by(Cliente.nome).limit(20),
+         ('ix_clientes_nome_trgm', 'ix_clientes_cpf_nuit_trgm', 'ix_clientes_telefone_trgm')),
+        ('busca de fornecedores', select(Fornecedor).where(
+            db.or_(Fornecedor.nome.ilike(BUSCA), Fornecedor.nuit.ilike(BUSCA))
+        ).order_by(Fornecedor.nome).limit(20), ('ix_fornecedores_nome_trgm', 'ix_fornecedores_nuit_trgm')),
+        ('caixa aberto do terminal', select(Caixa).where(
+            Caixa.terminal == 'usuario-1', Caixa.status == 'aberto'
+        ).limit(1), ('ux_caixas_terminal_aberto',)),
+        ('caixas abertos', select(Caixa).where(Caixa.status == 'aberto'), ('ix_caixas_aberto',)),
+        ('vendas concluídas do período', select(Venda.id, Venda.total).where(
+            Venda.status == 'concluida', Venda.data_venda >= inicio, Venda.data_venda <= fim
+        ), ('ix_vendas_status_data_venda',)),
+    ]
+
+
+def plano(conexao, consulta):
+    compilada = consulta.compile(dialect=conexao.dialect)
+    return '\n'.join(linha for (linha,) in conexao.exec_driver_sql(f'EXPLAIN {compilada}', compilada.params))
+
+
+def popular_volume(conexao):
+    """
+    Dois anos de vendas (metade canceladas) e o histórico de caixas de
+    40 terminais: com as tabelas quase vazias os índices empatam no custo e
+    o planejador escolhe qualquer um. As vendas são gravadas fora da ordem
+    de data para que a correlação física de uma carga sequencial não decida
+    o plano.
+    """
+    conexao.execute(text("""
+        INSERT INTO vendas (numero_venda, data_venda, vendedor_id, subtotal, desconto, total,
+                            forma_pagamento, status)
+        SELECT 'VOL' || n, now() - n * interval '1 hour', (SELECT MIN(id) FROM usuarios),
+               15, 0, 15, 'dinheiro', CASE WHEN n % 2 = 0 THEN 'cancelada' ELSE 'concluida' END
+        FROM generate_series(1, 17520) AS n
+        ORDER BY random()
+    """))
+    conexao.execute(text("""
+        INSERT INTO caixas (numero_caixa, terminal, data_abertura, saldo_inicial, status)
+        SELECT 'VOL' || n, 'terminal-' || (n % 40), now() - n * interval '1 day', 0,
+               CASE WHEN n <= 40 THEN 'aberto' ELSE 'fechado' END
+        FROM generate_series(1, 2000) AS n
+    """))
+
+
+def plano_sem_seq_scan(app, consulta, volume=False):
+    with app.app_context():
+        with db.engine.connect() as conexao:
+            if volume:
+                popular_volume(conexao)
+            for tabela in TABELAS:
+                conexao.execute(text(f'ANALYZE {tabela}'))
+            conexao.execute(text('SET enable_seqscan = off'))
+            return plano(conexao, consulta)
+
+
+@pytest.mark.parametrize('consulta', [
+    pytest.param(consulta, id=descricao) for descricao, consulta in consultas_frequentes()
+])
+def test_consultas_frequentes_usam_indices(app_postgresql, consulta):
+    texto = plano_sem_seq_scan(app_postgresql, consulta)
+
+    for tabela in TABELAS_SEM_SEQ_SCAN:
+        assert f'Seq Scan on {tabela}' not in texto, texto
+
+
+@pytest.mark.parametrize('consulta, indices', [
+    pytest.param(consulta, indices, id=descricao) for descricao, consulta, indices in consultas_com_indice()
+])
+def test_consultas_usam_o_indice_esperado(app_postgresql, consulta, indices):
+    texto = plano_sem_seq_scan(app_postgresql, consulta, volume=True)
+
+    assert 'Seq Scan' not in texto, texto
+    for indice in indices:
+        assert indice in texto, texto
@@ -0,0 +1,47 @@
+"""Sequências de numeração de vendas e caixas (PostgreSQL)"""
+from flask_migrate import stamp
+from sqlalchemy import select, text
+from init_db import init_db
+from models import db, Venda, venda_numero_seq, caixa_numero_seq
+from tests.conftest import entrar, requer_postgresql
+from tests.test_vendas_concorrentes import dados_venda
+
+pytestmark = requer_postgresql
+
+
+def proximo_valor(sequencia):
+    """Próximo valor que nextval() daria, sem consumi-lo"""
+    return db.session.scalar(text(
+        f'SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM {sequencia.name}'
+    ))
+
+
+def test_init_db_nunca_faz_a_sequencia_voltar(app_postgresql):
+    app = app_postgresql
+    with app.app_context():
+        stamp()  # esquema criado com create_all(): já está na versão mais recente
+
+    cliente = entrar(app.test_client())
+    for _ in range(3):
+        assert cliente.post('/vendas/processar', json=dados_venda(1)).status_code == 200
+
+    with app.app_context():
+        # Números consumidos por transações desfeitas (buracos na numeração)
+        for _ in range(5):
+            db.session.scalar(select(venda_numero_seq.next_value()))
+        db.session.commit()
+        esperado = proximo_valor(venda_numero_seq)
+        maior_id = db.session.scalar(select(db.func.max(Venda.id)))
+        assert esperado > maior_id + 1
+
+    init_db(app)
+    init_db(app)
+
+    with app.app_context():
+        assert proximo_valor(venda_numero_seq) == esperado
+        # Caixa do fixture numerado à mão (CX000001): a sequência passa dele
+        assert proximo_valor(caixa_numero_seq) >= 2
+
+    resposta = cliente.post('/vendas/processar', json=dados_venda(1))
+    assert resposta.status_code == 200, resposta.get_json()
+    assert resposta.get_json()['numero_venda'] == f'VND{esperado:06d}'
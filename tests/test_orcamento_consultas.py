@@ -0,0 +1,96 @@
+"""
+Orçamento de consultas SQL por requisição.
+
+O dashboard e a listagem de vendas carregam os relacionamentos exibidos
+(cliente, vendedor) junto com a consulta principal: o número de comandos
+SQL por requisição é fixo, qualquer que seja a quantidade de vendas. Um
+acesso preguiçoso novo num template (N+1) faz estes testes falharem.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from jinja2 import ChoiceLoader, DictLoader
+from sqlalchemy import event
+from models import db, Cliente, Venda, ItemVenda
+from services.dashboard import invalidar_metricas
+
+# Comandos SQL por requisição, já com a sessão e o usuário em cache
+ORCAMENTO_DASHBOARD = 4
+ORCAMENTO_LISTAGEM_VENDAS = 2
+
+# Listagem mínima com os mesmos acessos da tela de vendas, usada se o
+# template da aplicação não estiver presente
+LISTAGEM_VENDAS = """
+{% for venda in vendas.items %}
+{{ venda.numero_venda }} {{ venda.cliente.nome if venda.cliente else '-' }} {{ venda.vendedor.nome }}
+{% endfor %}
+"""
+
+
+@contextmanager
+def contar_consultas(app):
+    """Conta os comandos SQL executados no bloco (mesmo evento usado pelo perfil de SQL)"""
+    comandos = []
+
+    def antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', antes_da_consulta)
+    try:
+        yield comandos
+    finally:
+        event.remove(engine, 'before_cursor_execute', antes_da_consulta)
+
+
+def criar_vendas(quantidade):
+    """Vendas concluídas de clientes diferentes, com um item cada"""
+    agora = datetime.utcnow()
+    for i in range(quantidade):
+        cliente = Cliente(nome=f'Cliente {i}')
+        venda = Venda(numero_venda=f'VND{i + 1:06d}', cliente=cliente, vendedor_id=1,
+                      data_venda=agora - timedelta(minutes=i), subtotal=15, total=15,
+                      forma_pagamento='dinheiro', status='concluida')
+        venda.itens.append(ItemVenda(produto_id=1 + i % 30, quantidade=1, preco_unitario=15,
+                                     subtotal=15, total=15))
+        db.session.add(venda)
+    db.session.commit()
+
+
+def consultas_por_requisicao(app, cliente, url):
+    cliente.get(url)  # aquecimento: usuário e catálogo em cache
+    invalidar_metricas()
+    with contar_consultas(app) as comandos:
+        resposta = cliente.get(url)
+    assert resposta.status_code == 200
+    return len(comandos)
+
+
+@pytest.fixture
+def app_com_listagem(app):
+    app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader({'vendas/listar.html': LISTAGEM_VENDAS})])
+    return app
+
+
+@pytest.mark.parametrize('url, orcamento', [
+    ('/dashboard/', ORCAMENTO_DASHBOARD),
+    ('/vendas/', ORCAMENTO_LISTAGEM_VENDAS),
+    ('/vendas/?cursor=', ORCAMENTO_LISTAGEM_VENDAS),
+])
+def test_consultas_nao_crescem_com_as_vendas(app_com_listagem, cliente, url, orcamento):
+    app = app_com_listagem
+
+    with app.app_context():
+        criar_vendas(3)
+    poucas = consultas_por_requisicao(app, cliente, url)
+
+    with app.app_context():
+        db.session.query(ItemVenda).delete()
+        db.session.query(Venda).delete()
+        db.session.commit()
+        criar_vendas(25)
+    muitas = consultas_por_requisicao(app, cliente, url)
+
+    assert poucas == muitas
+    assert muitas <= orcamento
@@ -0,0 +1,65 @@
+"""
+Paginação por chave com linhas sem data.
+
+Uma comparação de tuplas com NULL nunca é verdadeira: sem o tratamento
+explícito, as vendas sem data_venda sumiriam depois da primeira página.
+"""
+from datetime import datetime, timedelta
+from models import db, Venda
+from services.paginacao import paginar_keyset
+from tests.conftest import requer_postgresql
+
+
+def criar_vendas_com_e_sem_data():
+    """Cinco vendas datadas e duas sem data; devolve os ids na ordem da listagem"""
+    agora = datetime.utcnow()
+    vendas = [
+        Venda(numero_venda=f'VND{i + 1:06d}', vendedor_id=1, data_venda=agora - timedelta(minutes=i),
+              subtotal=15, total=15, forma_pagamento='dinheiro', status='concluida')
+        for i in range(7)
+    ]
+    db.session.add_all(vendas)
+    db.session.flush()
+    for venda in vendas[2:4]:
+        venda.data_venda = None
+    db.session.commit()
+
+    sem_data = sorted((v.id for v in vendas[2:4]), reverse=True)
+    datadas = [v.id for v in vendas if v.data_venda is not None]
+    return sem_data + datadas
+
+
+def percorrer(por_pagina=2):
+    """ids de todas as páginas, indo até o fim e voltando pelo cursor anterior"""
+    query = Venda.query
+    paginas = [paginar_keyset(query, (Venda.data_venda, Venda.id), por_pagina=por_pagina)]
+    while paginas[-1].has_next:
+        paginas.append(paginar_keyset(query, (Venda.data_venda, Venda.id),
+                                      paginas[-1].proximo_cursor, por_pagina=por_pagina))
+
+    volta = [paginas[-1]]
+    while volta[-1].has_prev:
+        volta.append(paginar_keyset(query, (Venda.data_venda, Venda.id),
+                                    volta[-1].cursor_anterior, por_pagina=por_pagina))
+
+    ida = [[v.id for v in pagina.items] for pagina in paginas]
+    retorno = [[v.id for v in pagina.items] for pagina in reversed(volta)]
+    return ida, retorno
+
+
+def conferir_paginacao(app):
+    with app.app_context():
+        esperado = criar_vendas_com_e_sem_data()
+        ida, retorno = percorrer()
+
+    assert sum(ida, []) == esperado
+    assert retorno == ida
+
+
+def test_vendas_sem_data_em_todas_as_paginas(app):
+    conferir_paginacao(app)
+
+
+@requer_postgresql
+def test_vendas_sem_data_em_todas_as_paginas_postgresql(app_postgresql):
+    conferir_paginacao(app_postgresql)
@@ -0,0 +1,28 @@
+"""Perfil de SQL: tempos por comando, inclusive depois de comandos com erro"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import create_app
+from models import db
+
+
+@pytest.fixture
+def app_perfil(tmp_path):
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "perfil.db"}',
+        'PERFIL_SQL': True
+    })
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_comando_com_erro_nao_deixa_inicio_pendente(app_perfil):
+    with app_perfil.app_context():
+        with db.engine.connect() as conexao:
+            with pytest.raises(OperationalError):
+                conexao.execute(text('SELECT * FROM tabela_inexistente'))
+            assert not conexao.info.get('perfil_inicio')
+
+            conexao.execute(text('SELECT 1'))
+            assert not conexao.info.get('perfil_inicio')
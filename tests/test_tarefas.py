@@ -0,0 +1,68 @@
+"""Fila de tarefas em segundo plano"""
+import json
+import time
+from datetime import datetime, timedelta
+from models import db, Tarefa
+import services.tarefas
+from services.tarefas import chave_cache, enfileirar, retomar_se_parada, tipo_tarefa, TEMPO_MAXIMO_ESPERA
+
+
+@tipo_tarefa('teste_arquivo')
+def gerar_arquivo_teste(parametros, caminho):
+    with open(caminho, 'w') as arquivo:
+        arquivo.write(parametros['conteudo'])
+    return 'teste.txt', 'text/plain'
+
+
+def aguardar(tarefa_id, segundos=5):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        db.session.expire_all()
+        tarefa = db.session.get(Tarefa, tarefa_id)
+        if tarefa.status in ('concluida', 'erro'):
+            return tarefa
+        time.sleep(0.05)
+    return tarefa
+
+
+def test_tarefa_pendente_perdida_e_reenviada(app):
+    parametros = {'conteudo': 'ok'}
+    with app.app_context():
+        # Tarefa gravada por um worker que reiniciou antes de executá-la
+        perdida = Tarefa(tipo='teste_arquivo', parametros=json.dumps(parametros),
+                         chave_cache=chave_cache('teste_arquivo', parametros, None), usuario_id=1,
+                         criada_em=datetime.utcnow() - TEMPO_MAXIMO_ESPERA - timedelta(minutes=1))
+        db.session.add(perdida)
+        db.session.commit()
+
+        tarefa = enfileirar('teste_arquivo', parametros, usuario_id=1)
+        assert tarefa.id == perdida.id
+
+        tarefa = aguardar(tarefa.id)
+        assert tarefa.status == 'concluida'
+        with open(tarefa.arquivo) as arquivo:
+            assert arquivo.read() == 'ok'
+
+
+def test_reenvio_uma_vez_por_intervalo(app, monkeypatch):
+    reenvios = []
+    monkeypatch.setattr(services.tarefas, '_agendar', reenvios.append)
+    parametros = {'conteudo': 'ok'}
+    with app.app_context():
+        perdida = Tarefa(tipo='teste_arquivo', parametros=json.dumps(parametros),
+                         chave_cache=chave_cache('teste_arquivo', parametros, None), usuario_id=1,
+                         criada_em=datetime.utcnow() - TEMPO_MAXIMO_ESPERA - timedelta(minutes=10))
+        db.session.add(perdida)
+        db.session.commit()
+
+        # Polling do navegador: só a primeira consulta reenvia
+        for _ in range(5):
+            retomar_se_parada(perdida)
+        assert reenvios == [perdida.id]
+
+        # Ainda não reivindicada TEMPO_MAXIMO_ESPERA depois do reenvio: reenvia de novo
+        perdida.reenviada_em = datetime.utcnow() - TEMPO_MAXIMO_ESPERA - timedelta(seconds=1)
+        db.session.commit()
+        retomar_se_parada(perdida)
+        retomar_se_parada(perdida)
+        assert reenvios == [perdida.id, perdida.id]
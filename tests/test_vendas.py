@@ -0,0 +1,71 @@
+"""Checkout, sincronização offline e cancelamento pelo PDV (SQLite)"""
+import uuid
+from datetime import datetime, timedelta
+from models import db, Caixa, MovimentoCaixa, Produto, Venda
+
+
+def venda_gratuita(produto_id=1):
+    """Venda com desconto de 100%: total zero"""
+    return {
+        'itens': [{'produto_id': produto_id, 'quantidade': 2, 'preco_unitario': 15,
+                   'subtotal': 30, 'desconto': 30, 'total': 0}],
+        'subtotal': 30,
+        'desconto': 30,
+        'total': 0,
+        'forma_pagamento': 'dinheiro'
+    }
+
+
+def test_venda_com_total_zero_e_cancelamento(app, cliente):
+    resposta = cliente.post('/vendas/processar', json=venda_gratuita())
+    assert resposta.status_code == 200, resposta.get_json()
+    venda_id = resposta.get_json()['venda_id']
+
+    resposta = cliente.post(f'/vendas/{venda_id}/cancelar')
+    assert resposta.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(Venda, venda_id).status == 'cancelada'
+        assert db.session.get(Produto, 1).estoque_atual == 100
+        caixa = db.session.get(Caixa, 1)
+        assert caixa.total_entradas == 0 and caixa.total_saidas == 0
+        assert MovimentoCaixa.query.count() == 0
+
+
+def venda_simples(**extras):
+    dados = {
+        'itens': [{'produto_id': 1, 'quantidade': 1, 'preco_unitario': 15, 'subtotal': 15, 'total': 15}],
+        'subtotal': 15,
+        'total': 15,
+        'forma_pagamento': 'dinheiro'
+    }
+    dados.update(extras)
+    return dados
+
+
+def test_venda_online_ignora_data_do_cliente(app, cliente):
+    antes = datetime.utcnow()
+    resposta = cliente.post('/vendas/processar', json=venda_simples(data_venda='2020-01-01T10:00:00'))
+    assert resposta.status_code == 200
+
+    with app.app_context():
+        assert db.session.get(Venda, resposta.get_json()['venda_id']).data_venda >= antes
+
+
+def test_venda_offline_nao_antecede_a_abertura_do_caixa(app, cliente):
+    with app.app_context():
+        abertura = datetime.utcnow() - timedelta(hours=2)
+        db.session.get(Caixa, 1).data_abertura = abertura
+        db.session.commit()
+
+    durante = abertura + timedelta(hours=1)
+    resposta = cliente.post('/vendas/sincronizar', json={'vendas': [
+        venda_simples(uuid_cliente=str(uuid.uuid4()), data_venda='2020-01-01T10:00:00'),
+        venda_simples(uuid_cliente=str(uuid.uuid4()), data_venda=durante.isoformat()),
+    ]})
+    resultados = resposta.get_json()['resultados']
+    assert [r['status'] for r in resultados] == ['registrada', 'registrada']
+
+    with app.app_context():
+        datas = [db.session.get(Venda, r['venda_id']).data_venda for r in resultados]
+        assert datas == [abertura, durante]
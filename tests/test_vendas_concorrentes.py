@@ -0,0 +1,116 @@
+"""
+Checkout e cancelamento com vários terminais simultâneos (PostgreSQL).
+
+Várias threads vendem o mesmo produto ao mesmo tempo: o estoque nunca fica
+negativo, só são aceitas tantas vendas quanto o estoque permite e nenhum
+número de venda se repete, nos dois modos de checkout. Cancelamentos
+concorrentes com vendas não perdem baixas de estoque e a mesma venda nunca
+é estornada duas vezes.
+"""
+import threading
+import pytest
+from sqlalchemy import func
+from models import db, Produto, Venda, ItemVenda, MovimentoCaixa
+from tests.conftest import entrar, requer_postgresql
+
+pytestmark = requer_postgresql
+
+THREADS = 8
+TENTATIVAS_POR_THREAD = 6
+
+
+def dados_venda(produto_id, quantidade=1, preco=15):
+    total = quantidade * preco
+    return {
+        'itens': [{'produto_id': produto_id, 'quantidade': quantidade, 'preco_unitario': preco,
+                   'subtotal': total, 'total': total}],
+        'subtotal': total,
+        'total': total,
+        'forma_pagamento': 'dinheiro'
+    }
+
+
+def em_paralelo(app, tarefa, threads=THREADS):
+    """Roda tarefa(cliente) em várias threads, cada uma com o seu cliente autenticado, ao mesmo tempo"""
+    clientes = [entrar(app.test_client()) for _ in range(threads)]
+    largada = threading.Barrier(threads)
+    resultados, erros = [], []
+
+    def rodar(cliente):
+        try:
+            largada.wait()
+            resultados.extend(tarefa(cliente))
+        except Exception as e:
+            erros.append(e)
+
+    workers = [threading.Thread(target=rodar, args=(c,)) for c in clientes]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert not erros, erros
+    return resultados
+
+
+@pytest.mark.parametrize('modo', ['bloqueio', 'atomico'])
+def test_vendas_concorrentes_nao_vendem_alem_do_estoque(app_postgresql, modo):
+    app = app_postgresql
+    app.config['VENDAS_MODO_CHECKOUT'] = modo
+    estoque_inicial = 20
+
+    with app.app_context():
+        produto = db.session.get(Produto, 1)
+        produto.estoque_atual = estoque_inicial
+        db.session.commit()
+
+    def vender(cliente):
+        return [cliente.post('/vendas/processar', json=dados_venda(1)).status_code
+                for _ in range(TENTATIVAS_POR_THREAD)]
+
+    status = em_paralelo(app, vender)
+
+    assert status.count(200) == estoque_inicial
+    assert status.count(400) == THREADS * TENTATIVAS_POR_THREAD - estoque_inicial
+
+    with app.app_context():
+        assert db.session.get(Produto, 1).estoque_atual == 0
+        numeros = [n for (n,) in db.session.query(Venda.numero_venda)]
+        assert len(numeros) == estoque_inicial
+        assert len(set(numeros)) == len(numeros)
+        vendido = db.session.query(func.sum(ItemVenda.quantidade)).scalar()
+        assert vendido == estoque_inicial
+
+
+def test_cancelamentos_concorrentes_com_vendas(app_postgresql):
+    app = app_postgresql
+    app.config['VENDAS_MODO_CHECKOUT'] = 'atomico'
+    estoque_inicial = 100
+
+    cliente = entrar(app.test_client())
+    vendas = []
+    for _ in range(10):
+        resposta = cliente.post('/vendas/processar', json=dados_venda(1, quantidade=2))
+        assert resposta.status_code == 200
+        vendas.append(resposta.get_json()['venda_id'])
+
+    def vender_e_cancelar(cliente):
+        # Cada thread tenta cancelar todas as vendas (cada uma só pode ser
+        # estornada uma vez) enquanto vende mais unidades do mesmo produto
+        for venda_id in vendas:
+            cliente.post(f'/vendas/{venda_id}/cancelar')
+            cliente.post('/vendas/processar', json=dados_venda(1))
+        return []
+
+    em_paralelo(app, vender_e_cancelar)
+
+    with app.app_context():
+        concluidas = db.session.query(func.coalesce(func.sum(ItemVenda.quantidade), 0)).join(Venda).filter(
+            ItemVenda.produto_id == 1, Venda.status == 'concluida'
+        ).scalar()
+        assert db.session.get(Produto, 1).estoque_atual == estoque_inicial - concluidas
+
+        assert db.session.query(Venda).filter(Venda.id.in_(vendas), Venda.status == 'cancelada').count() == len(vendas)
+        estornos = db.session.query(MovimentoCaixa.venda_id, func.count()).filter(
+            MovimentoCaixa.venda_id.in_(vendas), MovimentoCaixa.tipo == 'saida'
+        ).group_by(MovimentoCaixa.venda_id).all()
+        assert sorted(estornos) == [(venda_id, 1) for venda_id in sorted(vendas)]
@@ -0,0 +1,9 @@
+"""
+Ponto de entrada WSGI para servidores de produção:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+from app import create_app
+
+app = create_app(os.getenv('FLASK_ENV', 'production'))